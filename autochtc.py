@@ -1,11 +1,54 @@
 #!/usr/bin/env python3
+import argparse
+import array
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import functools
+import gc
+import gzip
+import hashlib
+import importlib
 import itertools
+import json
+import math
+import mmap
 import os
+import random
 import re
 import shutil
+import sqlite3
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access, so the
+    # htcondor bindings are only loaded once a DAG is built or submitted
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            try:
+                with profile_phase("import"):
+                    self._module = importlib.import_module(self._name)
+            except ImportError as e:
+                raise ImportError(
+                    f"The htcondor Python bindings are required to build or submit DAGs (pip install htcondor): {e}"
+                ) from e
+        return getattr(self._module, attr)
+
 
-import htcondor
-from htcondor import dags
+htcondor = LazyModule("htcondor")
+dags = LazyModule("htcondor.dags")
 
 EXCLUDED_FOLDERS = set(
     [
@@ -28,34 +71,515 @@ EXCLUDED_FOLDERS = set(
     ]
 )
 QUEUE_EXT = ".txt"
+# Job indexes of the directories scanned, kept out of them in the user's cache
+SUB_INDEX_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "autochtc"
+)
+STAGE_WORKERS = 8  # Files copied in parallel into a DAG directory
+FICLONE = 0x40049409  # Linux ioctl cloning a file on copy-on-write filesystems
+INPUT_STORE_DIR = ".autochtc_store"  # Content-addressed inputs shared by DAGs
+PACK_MAX_SIZE = 1 << 20  # Largest input file packed into a job's input archive
+PACK_SUFFIX = "_inputs.tar.gz"
+LOG_DIR = "condor_log"  # Output and error files of the jobs, per job name
+LOG_SHARD_SIZE = 1000  # Jobs per log subdirectory of a layer, 0 for one directory
+LOG_FAILURES_KEPT = 5  # Failed jobs per layer whose logs the stats point to
+CLEAN_WORKERS = 8  # Directories listed in parallel by clean_directory
+# Files written by DAGMan for a .dag, the .dag included. The group is the
+# suffix after ".dag", which tells the kind of file.
+CLEAN_PATTERN = re.compile(
+    r"\.dag(?:\.(dagman\.out|dagman\.log|lib\.out|lib\.err|nodes\.log|metrics"
+    r"|condor\.sub|lock|rescue\d+))?$"
+)
+BUNDLE_SUFFIX = ".bundle"  # Arguments of the combinations run by a bundled node
+DAG_WRITE_BUFFER_SIZE = 1 << 20  # Bytes buffered before writing to a .dag
+# Fewest edges that a NOOP join node between a group of parents and children
+# must save to be inserted, as the join is one more node for DAGMan to run.
+# 0 inserts one for every group, as dags.write_dag does, None never does.
+JOIN_THRESHOLD = 16
+NODE_NAME_BATCH_SIZE = 10000  # Node names joined at a time in PARENT/CHILD lines
+EDGE_TYPES = ["many2many", "one2one", "group", "slice"]
+# Automatic DAGMan throttles, see throttle_dag
+THROTTLE_CPUS = 5000  # CPUs that the running jobs of a layer may hold
+THROTTLE_GPUS = 50  # GPUs that the running jobs of a layer may hold
+THROTTLE_IDLE = 1000  # Idle jobs of a DAG (DAGMAN_MAX_JOBS_IDLE)
+THROTTLE_SCRIPTS = 10  # PRE and POST scripts run at once by a DAG
+DEFAULT_DOCKER_IMAGE = "pytorch/pytorch:2.4.1-cuda12.1-cudnn9-devel"
+DOCKER_IMAGE_PATTERN = r"^[a-zA-Z0-9]+/[a-zA-Z0-9-]+:[a-zA-Z0-9]+$"
+QUEUE_BLOCK_SIZE = 1 << 16  # Bytes of a queue file parsed at a time
+SWEEP_STORE_SUFFIX = ".sweep.db"  # SQLite sweep store of a job, next to its queue
+SWEEP_STORE_BATCH_SIZE = 1 << 16  # Rows inserted or fetched at a time
+# A condition of a sweep query: "key op value", "key in a..b" or "key in [a, b]"
+QUERY_CONDITION = re.compile(
+    r"\s*(\w+)\s*(?:(<=|>=|!=|==|=|<|>)\s*(\S+)|in\s+(\S+?)\s*\.\.\s*(\S+)"
+    r"|in\s*\[(.*)\])\s*$",
+    re.I,
+)
+SAMPLE_METHODS = ["random", "lhs", "sobol", "halton"]  # Sampled sweep designs
+SAMPLE_SEED = 0  # Seed of the sampled sweeps that do not set one
+SOBOL_BITS = 32  # Bits of the Sobol points, up to 2**32 points
+# Sobol direction numbers of Joe and Kuo (new-joe-kuo-6.21201), for the
+# dimensions after the first: degree s and coefficients a of the primitive
+# polynomial, and the initial m values
+SOBOL_DIRECTIONS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+LAYER_MANIFEST_FILE = ".autochtc_layers.json"  # Layers of a DAG, for refresh
+STATS_FILE = ".autochtc_stats.json"  # Log offsets and statistics of a DAG
+STATS_FILE_VERSION = 2  # Stats files of another version are read again
+STATS_BLOCK_SIZE = 1 << 24  # Bytes of an event log parsed at a time
+# Buckets per doubling of the histograms of waits, runtimes and usage, so
+# that a percentile is at most 2 ** (1 / 16), about 4.4%, above the value.
+# Values below HISTOGRAM_EXACT each get their own bucket.
+HISTOGRAM_STEPS = 16
+HISTOGRAM_EXACT = 32
+RIGHTSIZE_PERCENTILE = 95  # Share of past jobs whose usage the requests cover
+RIGHTSIZE_HEADROOM = 1.25  # Margin added over that usage
+RIGHTSIZE_MIN_JOBS = 10  # Finished jobs needed before proposing requests
+MEMORY_HOLD_CODE = 34  # HoldReasonCode of a job exceeding its memory request
+MEMORY_RETRY_GROWTH = 2  # Memory request multiplier of a job released after it
+SIZE_UNITS = {"K": 1, "M": 1 << 10, "G": 1 << 20, "T": 1 << 30}  # In KB
+SUBMITTED_FILE = ".autochtc_submitted.json"  # DAGs submitted, by cluster ID
+PROFILE_ENV = "AUTOCHTC_PROFILE"  # Set to 1 to profile runs, or to cprofile
+PROFILE_FILE = ".autochtc_profile.json"  # Phase timings and counts of a run
+PROFILE_TRACE_FILE = ".autochtc_trace.json"  # The phases as a Chrome trace
+PROFILE_STATS_FILE = ".autochtc_profile.prof"  # cProfile stats, for pstats
+PROFILE_TOP = 15  # Functions listed from the cProfile stats
+SUBMIT_WORKERS = 4  # DAGs submitted at the same time by submit_dags
+SUBMIT_ATTEMPTS = 4  # Tries per DAG before giving up
+SUBMIT_BACKOFF = 1  # Seconds before the first retry, doubled at each retry
+MONITOR_INTERVALS = (5, 60)  # Shortest and longest seconds between refreshes
+MONITOR_PROJECTION = [
+    "ClusterId",
+    "JobStatus",
+    "DAGManJobId",
+    "DAGNodeName",
+    "Iwd",
+    "DAG_NodesTotal",
+    "DAG_NodesDone",
+    "DAG_NodesFailed",
+]
+# Job states shown by monitor, by JobStatus (transferring output is running)
+JOB_STATES = {1: "idle", 2: "running", 5: "held", 6: "running", 7: "idle"}
+# Submitted, executing, evicted, terminated, aborted and held events
+LOG_EVENT_CODES = {b"000", b"001", b"004", b"005", b"009", b"012"}
+# Lines of the events of an event log parsed by parse_events
+EXIT_STATUS_PATTERN = re.compile(rb"\(1\) Normal termination \(return value (-?\d+)\)")
+HOLD_CODE_PATTERN = re.compile(rb"^\s*Code (\d+)", re.M)
+RESOURCES_PATTERN = re.compile(
+    rb"^[ \t]*Partitionable Resources[ \t]*:.*?(Usage).*\n", re.M
+)
+RESOURCE_LINE_PATTERN = re.compile(rb"[ \t]+([\w ()]+?)[ \t]*:")
+DAGMAN_PATTERN = re.compile(
+    rb"Of (\d+) nodes total:$"
+    rb"|^\S+ \S+ +(Done +Pre .*)\n.*===.*\n\S+ \S+ +([\d ]+?) *$"
+    rb"|Retrying node (\S+)"
+    rb"|Node (\S+) job proc \(\S+\) failed"
+    rb"|EXITING WITH STATUS (-?\d+)"
+    rb"|(STARTING UP)",
+    re.M,
+)
+
+SUBMIT_COMMAND = re.compile(r"\s*([+\w.]+)\s*=\s*")  # "key = " of a command line
+SUBMIT_QUEUE = re.compile(r"(?i)\s*queue\b(.*)$", re.S)
+# Header written above the first command of each section of a submit file
+SUBMIT_SECTIONS = {
+    "universe": "Universe",
+    "arguments": "Arguments",
+    "requirements": "Artefact",
+    "+is_resumable": "Checkpoint",
+    "my.is_resumable": "Checkpoint",
+    "output": "Logging",
+    "logshard": "Logging",
+    "request_cpus": "Compute resources",
+    "request_gpus": "GPU resources",
+    "queue": "Queue",
+}
+
+# TODO : More complex layer system, Add rescue or not
+
+
+class Profile:
+    """
+    Timings of the phases of a run, and counts of what they did, kept while
+    --profile (or AUTOCHTC_PROFILE) is on.
+
+    The phases are the functions decorated with ``profiled``. Each call is
+    timed on its thread, a phase called again inside itself only once, and
+    the time of the phases called inside another is left out of its self
+    time. When no profile is running, a phase costs one attribute lookup.
+    """
+
+    active = None  # Profile of the current run, None when not profiling
+
+    def __init__(self, cprofile=False):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.counts = collections.Counter()
+        self.events = []  # (phase, start, seconds, thread) of each call
+        self.dag_dirs = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cprofile = None
+        if cprofile:
+            import cProfile
+
+            self.cprofile = cProfile.Profile()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        stack = self.local.__dict__.setdefault("stack", [])
+        if any(frame[0] == name for frame in stack):
+            yield
+            return
+        # Phase, start and seconds spent in the phases called inside it
+        frame = [name, time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - frame[1]
+            stack.pop()
+            if stack:
+                stack[-1][2] += seconds
+            with self.lock:
+                phase = self.phases.setdefault(
+                    name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0}
+                )
+                phase["calls"] += 1
+                phase["seconds"] += seconds
+                phase["self_seconds"] += seconds - frame[2]
+                self.events.append((name, frame[1], seconds, threading.get_ident()))
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counts[name] += value
+
+    def report(self):
+        return {
+            "wall_seconds": round(time.perf_counter() - self.start, 4),
+            "phases": {
+                name: {
+                    key: round(value, 4) if isinstance(value, float) else value
+                    for key, value in phase.items()
+                }
+                for name, phase in sorted(
+                    self.phases.items(), key=lambda item: -item[1]["self_seconds"]
+                )
+            },
+            "counts": dict(sorted(self.counts.items())),
+            "dag_dirs": self.dag_dirs,
+        }
+
+    def trace(self):
+        # The Chrome trace event format, read by chrome://tracing and Perfetto
+        pid = os.getpid()
+        threads = {}
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": round((start - self.start) * 1e6),
+                "dur": round(seconds * 1e6),
+                "pid": pid,
+                "tid": threads.setdefault(thread, len(threads)),
+            }
+            for name, start, seconds, thread in self.events
+        ]
+        events.append(
+            {
+                "name": "counts",
+                "ph": "C",
+                "ts": round((time.perf_counter() - self.start) * 1e6),
+                "pid": pid,
+                "args": dict(self.counts),
+            }
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self):
+        # Writes the report and the trace to the DAG directories of the run,
+        # or to the working directory if no DAG was written
+        report, trace = self.report(), self.trace()
+        for directory in self.dag_dirs or [os.getcwd()]:
+            try:
+                for name, data in [(PROFILE_FILE, report), (PROFILE_TRACE_FILE, trace)]:
+                    with open(os.path.join(directory, name), "w") as f:
+                        json.dump(data, f, indent=1)
+                if self.cprofile is not None:
+                    self.cprofile.dump_stats(
+                        os.path.join(directory, PROFILE_STATS_FILE)
+                    )
+            except OSError as e:
+                print(
+                    f"Warning: Could not save the profile to {directory}: {e}",
+                    file=sys.stderr,
+                )
+                continue
+            print(f"Saved the profile to {directory}", file=sys.stderr)
+        return report
+
+
+def profiled(phase):
+    # Decorator timing each call of a function as a phase of the profile
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if Profile.active is None:
+                return func(*args, **kwargs)
+            with Profile.active.phase(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profile_phase(name):
+    # Context manager timing its body as a phase of the profile, if one is
+    # running
+    if Profile.active is None:
+        return contextlib.nullcontext()
+    return Profile.active.phase(name)
+
+
+def profile_count(name, value=1):
+    # Adds value to a count of the profile, if one is running
+    if Profile.active is not None:
+        Profile.active.add(name, value)
+
 
-# TODO : Refresh a DAG, More complex layer system, Make the log dirs better, Add rescue or not
+@contextlib.contextmanager
+def profiling(mode=None):
+    # Profiles the run inside it when mode is set, "cprofile" to also run
+    # cProfile on the main thread, and saves the report when it ends
+    if not mode or mode == "0":
+        yield None
+        return
+    profile = Profile.active = Profile(cprofile=mode == "cprofile")
+    if profile.cprofile is not None:
+        profile.cprofile.enable()
+    try:
+        yield profile
+    finally:
+        if profile.cprofile is not None:
+            profile.cprofile.disable()
+        Profile.active = None
+        print_profile(profile.save(), profile.cprofile)
+
+
+def print_profile(report, cprofile=None):
+    print(f"\nProfile ({report['wall_seconds']:.3f} s):", file=sys.stderr)
+    print(f"  {'phase':<16} {'calls':>7} {'seconds':>10} {'self':>10}", file=sys.stderr)
+    for name, phase in report["phases"].items():
+        print(
+            f"  {name:<16} {phase['calls']:>7} {phase['seconds']:>10.3f} {phase['self_seconds']:>10.3f}",
+            file=sys.stderr,
+        )
+    for name, value in report["counts"].items():
+        print(f"  {name}: {value}", file=sys.stderr)
+    if cprofile is not None:
+        import pstats
+
+        pstats.Stats(cprofile, stream=sys.stderr).sort_stats("cumulative").print_stats(
+            PROFILE_TOP
+        )
+
+
+class SubmitFile:
+    """
+    Submit file parsed once, that writes back as it was read.
+
+    ``lines`` holds ``(key, text)`` pairs, one per logical line (a command
+    continued with a trailing backslash is one line). key is the lowercase
+    name of the command set on the line, "queue" for the queue statement and
+    None for comments and blank lines. Values are read and set like those of
+    htcondor.Submit, keeping the comments, the order and the alignment of
+    the other lines. ``load`` caches the parse of each path by mtime and
+    size, and hands out copies.
+    """
+
+    cache = {}
+
+    def __init__(self, text=""):
+        self.lines = []
+        self.newline = text.endswith("\n")
+        physical = text.splitlines()
+        i = 0
+        while i < len(physical):
+            line = physical[i]
+            while i + 1 < len(physical) and (
+                line.endswith("\\")
+                # Items given inline, as in "queue x from (" ... ")"
+                or (SUBMIT_QUEUE.match(line) and "(" in line and ")" not in line)
+            ):
+                i += 1
+                line += "\n" + physical[i]
+            i += 1
+            self.lines.append((self.line_key(line), line))
+
+    @staticmethod
+    def line_key(line):
+        match = SUBMIT_COMMAND.match(line)
+        if match:
+            return match.group(1).lower()
+        if SUBMIT_QUEUE.match(line):
+            return "queue"
+        return None
+
+    @classmethod
+    @profiled("parse_submit")
+    def load(cls, path):
+        path = os.path.abspath(path)
+        path_stat = os.stat(path)
+        stamp = (path_stat.st_mtime_ns, path_stat.st_size)
+        cached = cls.cache.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path) as f:
+                cached = cls.cache[path] = (stamp, cls(f.read()))
+            profile_count("submit_files_parsed")
+        return cached[1].copy()
+
+    def save(self, path, sectioned=False):
+        # Writes the file, with section headers if sectioned, and caches it
+        # as written
+        text = self.format() if sectioned else self.text()
+        with open(path, "w") as f:
+            f.write(text)
+        profile_count("files_written")
+        path_stat = os.stat(path)
+        self.cache[os.path.abspath(path)] = (
+            (path_stat.st_mtime_ns, path_stat.st_size),
+            SubmitFile(text) if sectioned else self.copy(),
+        )
 
+    def copy(self):
+        other = SubmitFile()
+        other.lines = list(self.lines)
+        other.newline = self.newline
+        return other
+
+    def keys(self):
+        # Command names as written, in order, each once
+        names = {}
+        for key, line in self.lines:
+            if key and key != "queue":
+                names.setdefault(key, SUBMIT_COMMAND.match(line).group(1))
+        return list(names.values())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __contains__(self, key):
+        return any(name == key.lower() for name, _ in self.lines if name != "queue")
+
+    def __getitem__(self, key):
+        # The last line setting a command wins, as for condor_submit
+        key = key.lower()
+        for name, line in reversed(self.lines):
+            if name == key and key != "queue":
+                value = line[SUBMIT_COMMAND.match(line).end() :]
+                # As condor_submit, a continued line is joined without its indent
+                return re.sub(r"\\\n[ \t]*", "", value).strip()
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        # Sets every line of the command, or adds one before the queue
+        # statement
+        lowered = key.lower()
+        found = False
+        for i, (name, line) in enumerate(self.lines):
+            if name == lowered:
+                self.lines[i] = (name, SUBMIT_COMMAND.match(line).group(0) + str(value))
+                found = True
+        if not found:
+            at = self.queue_index()
+            at = len(self.lines) if at is None else at
+            self.lines.insert(at, (lowered, f"{key} = {value}"))
+
+    def __delitem__(self, key):
+        key = key.lower()
+        self.lines = [(name, line) for name, line in self.lines if name != key]
+
+    def queue_index(self):
+        for i, (name, _) in enumerate(self.lines):
+            if name == "queue":
+                return i
+        return None
 
+    def getQArgs(self):
+        # The arguments of the queue statement, as htcondor.Submit names it
+        at = self.queue_index()
+        if at is None:
+            return ""
+        return SUBMIT_QUEUE.match(self.lines[at][1]).group(1).strip()
+
+    def text(self, queue=True):
+        lines = [line for name, line in self.lines if queue or name != "queue"]
+        return "\n".join(lines) + ("\n" if self.newline and lines else "")
+
+    def submit(self):
+        # An htcondor.Submit of the commands, without the queue statement
+        return htcondor.Submit(self.text(queue=False))
+
+    def format(self):
+        # The text with a "# Section" header above the first command of each
+        # SUBMIT_SECTIONS section, in one pass. A header already written
+        # right above the command, such as those of the generated
+        # templates, is kept instead of repeated.
+        lines = []
+        seen = set()
+        previous = ""
+        for name, line in self.lines:
+            section = SUBMIT_SECTIONS.get(name)
+            if section and section not in seen:
+                seen.add(section)
+                if not previous.lstrip("# ").startswith(section):
+                    if lines and lines[-1].strip():
+                        lines.append("")
+                    lines.append(f"# {section}")
+            lines.append(line)
+            if line.strip():
+                previous = line
+        return "\n".join(lines) + ("\n" if self.newline and lines else "")
+
+
+@profiled("correct_submit")
 def correct_submit(submit_file):
     # Corrects the formatting of a submit file
-    with open(submit_file, "r") as f:
-        lines = f.readlines()
-
-    # If we see a certain word at the start of a line, we want to add \n
-    # before it
-    words_comments = {
-        "universe": "Universe",
-        "arguments": "Arguments",
-        "Requirements": "Artefact",
-        "+is_resumable": "Checkpoint",
-        "output": "Logging",
-        "request_cpus": "Compute resources",
-        "request_gpus": "GPU resources",
-        "queue": "Queue",
-    }
-    for i, line in enumerate(lines):
-        for word, comment in words_comments.items():
-            if word in line:
-                lines[i] = f"\n# {comment}\n" + line
+    SubmitFile.load(submit_file).save(submit_file, sectioned=True)
 
-    with open(submit_file, "w") as f:
-        f.write("".join(lines))
+
+def set_submit_value(submit_file, key, value):
+    # Sets the value of a command in a submit file, keeping the other lines
+    # as they are
+    job_sub = SubmitFile.load(submit_file)
+    job_sub[key] = value
+    job_sub.save(submit_file)
 
 
 def print_centered_ascii_art():
@@ -71,17 +595,94 @@ def print_centered_ascii_art():
     print(ascii_art)
 
 
-def get_job_sub(base_dir=".", excluded_dirs=[]):
-    available_jobs = []
-    for root, dirs, files in os.walk(base_dir):
-        dirs[:] = [
-            d for d in dirs if d not in EXCLUDED_FOLDERS and d not in excluded_dirs
+def scan_job_dir(path):
+    # Lists the subdirectories of path and its .sub files without a sibling .dag
+    dirs, subs, names = [], [], set()
+    with os.scandir(path) as entries:
+        for entry in entries:
+            names.add(entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.name)
+            elif entry.name.endswith(".sub"):
+                subs.append(entry.name)
+    subs = [sub for sub in subs if sub.replace(".sub", ".dag") not in names]
+    return dirs, subs
+
+
+@profiled("discovery")
+def index_job_subs(base_dir=".", excluded_dirs=[], rescan=False):
+    # Walks base_dir like os.walk, but only lists the directories whose mtime
+    # changed since the index of base_dir was written. Creating or removing a
+    # file changes the mtime of its directory, so unchanged directories only
+    # cost a stat. The index is saved outside of base_dir, as saving it there
+    # would change the mtime of base_dir and have it listed again every time.
+    index_path = sub_index_path(base_dir)
+    index = {}
+    if not rescan:
+        try:
+            with open(index_path) as f:
+                index = json.load(f)["dirs"]
+        except (OSError, ValueError, KeyError):
+            index = {}
+
+    new_index = {}
+    job_subs = []
+    stack = ["."]
+    while stack:
+        rel_dir = stack.pop()
+        path = os.path.normpath(os.path.join(base_dir, rel_dir))
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+
+        entry = index.get(rel_dir)
+        if entry is None or entry[0] != mtime:
+            try:
+                entry = [mtime, *scan_job_dir(path)]
+            except OSError:
+                continue
+        new_index[rel_dir] = entry
+
+        _, dirs, subs = entry
+        job_subs.extend(os.path.normpath(os.path.join(rel_dir, sub)) for sub in subs)
+        dirs = [
+            d
+            for d in dirs
+            if d not in EXCLUDED_FOLDERS
+            and d not in excluded_dirs
+            and d != INPUT_STORE_DIR
         ]
-        for file in files:
-            if file.endswith(".sub"):
-                job_path = os.path.join(root, file)
-                if not os.path.exists(os.path.join(root, file.replace(".sub", ".dag"))):
-                    available_jobs.append(job_path.replace(base_dir + "/", ""))
+        stack.extend(os.path.normpath(os.path.join(rel_dir, d)) for d in reversed(dirs))
+
+    if new_index != index:
+        try:
+            os.makedirs(SUB_INDEX_DIR, exist_ok=True)
+            tmp_path = index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        "version": 1,
+                        "base_dir": os.path.abspath(base_dir),
+                        "dirs": new_index,
+                    },
+                    f,
+                )
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"Warning: Could not save the job index {index_path}: {e}")
+
+    return job_subs
+
+
+def sub_index_path(base_dir):
+    # One index per directory scanned, named after its absolute path
+    key = hashlib.sha256(os.path.abspath(base_dir).encode()).hexdigest()[:16]
+    return os.path.join(SUB_INDEX_DIR, f"index-{key}.json")
+
+
+def get_job_sub(base_dir=".", excluded_dirs=[], rescan=False):
+    available_jobs = index_job_subs(base_dir, excluded_dirs, rescan)
 
     if not available_jobs:
         print("No job submit files found.")
@@ -102,47 +703,449 @@ def get_job_sub(base_dir=".", excluded_dirs=[]):
             print("Invalid selection. Please try again.")
 
 
-def read_vars(job_sub, job_queue_file):
+@contextlib.contextmanager
+def paused_gc():
+    # Parsing allocates millions of short-lived containers but no reference
+    # cycles, so the cyclic collector only slows it down
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def parse_queue_lines(lines, separator, num_keys):
+    # Returns the typed rows of lines and the offsets of the malformed ones.
+    # Only the lines with the wrong number of values are looked at one by one:
+    # blank ones are skipped, short ones dropped and long ones truncated.
+    # Each value made of digits is an int, as coerce_value makes it, and the
+    # columns are only converted cell by cell when they mix both kinds.
+    if separator == ",":
+        rows = [line.replace(" ", "").split(",") for line in lines]
+    else:
+        rows = [line.split() for line in lines]
+
+    malformed = []
+    bad = [i for i, row in enumerate(rows) if len(row) != num_keys]
+    if bad:
+        malformed = [i for i in bad if lines[i].strip()]
+        rows = [row[:num_keys] for row in rows if len(row) >= num_keys]
+    if not rows:
+        return [], malformed
+
+    columns = list(zip(*rows))
+    for i, column in enumerate(columns):
+        digits = sum(map(str.isdigit, column))
+        if digits == len(column):
+            columns[i] = list(map(int, column))
+        elif digits:
+            columns[i] = [coerce_value(value) for value in column]
+    return list(zip(*columns)), malformed
+
+
+def iter_queue_chunks(queue_file, num_keys, block_size=None):
+    # Yields the rows of a queue file in chunks of tuples. The file is memory
+    # mapped and the delimiter is detected once, on the first non-empty line.
+    block_size = block_size or QUEUE_BLOCK_SIZE
+    separator = None
+    malformed = []
+    lineno = 0
+
+    with open(queue_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, size = 0, len(mm)
+            while start < size:
+                end = mm.find(b"\n", min(start + block_size, size - 1))
+                end = size if end == -1 else end + 1
+                lines = mm[start:end].decode().splitlines()
+                start = end
+
+                if separator is None:
+                    first = next((line for line in lines if line.strip()), None)
+                    if first is None:
+                        lineno += len(lines)
+                        continue
+                    separator = "," if "," in first else " "
+
+                if not num_keys:
+                    # Without arguments each non-empty line still stands for a job
+                    lineno += len(lines)
+                    yield [()] * sum(1 for line in lines if line.strip())
+                    continue
+
+                with paused_gc():
+                    rows, bad = parse_queue_lines(lines, separator, num_keys)
+                malformed.extend(lineno + i + 1 for i in bad)
+                lineno += len(lines)
+                if rows:
+                    yield rows
+
+    if malformed:
+        shown = ", ".join(map(str, malformed[:10]))
+        more = f" and {len(malformed) - 10} more" if len(malformed) > 10 else ""
+        print(
+            f"Warning: {len(malformed)} line(s) of {queue_file} do not have {num_keys} values: lines {shown}{more}"
+        )
+
+
+@profiled("sweep")
+def read_vars(job_sub, job_queue_file, query=None):
+    # The vars of a queue file, or of the rows of a sweep store matching query
     pattern = r"\$\((.*?)\)"
-    vars = []
     keys = re.findall(pattern, job_sub["arguments"])
+    if job_queue_file.endswith(SWEEP_STORE_SUFFIX):
+        return read_sweep_store(job_queue_file, keys, query)
+    if query:
+        raise ValueError(
+            f"Queries need a sweep store ({SWEEP_STORE_SUFFIX}), not {job_queue_file}"
+        )
+
+    columns = [[] for _ in keys]
+    num_rows = 0
+    with paused_gc():
+        for chunk in iter_queue_chunks(job_queue_file, len(keys)):
+            num_rows += len(chunk)
+            for column, values in zip(columns, zip(*chunk)):
+                column.extend(values)
+
+    if not keys:
+        # Lines without arguments still each stand for one job
+        return [{} for _ in range(num_rows)]
+    # All the columns move in lock-step, one combination per line
+    return Sweep([(keys, columns)], coerce=False)
+
+
+def sweep_store_path(job_sub_path):
+    return os.path.splitext(job_sub_path)[0] + SWEEP_STORE_SUFFIX
+
+
+def column_type(values):
+    # The SQLite type of a column of sweep values
+    types = {type(value) for value in values}
+    if types <= {int}:
+        return "INTEGER"
+    if types <= {int, float}:
+        return "REAL"
+    return "TEXT"
+
+
+def numeric_column(values):
+    # The values as numbers when they are all numbers written as Python
+    # writes them, so that they are compared as numbers and passed to the
+    # jobs as they were
+    if all(isinstance(value, (int, float)) for value in values):
+        return values
+    try:
+        numbers = [parse_number(value) for value in values]
+    except ValueError:
+        return values
+    if all(str(number) == str(value) for number, value in zip(numbers, values)):
+        return numbers
+    return values
+
+
+def write_sweep_store(path, sweep, keys):
+    """
+    Writes the combinations of a Sweep to an SQLite sweep store, the table
+    ``sweep`` with a ``process`` column (the $(Process) of the combination
+    when queued from the job's queue file, its row in the file) and one typed
+    column per key, each indexed. Returns the number of rows.
+    """
+    types = {}
+    factors = []
+    for factor_keys, columns in sweep.factors:
+        columns = [numeric_column(column) for column in columns]
+        for key, column in zip(factor_keys, columns):
+            types[key] = column_type(column)
+        factors.append((factor_keys, columns))
+    sweep = Sweep(factors, coerce=False)
+
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.execute(
+            "CREATE TABLE sweep (process INTEGER PRIMARY KEY"
+            + "".join(f', "{key}" {types[key]}' for key in keys)
+            + ")"
+        )
+        insert = f"INSERT INTO sweep VALUES (?{', ?' * len(keys)})"
+        rows = ((i, *row) for i, row in enumerate(sweep.rows(keys)))
+        count = 0
+        while True:
+            batch = list(itertools.islice(rows, SWEEP_STORE_BATCH_SIZE))
+            if not batch:
+                break
+            db.executemany(insert, batch)
+            count += len(batch)
+        # The indexes are faster to build once the rows are in
+        for key in keys:
+            db.execute(f'CREATE INDEX "sweep_{key}" ON sweep ("{key}")')
+        db.commit()
+    finally:
+        db.close()
+    os.replace(tmp_path, path)
+    return count
+
+
+def query_sql(query, columns):
+    # The WHERE clause and parameters of a sweep query, conditions on the
+    # columns joined by "and", e.g. "lr < 1e-3 and seed in 0..4 and opt in
+    # [adam, sgd]". Ranges include both ends.
+    if not query or not query.strip():
+        return "", []
+    clauses, params = [], []
+    for condition in re.split(r"\s+and\s+", query.strip(), flags=re.I):
+        match = QUERY_CONDITION.match(condition)
+        if not match:
+            raise ValueError(f"Invalid condition {condition!r} in query {query!r}")
+        key, op, value, lower, upper, values = match.groups()
+        if key not in columns:
+            raise ValueError(
+                f"Unknown key {key} in query, the keys are {', '.join(columns)}"
+            )
+        if op:
+            clauses.append(f'"{key}" {"=" if op == "==" else op} ?')
+            params.append(query_value(value))
+        elif lower is not None:
+            clauses.append(f'"{key}" BETWEEN ? AND ?')
+            params.extend([query_value(lower), query_value(upper)])
+        else:
+            values = [value for value in re.split(r"[\s,]+", values) if value]
+            clauses.append(f'"{key}" IN ({", ".join("?" * len(values))})')
+            params.extend(query_value(value) for value in values)
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def query_value(value):
+    value = value.strip("'\"")
+    try:
+        return parse_number(value)
+    except ValueError:
+        return value
+
+
+def open_sweep_store(path):
+    # Opens a sweep store read-only, rather than creating a missing one
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Sweep store {path} not found")
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+
+
+def sweep_store_columns(db):
+    return [row[1] for row in db.execute("PRAGMA table_info(sweep)")]
+
+
+def iter_sweep_store_chunks(path, columns=None, query=None):
+    # Yields the rows of a sweep store matching query in lists, in process
+    # order, as tuples of columns (all of them by default). The query is
+    # answered from the key indexes, without reading the other rows.
+    db = open_sweep_store(path)
+    try:
+        stored = sweep_store_columns(db)
+        columns = stored if columns is None else list(columns)
+        missing = [column for column in columns if column not in stored]
+        if missing:
+            raise ValueError(
+                f"Sweep store {path} has no column {', '.join(missing)}, it has {', '.join(stored)}"
+            )
+        where, params = query_sql(query, stored)
+        selected = ", ".join(f'"{column}"' for column in columns) or "process"
+        cursor = db.execute(
+            f"SELECT {selected} FROM sweep{where} ORDER BY process", params
+        )
+        while True:
+            rows = cursor.fetchmany(SWEEP_STORE_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        db.close()
+
+
+def query_sweep_store(path, query=None, limit=None):
+    # The rows of a sweep store matching query as dicts, process included
+    with contextlib.closing(open_sweep_store(path)) as db:
+        columns = sweep_store_columns(db)
+    rows = itertools.chain.from_iterable(iter_sweep_store_chunks(path, columns, query))
+    return [dict(zip(columns, row)) for row in itertools.islice(rows, limit)]
+
+
+def read_sweep_store(path, keys, query=None):
+    # The vars of the rows of a sweep store matching query, in process order
+    columns = [[] for _ in keys]
+    num_rows = 0
+    with paused_gc():
+        for chunk in iter_sweep_store_chunks(path, keys, query):
+            num_rows += len(chunk)
+            for column, values in zip(columns, zip(*chunk)):
+                column.extend(values)
+    if not keys:
+        return [{} for _ in range(num_rows)]
+    return Sweep([(keys, columns)], coerce=False)
+
+
+def coerce_value(value):
+    return int(value) if str(value).isdigit() else value
 
-    with open(job_queue_file, "r") as f:
-        lines = f.readlines()
-        for line in lines:
-            if "," in line:
-                combination = line.replace(" ", "").replace("\n", "").split(",")
-            else:
-                combination = line.replace("\n", "").split(" ")
 
-            if len(combination) != len(keys):
-                print(combination)
-                print(f"Warning: Number of values in line does not match number of keys.")
+class Sweep:
+    """
+    Lazy parameter sweep.
+
+    Values are kept column by column in ``factors``, a list of
+    ``(keys, columns)`` pairs. The keys of one factor move in lock-step (like
+    ``zip``) and the factors are combined as a cartesian product, the last
+    factor varying fastest. Combinations are only built when iterated or
+    indexed, so a sweep of millions of points costs no more than its columns.
+    A sampled sweep is a single factor of all its keys, drawn by ``sampled``.
+    """
+
+    spec = None  # Spec of a sampled sweep, see sweep_from_spec
+
+    def __init__(self, factors, coerce=True):
+        self.factors = []
+        for keys, columns in factors:
+            if coerce:
+                columns = [
+                    [coerce_value(value) for value in column] for column in columns
+                ]
+            if any(len(column) != len(columns[0]) for column in columns):
+                raise ValueError(
+                    f"Grouped keys {', '.join(keys)} must have the same number of values."
+                )
+            self.factors.append((tuple(keys), columns))
+        self.keys = [key for keys, _ in self.factors for key in keys]
+        self.sizes = [len(columns[0]) for _, columns in self.factors]
+
+    @classmethod
+    def product(cls, keys_values):
+        return cls([((key,), [values]) for key, values in keys_values.items()])
+
+    @classmethod
+    def grouped(cls, keys_values, groups, grouped_first=True):
+        # Each group is zipped, then all groups and free keys are crossed
+        grouped_keys = {key for group in groups for key in group}
+        grouped_factors = [
+            (group, [keys_values[key] for key in group]) for group in groups
+        ]
+        free_factors = [
+            ((key,), [values])
+            for key, values in keys_values.items()
+            if key not in grouped_keys
+        ]
+        if grouped_first:
+            return cls(grouped_factors + free_factors)
+        return cls(free_factors + grouped_factors)
+
+    @classmethod
+    def sampled(cls, keys_values, jobs, method="lhs", seed=SAMPLE_SEED, groups=()):
+        # jobs combinations drawn by a sampling design, each group of keys
+        # being drawn as one. A key takes a list of values, or a continuous
+        # interval {"lower", "upper", "scale"} (see key_values).
+        grouped_keys = {key for group in groups for key in group}
+        dims = [list(group) for group in groups] + [
+            [key] for key in keys_values if key not in grouped_keys
+        ]
+        sizes = []
+        for dim in dims:
+            values = [keys_values[key] for key in dim]
+            if isinstance(values[0], dict):
+                if len(dim) > 1:
+                    raise ValueError("Grouped keys cannot be continuous intervals.")
+                sizes.append(None)
+            elif any(len(value) != len(values[0]) for value in values):
+                raise ValueError(
+                    f"Grouped keys {', '.join(dim)} must have the same number of values."
+                )
+            else:
+                sizes.append(len(values[0]))
 
-            var = {}
-            for i, key in enumerate(keys):
-                if combination[i].isdigit():
-                    var[key] = int(combination[i])
+        columns = {}
+        for dim, size, design in zip(
+            dims, sizes, sample_design(sizes, jobs, method, seed)
+        ):
+            for key in dim:
+                values = keys_values[key]
+                if size is None:
+                    columns[key] = interval_points(values, design)
                 else:
-                    var[key] = combination[i]
-            vars.append(var)
+                    values = [coerce_value(value) for value in values]
+                    columns[key] = [values[index] for index in design]
+        keys = list(keys_values)
+        return cls([(keys, [columns[key] for key in keys])], coerce=False)
+
+    def __len__(self):
+        return math.prod(self.sizes)
+
+    def __iter__(self):
+        keys = self.keys
+        for row in self.rows():
+            yield dict(zip(keys, row))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Sweep index out of range")
+
+        # Mixed-radix decomposition, the last factor varying fastest
+        positions = []
+        for size in reversed(self.sizes):
+            index, position = divmod(index, size)
+            positions.append(position)
+        positions.reverse()
+
+        var = {}
+        for (keys, columns), position in zip(self.factors, positions):
+            for key, column in zip(keys, columns):
+                var[key] = column[position]
+        return var
+
+    def rows(self, keys=None):
+        # Yields the combinations as tuples of values, in the order of keys
+        if all(len(keys_) == 1 for keys_, _ in self.factors):
+            rows = itertools.product(*[columns[0] for _, columns in self.factors])
+        else:
+            rows = (
+                tuple(itertools.chain.from_iterable(groups))
+                for groups in itertools.product(
+                    *[list(zip(*columns)) for _, columns in self.factors]
+                )
+            )
 
-    return vars
+        if keys is None or list(keys) == self.keys:
+            yield from rows
+        else:
+            order = [self.keys.index(key) for key in keys]
+            for row in rows:
+                yield tuple(row[i] for i in order)
 
 
 def set_vars(job_sub):
     pattern = r"\$\((.*?)\)"
     keys = re.findall(pattern, job_sub["arguments"])
     keys_values = {}
+    # The keys as in a sweep spec, for sampled designs
+    spec_keys = {}
 
     for key in keys:
         while True:
             try:
                 key_type = input(
-                    f"\nEnter the number associated with the type of key for {key}:\n1. Fixed/List\n2. Interval\n"
+                    f"\nEnter the number associated with the type of key for {key}:\n1. Fixed/List\n2. Interval\n3. Float interval\n"
                 )
-                if key_type not in ["1", "2"]:
-                    raise ValueError("Invalid choice. Please enter 1 or 2.")
+                if key_type not in ["1", "2", "3"]:
+                    raise ValueError("Invalid choice. Please enter 1, 2 or 3.")
 
                 if key_type == "1":
                     values = input(
@@ -154,139 +1157,725 @@ def set_vars(job_sub):
                         values = values.split(" ")
                     if not values:
                         raise ValueError("Please enter at least one value.")
-                    keys_values[key] = values
+                    keys_values[key] = spec_keys[key] = values
                     break
 
                 elif key_type == "2":
                     lower = int(input(f"Enter the lower bound for {key}: "))
                     upper = int(input(f"Enter the upper bound for {key}: "))
                     step = int(input(f"Enter the step for {key}: "))
-                    if lower >= upper:
-                        raise ValueError("Lower bound must be less than upper bound.")
-                    if step <= 0:
-                        raise ValueError("Step must be greater than 0.")
-                    values = list(range(lower, upper + 1, step))
-                    keys_values[key] = values
+                    keys_values[key] = interval_values(lower, upper, step)
+                    spec_keys[key] = {"lower": lower, "upper": upper, "step": step}
+                    break
+
+                elif key_type == "3":
+                    spec = {
+                        "lower": float(input(f"Enter the lower bound for {key}: ")),
+                        "upper": float(input(f"Enter the upper bound for {key}: ")),
+                    }
+                    if input("Use a log scale? (y/N) ").lower() == "y":
+                        spec["scale"] = "log"
+                    num = input(
+                        "Enter the number of values, or nothing to draw from the whole interval in a sampled design: "
+                    ).strip()
+                    if num:
+                        spec["num"] = int(num)
+                    keys_values[key] = key_values(spec)
+                    spec_keys[key] = spec
                     break
             except ValueError as e:
                 print(f"Error: {e}. Please try again.")
 
+    continuous = any(isinstance(values, dict) for values in keys_values.values())
     while True:
         try:
             combine_option = input(
-                "How would you like to combine the arguments?\n1. All combinations\n2. Grouped combinations\nEnter choice (1/2): "
+                f"How would you like to combine the arguments?\n1. All combinations\n2. Grouped combinations\n3. Sampled design ({', '.join(SAMPLE_METHODS)})\nEnter choice (1/2/3): "
             )
-            if combine_option not in ["1", "2"]:
-                raise ValueError("Invalid choice. Please enter 1 or 2.")
+            if combine_option not in ["1", "2", "3"]:
+                raise ValueError("Invalid choice. Please enter 1, 2 or 3.")
+            if continuous and combine_option != "3":
+                raise ValueError(
+                    "Intervals without a number of values can only be sampled"
+                )
             break
         except ValueError as e:
             print(f"Error: {e}. Please try again.")
 
-    if combine_option == "1":
-        # Generate all combinations, iterating over the first arguments first
-        combinations = list(itertools.product(*[keys_values[key] for key in keys]))
-        vars = []
-        for combination in combinations:
-            var = {}
-            for key in keys:  # Iterate through keys in their original order
-                value = combination[keys.index(key)]  # Get the value for this key
-                var[key] = int(value) if str(value).isdigit() else value
-            vars.append(var)
-    elif combine_option == "2":
-        # For grouped combinations
-        free_keys = list(keys)  # Use a list instead of set to maintain order
-        grouped_keys = []
-
-        while free_keys:
-            print("\nFree keys:", ", ".join(free_keys))
-            group = input(
-                "Enter keys to group together (space-separated), or press Enter to finish grouping: "
-            ).split()
-
-            if not group:
-                break
-
+    if combine_option == "3":
+        # A given number of combinations, drawn by a seeded design
+        while True:
             try:
-                if not all(key in free_keys for key in group):
-                    raise ValueError("Invalid keys. Please use only free keys.")
-                if len(group) < 2:
-                    raise ValueError("Groups must contain at least 2 keys.")
-                # Make sure that the number of values for each key in the group is the same
-                group_values = [keys_values[key] for key in group]
-                if not all(
-                    len(values) == len(group_values[0]) for values in group_values
-                ):
-                    raise ValueError(
-                        "Number of values for each key in the group must be the same."
-                    )
-                grouped_keys.append(group)
-                for key in group:
-                    free_keys.remove(key)
+                method = (
+                    input(
+                        f"Enter the sampling method ({', '.join(SAMPLE_METHODS)}, default lhs): "
+                    ).strip()
+                    or "lhs"
+                )
+                if method not in SAMPLE_METHODS:
+                    raise ValueError(f"Unknown sampling method {method}")
+                sample = {
+                    "method": method,
+                    "jobs": int(input("Enter the number of jobs: ")),
+                    "seed": int(
+                        input(f"Enter the seed (default {SAMPLE_SEED}): ")
+                        or SAMPLE_SEED
+                    ),
+                }
+                return sweep_from_spec({"keys": spec_keys, "sample": sample}, keys)
             except ValueError as e:
                 print(f"Error: {e}. Please try again.")
 
-        group_vars = []
-        for group in grouped_keys:
-            group_values = [keys_values[key] for key in group]
-            combinations = list(zip(*group_values))
-            group_var_list = []
-            for combination in combinations:
-                var = {}
-                for i, key in enumerate(group):
-                    value = combination[i]
-                    var[key] = int(value) if str(value).isdigit() else value
-                group_var_list.append(var)
-            group_vars.append(group_var_list)
-
-        # Ensemble all groups : Take the product of each group
-        grouped_primitive_vars = list(itertools.product(*group_vars))
-        for i in range(len(grouped_primitive_vars)):
-            # Flatten the list of dictionaries into a single dictionary
-            var = {}
-            for group_var in grouped_primitive_vars[i]:
-                var.update(group_var)
-            grouped_primitive_vars[i] = var
-
-        free_vars = []
-        for key in free_keys:
-            free_vars.append([{key: value} for value in keys_values[key]])
-        free_primitive_vars = list(itertools.product(*free_vars))
-
-        for i in range(len(free_primitive_vars)):
-            var = {}
-            for group_var in free_primitive_vars[i]:
-                var.update(group_var)
-            free_primitive_vars[i] = var
-
-        # Prompt user for order by group or by free
+    if combine_option == "1":
+        # All combinations, iterating over the first arguments first
+        return Sweep.product(keys_values)
 
-        while True:
-            try:
-                order_option = input(
-                    "How would you like to order the combinations?\n1. Grouped first\n2. Free first\nEnter choice (1/2): "
+    # For grouped combinations
+    free_keys = list(keys)  # Use a list instead of set to maintain order
+    grouped_keys = []
+
+    while free_keys:
+        print("\nFree keys:", ", ".join(free_keys))
+        group = input(
+            "Enter keys to group together (space-separated), or press Enter to finish grouping: "
+        ).split()
+
+        if not group:
+            break
+
+        try:
+            if not all(key in free_keys for key in group):
+                raise ValueError("Invalid keys. Please use only free keys.")
+            if len(group) < 2:
+                raise ValueError("Groups must contain at least 2 keys.")
+            # Make sure that the number of values for each key in the group is the same
+            group_values = [keys_values[key] for key in group]
+            if not all(len(values) == len(group_values[0]) for values in group_values):
+                raise ValueError(
+                    "Number of values for each key in the group must be the same."
                 )
-                if order_option not in ["1", "2"]:
-                    raise ValueError("Invalid choice. Please enter 1 or 2.")
+            grouped_keys.append(group)
+            for key in group:
+                free_keys.remove(key)
+        except ValueError as e:
+            print(f"Error: {e}. Please try again.")
+
+    # Prompt user for order by group or by free
+    while True:
+        try:
+            order_option = input(
+                "How would you like to order the combinations?\n1. Grouped first\n2. Free first\nEnter choice (1/2): "
+            )
+            if order_option not in ["1", "2"]:
+                raise ValueError("Invalid choice. Please enter 1 or 2.")
+            break
+        except ValueError as e:
+            print(f"Error: {e}. Please try again.")
+
+    return Sweep.grouped(keys_values, grouped_keys, grouped_first=order_option == "1")
+
+
+def interval_values(lower, upper, step):
+    if lower >= upper:
+        raise ValueError("Lower bound must be less than upper bound.")
+    if step <= 0:
+        raise ValueError("Step must be greater than 0.")
+    if all(isinstance(value, int) for value in [lower, upper, step]):
+        return range(lower, upper + 1, step)
+    # Rounded, so that steps such as 0.1 do not pile up float errors
+    count = math.floor((upper - lower) / step + 1e-9) + 1
+    return [round(lower + i * step, 12) for i in range(count)]
+
+
+def spaced_values(lower, upper, num, scale="linear"):
+    # num values from lower to upper, evenly spaced, or in geometric
+    # progression with scale "log"
+    if lower >= upper:
+        raise ValueError("Lower bound must be less than upper bound.")
+    if num < 2:
+        raise ValueError("Number of values must be at least 2.")
+    if scale == "log":
+        if lower <= 0:
+            raise ValueError("Log-scale bounds must be greater than 0.")
+        ratio = (upper / lower) ** (1 / (num - 1))
+        return [float(f"{lower * ratio**i:.12g}") for i in range(num)]
+    step = (upper - lower) / (num - 1)
+    return [float(f"{lower + i * step:.12g}") for i in range(num)]
+
+
+def parse_number(value):
+    # An int or a float, from a spec or an answer
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def key_values(spec):
+    # Values of a key of a sweep spec: a list, a single value, or an interval
+    # {"lower", "upper"} and either a "step", a number of values "num"
+    # spaced on a "linear" or "log" "scale", or neither. Integer bounds
+    # without either take every integer, other bounds make a continuous
+    # interval, returned as {"lower", "upper", "scale"} for sampled sweeps.
+    if not isinstance(spec, dict):
+        return spec if isinstance(spec, list) else [spec]
+    lower, upper = parse_number(spec["lower"]), parse_number(spec["upper"])
+    scale = spec.get("scale", "linear")
+    if scale not in ["linear", "log"]:
+        raise ValueError(f"Unknown scale {scale}, use linear or log.")
+    if "num" in spec:
+        return spaced_values(lower, upper, int(spec["num"]), scale)
+    if "step" in spec or (
+        scale == "linear" and isinstance(lower, int) and isinstance(upper, int)
+    ):
+        return interval_values(lower, upper, parse_number(spec.get("step", 1)))
+    if lower >= upper:
+        raise ValueError("Lower bound must be less than upper bound.")
+    if scale == "log" and lower <= 0:
+        raise ValueError("Log-scale bounds must be greater than 0.")
+    return {"lower": lower, "upper": upper, "scale": scale}
+
+
+def interval_points(interval, design):
+    # The points of a continuous interval at the positions of design, in [0, 1)
+    lower, upper = interval["lower"], interval["upper"]
+    if interval["scale"] == "log":
+        lower, span = math.log(lower), math.log(upper) - math.log(lower)
+        return [math.exp(lower + u * span) for u in design]
+    span = upper - lower
+    return [lower + u * span for u in design]
+
+
+def sample_design(sizes, jobs, method="lhs", seed=SAMPLE_SEED):
+    """
+    Draws jobs points of a sampling design, over dimensions of the given
+    sizes (None for a continuous dimension), and returns one column per
+    dimension: the index of the value of each point for a dimension of
+    values, and its position in [0, 1) for a continuous one.
+
+    method is "random" (distinct combinations drawn at random when every
+    dimension has values, independent uniform points otherwise), "lhs"
+    (Latin hypercube: each dimension is cut into jobs strata, each stratum
+    holding one point), "sobol" or "halton" (quasi-random sequences,
+    randomized by a digital shift and a rotation). The same seed always
+    gives the same design. Columns are built whole, as numpy arrays when
+    numpy is installed and a comprehension at a time otherwise. The random
+    and lhs draws then come from a numpy Generator seeded with seed, so
+    their design differs from the one drawn without numpy, while Sobol and
+    Halton designs are the same either way.
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(
+            f"Unknown sampling method {method}, use one of {', '.join(SAMPLE_METHODS)}."
+        )
+    if jobs < 1:
+        raise ValueError("Number of jobs must be at least 1.")
+    rng = random.Random(seed)
+    draw = rng.random
+    np = optional_numpy()
+    # numpy draws whole arrays from its own stream of the seed
+    generator = np.random.default_rng(seed) if np is not None else None
+
+    if method == "random" and None not in sizes:
+        # Distinct combinations, in the order of the full product
+        total = math.prod(sizes)
+        if jobs >= total:
+            indexes = range(total)
+        elif np is not None and total < 1 << 63:
+            indexes = np.sort(generator.choice(total, jobs, replace=False))
+        elif total > sys.maxsize:
+            # Too many combinations for random.sample, which are then drawn
+            # until jobs distinct ones are
+            indexes = set()
+            while len(indexes) < jobs:
+                indexes.add(rng.randrange(total))
+            indexes = sorted(indexes)
+        else:
+            indexes = sorted(rng.sample(range(total), jobs))
+        if np is not None and total < 1 << 63:
+            indexes = np.asarray(indexes, dtype=np.int64)
+        columns, stride = [], total
+        for size in sizes:
+            stride //= size
+            if np is not None and total < 1 << 63:
+                columns.append((indexes // stride % size).tolist())
+            else:
+                columns.append([index // stride % size for index in indexes])
+        return columns
+
+    if method == "random" and np is not None:
+        units = generator.random((jobs, len(sizes))).T
+    elif method == "random":
+        units = [[draw() for _ in range(jobs)] for _ in sizes]
+    elif method == "lhs" and np is not None:
+        # Each column is its own permutation of the strata
+        strata = np.broadcast_to(np.arange(jobs)[:, None], (jobs, len(sizes)))
+        strata = generator.permuted(strata, axis=0)
+        units = ((strata + generator.random((jobs, len(sizes)))) / jobs).T
+    elif method == "lhs":
+        units = []
+        for _ in sizes:
+            strata = list(range(jobs))
+            rng.shuffle(strata)
+            units.append([(stratum + draw()) / jobs for stratum in strata])
+    elif method == "sobol":
+        units = sobol_columns(len(sizes), jobs, rng)
+    else:
+        units = halton_columns(len(sizes), jobs, rng)
+
+    if np is not None:
+        columns = []
+        for size, column in zip(sizes, units):
+            column = np.asarray(column)
+            if size is not None:
+                column = np.minimum((column * size).astype(np.int64), size - 1)
+            columns.append(column.tolist())
+        return columns
+    return [
+        column if size is None else [min(int(u * size), size - 1) for u in column]
+        for size, column in zip(sizes, units)
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def optional_numpy():
+    # numpy is used for large sampled designs when it is installed
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def sobol_directions(dim, bits=SOBOL_BITS):
+    # The direction numbers v_1..v_bits of a dimension of the Sobol sequence,
+    # as integers of bits bits
+    if dim == 0:
+        return [1 << (bits - k) for k in range(1, bits + 1)]
+    s, a, m = SOBOL_DIRECTIONS[dim - 1]
+    v = [m[k] << (bits - k - 1) for k in range(min(s, bits))]
+    for k in range(s, bits):
+        value = v[k - s] ^ (v[k - s] >> s)
+        for j in range(1, s):
+            if (a >> (s - 1 - j)) & 1:
+                value ^= v[k - j]
+        v.append(value)
+    return v
+
+
+def sobol_columns(dims, n, rng):
+    # The first n points of the Sobol sequence, in natural rather than Gray
+    # code order: the points of [2**k, 2**(k + 1)) are those of [0, 2**k)
+    # XORed with the direction number k + 1. Each column is XORed with a
+    # random integer, a digital shift that keeps the sequence's strata.
+    if dims > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError(
+            f"Sobol designs have at most {len(SOBOL_DIRECTIONS) + 1} keys, use lhs or halton."
+        )
+    if n > 1 << SOBOL_BITS:
+        raise ValueError(f"Sobol designs have at most {1 << SOBOL_BITS} points.")
+    scale = 2.0**-SOBOL_BITS
+    np = optional_numpy()
+    columns = []
+    for dim in range(dims):
+        if np is not None:
+            points, size = np.zeros(n, dtype=np.uint64), 1
+            for direction in sobol_directions(dim):
+                if size >= n:
+                    break
+                count = min(size, n - size)
+                points[size : size + count] = points[:count] ^ np.uint64(direction)
+                size += count
+            shift = np.uint64(rng.getrandbits(SOBOL_BITS))
+            columns.append(((points ^ shift) * scale).tolist())
+            continue
+        points = [0]
+        for direction in sobol_directions(dim):
+            if len(points) >= n:
                 break
-            except ValueError as e:
-                print(f"Error: {e}. Please try again.")
+            points += [point ^ direction for point in points[: n - len(points)]]
+        shift = rng.getrandbits(SOBOL_BITS)
+        columns.append([(point ^ shift) * scale for point in points])
+    return columns
+
+
+def halton_columns(dims, n, rng):
+    # The first n points of the Halton sequence, the radical inverse of the
+    # point index in the dimension's prime base. Digit k of the indexes of
+    # [d * base**k, (d + 1) * base**k) is d, so each column is built from its
+    # first base**k points. Each column is rotated by a random offset.
+    np = optional_numpy()
+    columns = []
+    for base in primes(dims):
+        if np is not None:
+            points, scale = np.zeros(1), 1.0
+            while len(points) < n:
+                scale /= base
+                digits = min(base, -(-n // len(points)))
+                points = (points + np.arange(digits)[:, None] * scale).ravel()
+            shift = rng.random()
+            columns.append(((points[:n] + shift) % 1.0).tolist())
+            continue
+        points, scale = [0.0], 1.0
+        while len(points) < n:
+            scale /= base
+            digits = min(base, -(-n // len(points)))
+            points = [point + d * scale for d in range(digits) for point in points]
+        shift = rng.random()
+        columns.append([(point + shift) % 1.0 for point in points[:n]])
+    return columns
+
+
+def primes(count):
+    found = []
+    candidate = 2
+    while len(found) < count:
+        if all(candidate % prime for prime in found):
+            found.append(candidate)
+        candidate += 1
+    return found
+
+
+def sweep_from_spec(sweep, keys):
+    # Builds the Sweep described by a spec, of the form
+    # {"keys": {key: [values] or {"lower": ..., "upper": ..., "step": ...}},
+    #  "groups": [[key, ...], ...], "order": "grouped" or "free",
+    #  "sample": {"method": "lhs", "jobs": ..., "seed": ...}}
+    # (see key_values for the intervals). With sample, jobs combinations are
+    # drawn by a sampling design instead of taking them all.
+    spec_keys = sweep.get("keys", {})
+    if set(spec_keys) != set(keys):
+        raise ValueError(
+            f"Sweep keys {', '.join(spec_keys)} do not match the job arguments {', '.join(keys)}"
+        )
+
+    keys_values = {key: key_values(spec_keys[key]) for key in keys}
+    groups = sweep.get("groups", [])
+    if any(key not in keys_values for group in groups for key in group):
+        raise ValueError("Sweep groups can only contain the job arguments.")
+
+    sample = sweep.get("sample")
+    if sample:
+        sampled = Sweep.sampled(
+            keys_values,
+            int(sample["jobs"]),
+            sample.get("method", "lhs"),
+            sample.get("seed", SAMPLE_SEED),
+            groups,
+        )
+        sampled.spec = sweep
+        return sampled
+    if any(isinstance(values, dict) for values in keys_values.values()):
+        raise ValueError(
+            "Intervals without a step or a number of values can only be sampled."
+        )
+    if not groups:
+        return Sweep.product(keys_values)
+    return Sweep.grouped(
+        keys_values, groups, grouped_first=sweep.get("order", "grouped") == "grouped"
+    )
+
+
+def sweep_spec(sweep):
+    # The spec of a Sweep made by set_vars, such that sweep_from_spec builds
+    # the same sweep again
+    if sweep.spec is not None:
+        return sweep.spec
+    spec = {"keys": {}}
+    groups = []
+    for keys, columns in sweep.factors:
+        for key, column in zip(keys, columns):
+            spec["keys"][key] = list(column)
+        if len(keys) > 1:
+            groups.append(list(keys))
+    if groups:
+        spec["groups"] = groups
+        spec["order"] = "grouped" if len(sweep.factors[0][0]) > 1 else "free"
+    return spec
+
+
+def add_layer(parent, vars, edge=None, **kwargs):
+    # The layer is created empty and then handed vars itself, so that a lazy
+    # Sweep is streamed by the DAG writer instead of copied into a list of dicts
+    if edge is None:
+        layer = parent.layer(**kwargs)
+    else:
+        layer = parent.child_layer(edge=edge, **kwargs)
+    layer.vars = vars
+    return layer
+
+
+def write_dag_stream(
+    dag,
+    dag_dir,
+    dag_file_name="dagfile.dag",
+    join_threshold=JOIN_THRESHOLD,
+    reuse=None,
+    layer_ranges=None,
+    join_report=None,
+    submit_files=True,
+):
+    """
+    Write out the given DAG like dags.write_dag, streaming the JOB, VARS,
+    SCRIPT and PARENT/CHILD lines straight to the .dag file.
+
+    Node names and VARS are generated on the fly from the layers' vars, so
+    memory stays bounded by the largest single line rather than the number of
+    nodes. The output is the same as the one of dags.write_dag, except for:
+
+    - the join nodes: a group of N parents and M children (ManyToMany edges,
+      Grouper chunks) goes through a NOOP join node, i.e. N + M edges instead
+      of N x M, only when that saves at least join_threshold edges. The
+      default, JOIN_THRESHOLD, leaves small groups unjoined where
+      dags.write_dag joins them. With join_threshold 0, every group of more
+      than one parent and child gets a join, as with dags.write_dag. With
+      join_threshold None, none does.
+    - the throttles of the DAG's max_jobs_by_category, written as the
+      MAXJOBS lines DAGMan reads instead of CATEGORY lines.
+
+    Other DAGs written with join_threshold 0 are the same byte for byte.
+
+    reuse maps layer names to the [start, end) byte range of their nodes in
+    the current .dag file, copied as is instead of being generated again.
+    The byte ranges of the layers written are stored in layer_ranges.
+    Join nodes are counted into join_report when given, instead of printed.
+    With submit_files False, the .sub and dagman.config files are left for
+    the caller to write.
+    """
+    # The htcondor writer is kept for the parts that are not per node: the
+    # meta lines, the scripts and the submit and config files
+    writer = dags.writer.DAGWriter(dag)
+    dag_dir = Path(dag_dir).absolute()
+    dag_dir.mkdir(parents=True, exist_ok=True)
+    dag_file_path = dag_dir / (dag_file_name or dags.DEFAULT_DAG_FILE_NAME)
+
+    report = join_report is None
+    if report:
+        join_report = {"joins": 0, "direct_edges": 0, "edges": 0}
+    reuse = reuse or {}
+    layer_ranges = {} if layer_ranges is None else layer_ranges
+    tmp_path = dag_file_path.with_name(dag_file_path.name + ".tmp")
+    with open(tmp_path, "w", buffering=DAG_WRITE_BUFFER_SIZE) as f:
+
+        def yield_layer_text(layer):
+            start = f.tell()
+            if layer.name in reuse:
+                yield from yield_file_text(
+                    dag_file_path, *reuse[layer.name], f.encoding
+                )
+            else:
+                yield from yield_layer_stream_text(writer, layer)
+            layer_ranges[layer.name] = [start, f.tell()]
+
+        f.writelines(
+            yield_dag_stream_text(writer, join_threshold, join_report, yield_layer_text)
+        )
+        profile_count("bytes_written", f.tell())
+    os.replace(tmp_path, dag_file_path)
+    profile_count("files_written")
+
+    if report:
+        print_join_report(join_report)
+
+    if submit_files:
+        writer.write_submit_files_for_layers(dag_dir)
+        if len(writer.join_factory.joins) > 0:
+            writer.write_noop_submit_file(dag_dir)
+        if len(dag.dagman_config) > 0:
+            writer.write_dagman_config_file(dag_dir)
+
+    return dag_file_path
+
+
+def print_join_report(join_report):
+    if join_report["joins"]:
+        print(
+            f"Inserted {join_report['joins']} join node(s): {join_report['edges']} edges "
+            f"instead of {join_report['direct_edges']} ({join_report['direct_edges'] - join_report['edges']} saved)"
+        )
+
 
-        if order_option == "1":
-            vars = []
-            for grouped_primitive_var in grouped_primitive_vars:
-                for free_primitive_var in free_primitive_vars:
-                    var = grouped_primitive_var.copy()
-                    var.update(free_primitive_var)
-                    vars.append(var)
+def yield_dag_stream_text(writer, join_threshold, join_report, yield_layer_text=None):
+    # Yields the text of the .dag file in pieces, each line ending with "\n"
+    dag = writer.dag
+    yield_layer_text = yield_layer_text or functools.partial(
+        yield_layer_stream_text, writer
+    )
+    yield "# BEGIN META\n"
+    yield from (line + "\n" for line in yield_dag_meta_lines(writer))
+    yield "# END META\n"
+
+    yield "# BEGIN NODES AND EDGES\n"
+    for node in dag.walk(order=dags.WalkOrder.BREADTH_FIRST):
+        if isinstance(node, dags.NodeLayer):
+            yield from yield_layer_text(node)
+        else:
+            yield from (line + "\n" for line in writer.yield_node_lines(node))
+        yield from yield_edge_stream_text(writer, node, join_threshold, join_report)
+    yield from (line + "\n" for line in writer.yield_join_node_lines())
+    yield "# END NODES AND EDGES\n"
+
+    if dag._final_node is not None:
+        yield "# FINAL NODE\n"
+        yield from (line + "\n" for line in writer.yield_node_lines(dag._final_node))
+        yield "# END FINAL NODE\n"
+
+
+def yield_dag_meta_lines(writer, max_jobs=None):
+    # The meta lines of the htcondor writer, except that the throttles of
+    # max_jobs_per_category (or max_jobs) are written as MAXJOBS lines, where
+    # the writer writes CATEGORY lines that DAGMan does not accept
+    for line in writer.yield_dag_meta_lines():
+        if not line.startswith("CATEGORY "):
+            yield line
+    if max_jobs is None:
+        max_jobs = writer.dag.max_jobs_per_category
+    for category, value in max_jobs.items():
+        yield f"MAXJOBS {category} {value}"
+
+
+def yield_file_text(path, start, end, encoding):
+    # Yields the text between two byte offsets of a file
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            block = f.read(min(left, DAG_WRITE_BUFFER_SIZE))
+            if not block:
+                raise ValueError(f"{path} is shorter than its layer manifest")
+            left -= len(block)
+            yield decoder.decode(block, final=left == 0)
+
+
+def escape_var(value):
+    return str(value).replace("\\", "\\\\").replace('"', r"\"")
+
+
+def yield_layer_stream_text(writer, layer):
+    # Checks that the layer name can be formatted, like the htcondor writer
+    writer.get_node_name(layer, 0)
+
+    sub_file = (
+        "{}.sub".format(layer.name)
+        if isinstance(layer.submit_description, htcondor.Submit)
+        else layer.submit_description.absolute().as_posix()
+    )
+    per_node_parts = any(layer.noop.values()) or any(layer.done.values())
+    job_suffix = "".join(" " + part for part in writer.get_node_meta_parts(layer, 0))
+    # The meta lines only differ by node name, split them once around it
+    meta_lines = [
+        line.split("\0") for line in writer.yield_node_meta_lines(layer, "\0")
+    ]
+
+    if isinstance(layer.vars, Sweep):
+        prefixes = [f' {key}="' for key in layer.vars.keys]
+        rows = (zip(prefixes, row) for row in layer.vars.rows())
+    else:
+        rows = (
+            [(f' {key}="', value) for key, value in var.items()] for var in layer.vars
+        )
+
+    for idx, row in enumerate(rows):
+        name = f"{layer.name}:{idx}"
+        if per_node_parts:
+            job_suffix = "".join(
+                " " + part for part in writer.get_node_meta_parts(layer, idx)
+            )
+        lines = [f"JOB {name} {sub_file}{job_suffix}\n"]
+
+        vars_text = "".join(prefix + escape_var(value) + '"' for prefix, value in row)
+        if vars_text:
+            lines.append(f"VARS {name}{vars_text}\n")
+
+        for parts in meta_lines:
+            lines.append(name.join(parts) + "\n")
+        yield "".join(lines)
+
+
+def yield_edge_groups(edge, parent, child):
+    # Yields the (parents, children) index groups of an edge, every group being
+    # fully connected. Joins made by the edge itself are undone, the caller
+    # decides where join nodes go.
+    if type(edge) is dags.ManyToMany:
+        # Ranges rather than the tuples of ManyToMany.get_edges
+        yield range(len(parent)), range(len(child))
+        return
+
+    pending = None
+    join_node = dags.JoinNode
+    for parents, children in edge.get_edges(parent, child, dags.JoinFactory()):
+        if isinstance(children, join_node):
+            pending = parents
+        elif isinstance(parents, join_node):
+            yield pending, children
         else:
-            vars = []
-            for free_primitive_var in free_primitive_vars:
-                for grouped_primitive_var in grouped_primitive_vars:
-                    var = free_primitive_var.copy()
-                    var.update(grouped_primitive_var)
-                    vars.append(var)
+            yield parents, children
+
 
-    return vars
+def yield_edge_stream_text(writer, parent, join_threshold, join_report):
+    for child in parent.children:
+        edge = writer.dag._edges.get(parent, child)
+        for parents, children in yield_edge_groups(edge, parent, child):
+            direct_edges = len(parents) * len(children)
+            if not direct_edges:
+                # A layer left empty, e.g. with all its combinations done
+                continue
+            if saves_join(len(parents), len(children), join_threshold):
+                join = writer.join_factory.get_join_node()
+                join_report["joins"] += 1
+                join_report["direct_edges"] += direct_edges
+                join_report["edges"] += len(parents) + len(children)
+                groups = [(parents, join), (join, children)]
+                profile_count("join_nodes")
+                profile_count("edges", len(parents) + len(children))
+            else:
+                groups = [(parents, children)]
+                profile_count("edges", direct_edges)
+
+            yield from yield_group_stream_text(writer, parent, child, groups)
+
+
+def saves_join(parents, children, join_threshold):
+    # Whether a join node between the numbers of parents and children saves
+    # enough edges. It never pays off with a single parent or child, where
+    # N + M is above N x M.
+    return (
+        join_threshold is not None
+        and parents * children - (parents + children) >= join_threshold
+    )
+
+
+def yield_group_stream_text(writer, parent, child, groups):
+    for parents, children in groups:
+        yield "PARENT "
+        yield from yield_node_names(writer, parent, parents)
+        yield " CHILD "
+        yield from yield_node_names(writer, child, children)
+        yield "\n"
+
+
+def yield_node_names(writer, node, indexes):
+    # Yields the space-separated names of the nodes at indexes, in batches so
+    # that an edge between two huge layers is never held as one string
+    if isinstance(indexes, dags.JoinNode):
+        yield writer.join_node_name(indexes)
+        return
+    if isinstance(node, dags.SubDAG):
+        yield writer.get_node_name(node, 0)
+        return
+
+    prefix = f"{node.name}:"
+    indexes = iter(indexes)
+    separator = ""
+    while True:
+        batch = list(itertools.islice(indexes, NODE_NAME_BATCH_SIZE))
+        if not batch:
+            break
+        yield separator + " ".join([f"{prefix}{i}" for i in batch])
+        separator = " "
 
 
 def create_dag_directory(dag_name):
@@ -295,17 +1884,22 @@ def create_dag_directory(dag_name):
     return dag_dir
 
 
-def copy_job_files(job_sub_path, dag_dir):
+@profiled("copy")
+def copy_job_files(
+    job_sub_path, dag_dir, checksum=False, store=None, pack=False, hardlink=False
+):
     job_dir = os.path.dirname(job_sub_path)
-    job_sub = htcondor.Submit(open(job_sub_path).read())
+    job_name = os.path.splitext(os.path.basename(job_sub_path))[0]
+    job_sub = SubmitFile.load(job_sub_path)
 
-    files_to_copy = [os.path.basename(job_sub_path)]
-    if "executable" in job_sub.keys():
+    # The submit file is written from its parse, the other files are staged
+    files_to_copy = []
+    if "executable" in job_sub:
         files_to_copy.append(job_sub["executable"])
-    if "transfer_input_files" in job_sub.keys():
-        files_to_copy.extend(
-            job_sub["transfer_input_files"].replace(" ", "").split(",")
-        )
+    inputs = []
+    if "transfer_input_files" in job_sub:
+        inputs = job_sub["transfer_input_files"].replace(" ", "").split(",")
+        files_to_copy.extend(inputs)
 
     # We don't need to copy the queue file, as we will put all vars info in the .dag
     queue = job_sub.getQArgs()
@@ -316,305 +1910,2619 @@ def copy_job_files(job_sub_path, dag_dir):
         print(f"Warning: No {QUEUE_EXT} file found for job {job_sub_path}")
         pass
 
+    # Small inputs are transferred as one archive that the job unpacks
+    packed = []
+    if pack:
+        packed = [file for file in inputs if is_packable(job_dir, file)]
+        if len(packed) < 2:
+            packed = []
+
+    pairs = []
     for file in files_to_copy:
+        # Absolute paths and URLs are transferred from where they are
+        if not file or os.path.isabs(file) or "://" in file or file in packed:
+            continue
         src = os.path.join(job_dir, file)
-        dst = os.path.join(dag_dir, file)
         if os.path.exists(src):
-            shutil.copy2(src, dst)
+            pairs.append((src, os.path.join(dag_dir, file)))
         else:
             print(f"Warning: File {file} not found in {job_dir}")
+    if packed:
+        archive = pack_inputs(job_dir, packed, dag_dir, job_name)
+        pairs.append((archive, os.path.join(dag_dir, job_name + PACK_SUFFIX)))
+    summary = stage_files(pairs, checksum, store, hardlink)
+    print_stage_summary(summary)
+
+    new_job_sub_path = os.path.join(dag_dir, os.path.basename(job_sub_path))
+    if packed:
+        os.unlink(archive)
+        inputs = [file for file in inputs if file and file not in packed]
+        job_sub["transfer_input_files"] = ", ".join(inputs + [job_name + PACK_SUFFIX])
+        print(f"Packed {len(packed)} input file(s) into {job_name + PACK_SUFFIX}")
+        check_unpacks(job_dir, job_sub, job_name)
+    job_sub.save(new_job_sub_path)
+
+    return new_job_sub_path
+
+
+def is_packable(job_dir, file):
+    if not file or os.path.isabs(file) or "://" in file:
+        return False
+    path = os.path.join(job_dir, file)
+    return os.path.isfile(path) and os.path.getsize(path) <= PACK_MAX_SIZE
+
+
+def pack_inputs(job_dir, files, dag_dir, job_name):
+    # Writes the files into a temporary gzipped tarball and returns its path.
+    # Files land in the scratch directory of the job as HTCondor would put
+    # them, and the archive only changes when their content does.
+    def reset(info):
+        info.uid = info.gid = 0
+        info.uname = info.gname = ""
+        return info
+
+    fd, archive = tempfile.mkstemp(suffix=PACK_SUFFIX, dir=dag_dir)
+    with os.fdopen(fd, "wb") as raw, gzip.GzipFile(
+        fileobj=raw, mode="wb", mtime=0
+    ) as gz, tarfile.open(fileobj=gz, mode="w") as tar:
+        for file in sorted(files, key=os.path.basename):
+            tar.add(
+                os.path.join(job_dir, file),
+                arcname=os.path.basename(file),
+                filter=reset,
+            )
+    # Dated like its newest file, so an unchanged archive is left as staged
+    os.utime(
+        archive,
+        ns=(
+            time.time_ns(),
+            max(os.stat(os.path.join(job_dir, f)).st_mtime_ns for f in files),
+        ),
+    )
+    return archive
+
+
+def read_executable(job_dir, job_sub):
+    if "executable" not in job_sub.keys():
+        return None
+    try:
+        with open(os.path.join(job_dir, job_sub["executable"]), errors="ignore") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def check_unpacks(job_dir, job_sub, job_name):
+    # Jobs generated before packing existed do not unpack their archive
+    executable = read_executable(job_dir, job_sub)
+    if executable is not None and PACK_SUFFIX not in executable:
+        print(
+            f"Warning: {job_sub['executable']} does not unpack its inputs, "
+            f"add: tar -xzf {job_name + PACK_SUFFIX}"
+        )
+
+
+def check_bundles(job_dir, job_sub):
+    # Jobs generated before bundling existed run their arguments only once
+    executable = read_executable(job_dir, job_sub)
+    if executable is not None and BUNDLE_SUFFIX not in executable:
+        print(
+            f"Warning: {job_sub['executable']} does not loop over bundles, "
+            "generate the job directory again or copy the bundle loop of a new one"
+        )
+
+
+@profiled("copy")
+def stage_files(pairs, checksum=False, store=None, hardlink=False):
+    # Copies each (src, dst) pair in a thread pool, skipping the destinations
+    # that are already up to date, and returns a summary of what was done
+    summary = {
+        "unchanged": 0,
+        "linked": 0,
+        "copied": 0,
+        "bytes_copied": 0,
+        "bytes_skipped": 0,
+    }
+    with concurrent.futures.ThreadPoolExecutor(STAGE_WORKERS) as pool:
+        for action, size in pool.map(
+            lambda pair: stage_file(*pair, checksum, store, hardlink), pairs
+        ):
+            summary[action] += 1
+            if action == "copied":
+                summary["bytes_copied"] += size
+            else:
+                summary["bytes_skipped"] += size
+    profile_count("files_staged", len(pairs))
+    profile_count("files_copied", summary["copied"])
+    profile_count("files_linked", summary["linked"])
+    profile_count("bytes_copied", summary["bytes_copied"])
+    return summary
+
+
+def stage_file(src, dst, checksum=False, store=None, hardlink=False):
+    # Returns what was done to bring dst up to date with src, and its size.
+    # A reflink is a copy that shares blocks until either file is written. A
+    # hard link is the source file itself, so editing one edits the other:
+    # it is only made when hardlink is set.
+    src_stat = os.stat(src)
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    # Submit files are rewritten in place once staged, so they are never
+    # linked to their source nor to the store
+    if store is not None and not dst.endswith(".sub"):
+        action = "linked" if store.link(src, dst) else "unchanged"
+        return action, src_stat.st_size
+
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        dst_stat = None
+
+    if dst_stat is not None:
+        if os.path.samestat(src_stat, dst_stat):
+            return "unchanged", src_stat.st_size
+        if dst_stat.st_size == src_stat.st_size:
+            if dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                return "unchanged", src_stat.st_size
+            if checksum and file_digest(src) == file_digest(dst):
+                shutil.copystat(src, dst)
+                return "unchanged", src_stat.st_size
+    if os.path.lexists(dst):
+        # Never write through dst, it may be a link to another file
+        os.unlink(dst)
+    else:
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+
+    if not dst.endswith(".sub"):
+        if reflink(src, dst):
+            return "linked", src_stat.st_size
+        if hardlink:
+            try:
+                os.link(src, dst)
+                return "linked", src_stat.st_size
+            except OSError:
+                pass
+    shutil.copy2(src, dst)
+    return "copied", src_stat.st_size
+
+
+class InputStore:
+    # Content-addressed copies of job inputs, shared by every DAG built from
+    # the same working directory. DAG directories hold symlinks to the store,
+    # so an input used by many DAGs is stored once, and a DAG keeps the inputs
+    # it was built with when their sources are edited.
+    def __init__(self, path=INPUT_STORE_DIR):
+        self.path = os.path.abspath(path)
+        self.index_path = os.path.join(self.path, "index.json")
+        # Digests by absolute source path, along with the size and mtime they
+        # were computed for, so that unchanged files are not hashed again
+        try:
+            with open(self.index_path) as f:
+                self.digests = json.load(f)
+        except (OSError, ValueError):
+            self.digests = {}
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.digests.get(path)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = file_digest(path)
+        self.digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def add(self, path):
+        # Returns the store object holding the content of path
+        digest = self.digest(path)
+        obj = os.path.join(self.path, "objects", digest[:2], digest[2:])
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(obj))
+            os.close(fd)
+            if not reflink(path, tmp):
+                shutil.copy2(path, tmp)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, obj)
+        return obj
+
+    def link(self, src, dst):
+        # Points dst at the store object of src, returns whether dst changed
+        target = os.path.relpath(self.add(src), os.path.dirname(dst))
+        if os.path.islink(dst) and os.readlink(dst) == target:
+            return False
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        else:
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        os.symlink(target, dst)
+        return True
+
+    def save(self):
+        # Forgets the sources that no longer exist
+        self.digests = {
+            path: cached
+            for path, cached in self.digests.items()
+            if os.path.exists(path)
+        }
+        tmp = f"{self.index_path}.tmp"
+        os.makedirs(self.path, exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump(self.digests, f)
+        os.replace(tmp, self.index_path)
+
+
+def reflink(src, dst):
+    # Clones src into dst on copy-on-write filesystems (Btrfs, XFS)
+    try:
+        import fcntl
+
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except (ImportError, OSError):
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    return os.path.join(dag_dir, os.path.basename(job_sub_path))
 
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def print_stage_summary(summary):
+    print(
+        f"Staged {summary['copied'] + summary['linked'] + summary['unchanged']} file(s): "
+        f"{summary['copied']} copied ({format_size(summary['bytes_copied'])}), "
+        f"{summary['linked']} linked, {summary['unchanged']} unchanged "
+        f"({format_size(summary['bytes_skipped'])} not copied)"
+    )
+
+
+def clean_kind(suffix):
+    # Kind of a file matched by CLEAN_PATTERN, from the suffix after ".dag"
+    if suffix is None or suffix == "condor.sub":
+        return "dag"
+    if suffix == "lock":
+        return "lock"
+    return "rescue" if suffix.startswith("rescue") else "log"
+
+
+def scan_clean_dir(path, remove=False):
+    # Lists a directory for clean_directory. Returns its subdirectories to
+    # walk, and the DAG-related files as (path, dag, kind, size), dag being
+    # the .dag they belong to. Symlinks are neither followed nor removed.
+    dirs, found = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in EXCLUDED_FOLDERS and entry.name != INPUT_STORE_DIR:
+                    dirs.append(entry.path)
+                continue
+            match = CLEAN_PATTERN.search(entry.name)
+            if not match or entry.is_symlink():
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+            dag = os.path.join(path, entry.name[: match.start() + 4])
+            found.append((entry.path, dag, clean_kind(match.group(1)), size))
+            if remove:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+    return dirs, found
+
+
+def archive_dag_files(dag, files, stamp):
+    # Compresses the files of a DAG (or of a log directory) into
+    # {dag}.{stamp}.tar.gz next to it, then removes them
+    archive = f"{dag}.{stamp}.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        for path in files:
+            tar.add(path, arcname=os.path.relpath(path, os.path.dirname(dag)))
+    for path in files:
+        os.remove(path)
+    return archive
+
+
+def clean_directory(
+    directory, dry_run=False, archive=False, logs=False, workers=CLEAN_WORKERS
+):
+    """
+    Remove the DAG-related files of a directory tree.
+
+    The files written by DAGMan for a .dag (CLEAN_PATTERN) are matched by
+    their exact suffix. The tree is listed with os.scandir by workers
+    threads, skipping EXCLUDED_FOLDERS, the input store and symlinks.
+    dry_run only reports what would be removed. With archive, the files of
+    each DAG other than its lock are compressed into a
+    {dag}.{timestamp}.tar.gz next to it instead of being lost. With logs,
+    the output and error files of the jobs, in the LOG_DIR of each directory
+    holding DAG files, go too (archived as {LOG_DIR}.{timestamp}.tar.gz).
+
+    Returns a summary with the number of files and bytes per kind (dag,
+    log, rescue, lock, job), and the archives written.
+    """
+    remove = not dry_run and not archive
+    found = []
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        pending = {pool.submit(scan_clean_dir, directory, remove)}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    dirs, files = future.result()
+                except OSError as e:
+                    print(f"Warning: Could not clean {e.filename}: {e.strerror}")
+                    continue
+                found.extend(files)
+                pending.update(pool.submit(scan_clean_dir, d, remove) for d in dirs)
+
+        if logs:
+            job_logs = []
+            for dag_dir in sorted({os.path.dirname(dag) for _, dag, _, _ in found}):
+                log_dir = os.path.join(dag_dir, LOG_DIR)
+                job_logs.extend(
+                    (entry.path, log_dir, "job", entry.stat().st_size)
+                    for entry in iter_node_logs(dag_dir)
+                )
+            if remove:
+                list(pool.map(os.remove, [path for path, *_ in job_logs]))
+            found.extend(job_logs)
+
+        archives = []
+        if archive and not dry_run:
+            by_dag = {}
+            for path, dag, kind, _ in found:
+                if kind == "lock":
+                    os.remove(path)
+                else:
+                    by_dag.setdefault(dag, []).append(path)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            archives = list(
+                pool.map(
+                    lambda item: archive_dag_files(*item, stamp), sorted(by_dag.items())
+                )
+            )
+
+    summary = {
+        "directory": os.path.abspath(directory),
+        "dry_run": dry_run,
+        "files": len(found),
+        "bytes": sum(size for *_, size in found),
+        "dags": len({dag for _, dag, kind, _ in found if kind != "job"}),
+        "kinds": {},
+        "archives": archives,
+    }
+    for _, _, kind, size in found:
+        counts = summary["kinds"].setdefault(kind, {"files": 0, "bytes": 0})
+        counts["files"] += 1
+        counts["bytes"] += size
+    print_clean_summary(summary)
+    return summary
+
+
+def print_clean_summary(summary):
+    action = (
+        "Would remove"
+        if summary["dry_run"]
+        else "Archived" if summary["archives"] else "Removed"
+    )
+    kinds = ", ".join(
+        f"{counts['files']} {kind} file(s) ({format_size(counts['bytes'])})"
+        for kind, counts in sorted(summary["kinds"].items())
+    )
+    print(
+        f"{action} {summary['files']} file(s) of {summary['dags']} DAG(s), "
+        f"{format_size(summary['bytes'])}" + (f": {kinds}" if kinds else "")
+    )
+    for archive in summary["archives"]:
+        print(f"  {archive}")
+
+
+def create_new_dag():
+    dagname = input("Enter the name of the DAG: ").strip() or "auto_dag"
+    dag_dir = create_dag_directory(dagname)
+    dot_config = dags.DotConfig(dagname + ".dot", update=True)
+    dag = dags.DAG(dot_config=dot_config)
+    layers = []
+    entries = []
+
+    # Large DAGs are faster to parse and recover as SPLICE or SUBDAG pieces
+    partition, partition_type = None, "splice"
+    try:
+        partition = parse_partition(
+            input(
+                "Split the DAG into pieces? Enter 'layer', a number of nodes per piece, or nothing for no: "
+            ).strip()
+        )
+    except ValueError as e:
+        print(f"Warning: {e}. Not splitting the DAG.")
+    if (
+        partition
+        and input("Use SUBDAG EXTERNAL pieces instead of SPLICE? (y/N) ").lower() == "y"
+    ):
+        partition_type = "subdag"
+    saved = {} if partition else saved_layers(dag_dir, dagname)
+
+    while True:
+        print(
+            "\n----------------CURRENT DAG STRUCTURE----------------\n",
+            dag.describe(),
+            "\n",
+        )
+        job_sub_path = get_job_sub(excluded_dirs=[os.path.basename(dag_dir)])
+        if not job_sub_path:
+            if layers and input("Go back to previous step? (y/N) ").lower() == "y":
+                layers.pop()
+                entries.pop()
+                continue
+            break
+
+        # The answers are kept as a job config, so that the DAG can be refreshed
+        config = {"submit_file": job_sub_path}
+        queue_option = input(
+            f"Choose how to set up the queue:\n1. Manual\n2. Import from job {QUEUE_EXT}\n3. No queue\nEnter choice (1/2/3): "
+        )
+
+        if queue_option == "1":
+            job_sub = SubmitFile.load(job_sub_path)
+            config["sweep"] = sweep_spec(set_vars(job_sub))
+        elif queue_option == "2":
+            config["queue_file"] = os.path.splitext(job_sub_path)[0] + QUEUE_EXT
+            store_path = sweep_store_path(job_sub_path)
+            if (
+                os.path.exists(store_path)
+                and input(f"Read the sweep store {store_path} instead? (y/N) ").lower()
+                == "y"
+            ):
+                config["queue_file"] = store_path
+                query = input(
+                    "Enter a query selecting combinations, e.g. lr < 1e-3 and seed in 0..4, or nothing for all: "
+                ).strip()
+                if query:
+                    config["query"] = query
+        else:
+            config["num_jobs"] = int(
+                input("Enter the number of jobs to run (default 1): ") or "1"
+            )
+
+        if (
+            queue_option in ["1", "2"]
+            and input("Skip the combinations already done? (y/N) ").lower() == "y"
+        ):
+            done = input(
+                "Enter the output file of a combination with $(key) placeholders, relative to the DAG directory, or a file listing the combinations done: "
+            ).strip()
+            config["done_pattern" if "$(" in done else "done_manifest"] = done
+
+        if queue_option in ["1", "2"]:
+            bundle = input(
+                "Enter the number of combinations to run per job, to bundle short jobs (default 1): "
+            ).strip()
+            if bundle.isdigit() and int(bundle) > 1:
+                config["bundle"] = int(bundle)
+
+        # Requests fitted to the past runs of the job, only when asked, as it
+        # reads the logs of every DAG directory and saves their stats
+        if (
+            input(
+                "Propose requests from the logs of the past runs of this job? (y/N) "
+            ).lower()
+            == "y"
+        ):
+            proposal = rightsize(
+                os.path.splitext(os.path.basename(job_sub_path))[0], os.getcwd()
+            )
+            print_rightsize(proposal)
+            if (
+                proposal["requests"]
+                and input("Apply the proposed requests? (y/N) ").lower() == "y"
+            ):
+                config["rightsize"] = "apply"
+        if (
+            input(
+                "Release the jobs held for exceeding their memory, with more memory? (y/N) "
+            ).lower()
+            == "y"
+        ):
+            retries = input("Enter the number of releases per job (default 3): ")
+            config["memory_retries"] = int(retries) if retries.isdigit() else 3
+
+        # Ask about pre-script
+        if (
+            input("Do you want to add a pre-script for this layer? (y/N) ").lower()
+            == "y"
+        ):
+            pre_script_path = input("Enter the path to the pre-script (.sh file): ")
+            if os.path.exists(pre_script_path):
+                config["pre_script"] = pre_script_path
+            else:
+                print(
+                    f"Warning: Pre-script file {pre_script_path} not found. Skipping pre-script."
+                )
+
+        # Ask about post-script
+        if (
+            input("Do you want to add a post-script for this layer? (y/N) ").lower()
+            == "y"
+        ):
+            post_script_path = input("Enter the path to the post-script (.sh file): ")
+            if os.path.exists(post_script_path):
+                config["post_script"] = post_script_path
+            else:
+                print(
+                    f"Warning: Post-script file {post_script_path} not found. Skipping post-script."
+                )
+
+        if layers:
+            config["edge_type"], config["edge_params"] = get_edge_type()
+
+        try:
+            layer, entry = layer_from_config(
+                config, dag_dir, layers[-1] if layers else dag, saved=saved
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            print()
+            continue
+
+        layers.append(layer)
+        entries.append(entry)
+
+        if input("Would you like to add another layer? (y/N) ").lower() != "y":
+            break
+
+    # Throttles computed from the layers, which the user may change
+    throttle = None
+    print("\nJobs run at once by each layer:")
+    for entry in entries:
+        print(
+            f"  {entry['name']}: {entry['max_jobs'] or 'no limit'} of {entry['nodes']}"
+        )
+    if input("Would you like to change the throttles? (y/N) ").lower() == "y":
+        recategorized = False
+        for entry in entries:
+            value = input(
+                f"Enter the jobs of {entry['name']} to run at once (0 for no limit, Enter to keep): "
+            ).strip()
+            if value.isdigit():
+                entry["config"]["max_jobs"] = entry["max_jobs"] = int(value) or None
+                category = layer_category(
+                    entry["config"], entry["name"], None, entry["nodes"]
+                )[0]
+                recategorized = recategorized or category != entry["category"]
+        if recategorized:
+            # Layers throttled or not any more are built in or out of a category
+            dag = dags.DAG(dot_config=dot_config)
+            parent = dag
+            for i, entry in enumerate(entries):
+                parent, entries[i] = layer_from_config(
+                    entry["config"], dag_dir, parent, saved=saved
+                )
+                layers[i] = parent
+        value = input(
+            "Enter the most idle jobs of the DAG (0 for no limit, Enter for the default): "
+        ).strip()
+        if value.isdigit():
+            throttle = {"max_idle": int(value) or None}
+
+    dag_file = write_layers_dag(
+        dag,
+        dag_dir,
+        dagname,
+        entries,
+        partition=partition,
+        partition_type=partition_type,
+        throttle=throttle,
+    )
+    for file in os.listdir(dag_dir):
+        if file.endswith(".sub"):
+            correct_submit(os.path.join(dag_dir, file))
+
+    print(f"DAG file created: {dag_file}")
+
+    if input("Would you like to submit the DAG? (y/N) ").lower() == "y":
+        cluster_id = submit_dag(dag_file)
+        print(f"Submitted DAG {dagname}.dag with cluster ID {cluster_id}")
+        if input("Would you like to monitor it? (y/N) ").lower() == "y":
+            monitor_menu([cluster_id])
+
+
+@profiled("submit")
+def submit_dag(dag_file, schedd=None, record=True):
+    # DAGMan resolves the node files relative to the DAG directory, which is
+    # given as its initial directory so that the process cwd does not matter
+    dag_file = os.path.abspath(dag_file)
+    dag_submit = htcondor.Submit.from_dag(dag_file, {"force": 1})
+    dag_submit["initialdir"] = os.path.dirname(dag_file)
+    cluster_id = (schedd or get_schedd()).submit(dag_submit).cluster()
+    profile_count("dags_submitted")
+    if record:
+        record_submissions({cluster_id: dag_file})
+    return cluster_id
+
+
+def submit_dags(dag_files, schedd=None, workers=SUBMIT_WORKERS):
+    # Submits many DAGs through one Schedd handle, a few at a time, retrying
+    # each with exponential backoff. Returns one manifest entry per DAG, in
+    # the order of dag_files.
+    def submit(dag_file):
+        entry = {"dag_file": os.path.abspath(dag_file)}
+        for attempt in range(1, SUBMIT_ATTEMPTS + 1):
+            entry["attempts"] = attempt
+            try:
+                entry["cluster_id"] = submit_dag(dag_file, schedd, record=False)
+                entry.pop("error", None)
+                break
+            except Exception as e:
+                entry["error"] = str(e)
+                if not os.path.exists(dag_file) or attempt == SUBMIT_ATTEMPTS:
+                    break
+                if schedd is None:
+                    # The schedd may have moved, locate it again
+                    get_schedd.cache_clear()
+                time.sleep(SUBMIT_BACKOFF * 2 ** (attempt - 1))
+        print(
+            f"Submitted {entry['dag_file']} with cluster ID {entry['cluster_id']}"
+            if "cluster_id" in entry
+            else f"Error: Could not submit {entry['dag_file']}: {entry['error']}"
+        )
+        return entry
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        manifest = list(pool.map(submit, dag_files))
+    record_submissions(
+        {
+            entry["cluster_id"]: entry["dag_file"]
+            for entry in manifest
+            if "cluster_id" in entry
+        }
+    )
+    return manifest
+
+
+@functools.lru_cache(maxsize=None)
+def get_schedd():
+    # One Schedd handle is reused by every query and submission
+    return htcondor.Schedd()
+
+
+def record_submissions(clusters):
+    # Remembers the DAGs submitted from the working directory, for monitor
+    if not clusters:
+        return
+    submitted = load_submissions()
+    submitted.update(
+        {str(cluster_id): dag_file for cluster_id, dag_file in clusters.items()}
+    )
+    try:
+        tmp_path = SUBMITTED_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(submitted, f, indent=2)
+        os.replace(tmp_path, SUBMITTED_FILE)
+    except OSError as e:
+        print(f"Warning: Could not record the submissions in {SUBMITTED_FILE}: {e}")
+
+
+def load_submissions():
+    try:
+        with open(SUBMITTED_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def query_dags(cluster_ids, schedd=None):
+    # Fetches the DAGMan jobs and all of their node jobs in a single query,
+    # limited to the attributes shown. schedd can be anything with the query
+    # method of htcondor.Schedd.
+    schedd = schedd or get_schedd()
+    ids = ", ".join(str(cluster_id) for cluster_id in cluster_ids)
+    ads = schedd.query(
+        constraint=f"member(ClusterId, {{{ids}}}) || member(DAGManJobId, {{{ids}}})",
+        projection=MONITOR_PROJECTION,
+    )
+
+    statuses = {
+        int(cluster_id): {"queued": False, "dag_dir": None, "nodes": {}, "layers": {}}
+        for cluster_id in cluster_ids
+    }
+    for ad in ads:
+        if ad.get("ClusterId") in statuses:
+            dag = statuses[ad["ClusterId"]]
+            dag["queued"] = True
+            dag["dag_dir"] = ad.get("Iwd")
+            dag["nodes"] = {
+                key: ad.get(f"DAG_Nodes{key.capitalize()}")
+                for key in ["total", "done", "failed"]
+            }
+        elif ad.get("DAGManJobId") in statuses:
+            # Nodes of a splice are named {splice}+{layer}:{index}
+            layer = str(ad.get("DAGNodeName", "")).rsplit(":", 1)[0].rsplit("+")[-1]
+            counts = statuses[ad["DAGManJobId"]]["layers"].setdefault(
+                layer, {"idle": 0, "running": 0, "held": 0, "done": 0}
+            )
+            state = JOB_STATES.get(ad.get("JobStatus"))
+            if state:
+                counts[state] += 1
+
+    # Jobs that are done have left the queue, their logs still count them
+    for dag in statuses.values():
+        if dag["dag_dir"] and os.path.isdir(dag["dag_dir"]):
+            for layer, stats in collect_stats(dag["dag_dir"])["layers"].items():
+                dag["layers"].setdefault(
+                    layer, {"idle": 0, "running": 0, "held": 0, "done": 0}
+                )["done"] = stats["succeeded"]
+    return statuses
+
+
+def print_monitor(statuses):
+    print(f"\n{time.strftime('%H:%M:%S')}")
+    for cluster_id, dag in statuses.items():
+        if not dag["queued"]:
+            print(f"  DAG {cluster_id}: no longer in the queue")
+            continue
+        nodes = dag["nodes"]
+        print(
+            f"  DAG {cluster_id}: {nodes['done']}/{nodes['total']} nodes done, "
+            f"{nodes['failed']} failed"
+        )
+        for layer, counts in sorted(dag["layers"].items()):
+            print(
+                f"    {layer}: {counts['idle']} idle, {counts['running']} running, "
+                f"{counts['done']} done, {counts['held']} held"
+            )
+
+
+def monitor_dags(cluster_ids, schedd=None, once=False):
+    # Refreshes until no DAG is left in the queue. The interval doubles while
+    # nothing changes, and is reset as soon as something does.
+    interval = MONITOR_INTERVALS[0]
+    previous = None
+    while True:
+        statuses = query_dags(cluster_ids, schedd)
+        print_monitor(statuses)
+        if once or not any(dag["queued"] for dag in statuses.values()):
+            return statuses
+        if statuses == previous:
+            interval = min(interval * 2, MONITOR_INTERVALS[1])
+        else:
+            interval = MONITOR_INTERVALS[0]
+        previous = statuses
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            return statuses
+
+
+def monitor_menu(cluster_ids=None):
+    cluster_ids = cluster_ids or list(load_submissions())
+    if not cluster_ids:
+        print("No DAG submitted from this directory.")
+        return
+    print("Monitoring DAGs, press Ctrl+C to stop.")
+    monitor_dags(cluster_ids)
+
+
+def quick_dag_with_options(job_configs, dag_name=None):
+    """
+    Create a DAG with advanced configuration options for each layer.
+
+    job_configs: List of dictionaries with structure:
+    {
+        'submit_file': str,    # Path to .sub file
+        'pre_script': str,     # Optional path to pre script
+        'post_script': str,    # Optional path to post script
+        'edge_type': str,      # Optional: 'many2many' (default), 'one2one', 'group', 'slice'
+        'edge_params': dict,   # Optional: Parameters for edge type
+        'sweep': dict,         # Optional: Sweep spec (see sweep_from_spec)
+        'queue_file': str,     # Optional: Queue file or sweep store to use instead of the job's
+        'query': str,          # Optional: Rows of the sweep store, e.g. "lr < 1e-3 and seed in 0..4"
+        'num_jobs': int,       # Optional: Number of jobs when there is no queue
+        'checksum': bool,      # Optional: Compare staged files by content too
+        'pack': bool,          # Optional: Transfer small inputs as one archive
+        'hardlink': bool,      # Optional: Hard link the inputs instead of copying them
+        'done_manifest': str,  # Optional: File of the combinations already done
+        'done_pattern': str,   # Optional: Output of a combination, e.g. "out/$(seed).pt"
+        'bundle': int,         # Optional: Combinations run by each job
+        'job_duration': int,   # Optional: Seconds per job, instead of bundle
+        'task_duration': int,  # Optional: Seconds per combination, else from the logs
+        'category': str,       # Optional: DAGMan category, the job name when throttled
+        'max_jobs': int,       # Optional: Jobs of the category run at once, null for all
+        'rightsize': str,      # Optional: 'propose' or 'apply' requests from past logs
+        'memory_retries': int, # Optional: Releases, with more memory, after memory holds
+        'log_shard_size': int  # Optional: Jobs per log directory, 0 for a single one
+    }
+    Combinations with a line in done_manifest, or whose done_pattern file
+    exists in the DAG directory, are left out of the layer. Edges are given
+    between combinations and remapped onto the jobs of bundled layers.
+    """
+    dag, dag_file = build_dag(job_configs, dag_name)
+    return dag_file
+
+
+@profiled("build")
+def build_dag(
+    job_configs,
+    dag_name=None,
+    join_threshold=JOIN_THRESHOLD,
+    store=None,
+    dag_dir=None,
+    partition=None,
+    partition_type="splice",
+    throttle=None,
+):
+    # Does the work of quick_dag_with_options, also returning the DAG
+    if not job_configs:
+        raise ValueError("No jobs provided")
+
+    # Create DAG name from first job
+    dag_name = (
+        dag_name
+        or os.path.splitext(os.path.basename(job_configs[0]["submit_file"]))[0] + "_dag"
+    )
+
+    # Create DAG directory
+    dag_dir = dag_dir or create_dag_directory(dag_name)
+
+    # Initialize DAG
+    dot_config = dags.DotConfig(dag_name + ".dot", update=True)
+    dag = dags.DAG(dot_config=dot_config)
+
+    # A partitioned DAG has no layer range to copy, its vars are all needed
+    saved = {} if partition else saved_layers(dag_dir, dag_name)
+    parent = dag
+    entries = []
+    for config in job_configs:
+        parent, entry = layer_from_config(
+            config, dag_dir, parent, store, saved, throttle
+        )
+        entries.append(entry)
+
+    if store is not None:
+        store.save()
+
+    # Write DAG file
+    dag_file = write_layers_dag(
+        dag,
+        dag_dir,
+        dag_name,
+        entries,
+        join_threshold,
+        store,
+        partition,
+        partition_type,
+        throttle,
+    )
+    print(f"Created DAG: {dag_file}")
+    return dag, dag_file
+
+
+def layer_submit(job_sub_path, job_name):
+    # Reads a staged submit file as the description of a layer, and returns
+    # it with the arguments of its queue statement. DAGMan queues one job per
+    # node, so the queue statement and the batch name are dropped.
+    sub_file = SubmitFile.load(job_sub_path)
+    queue_args = sub_file.getQArgs()
+    del sub_file["JobBatchName"]
+    job_sub = sub_file.submit()
+
+    # Update log paths
+    job_sub["output"] = f"{LOG_DIR}/{job_name}/$(Cluster).out"
+    job_sub["error"] = f"{LOG_DIR}/{job_name}/$(Cluster).err"
+    job_sub["log"] = f"{job_name}.log"
+    return job_sub, queue_args
+
+
+def log_shards(nodes, shard_size=LOG_SHARD_SIZE):
+    # Log subdirectories of a layer, 1 for none
+    return max(1, math.ceil(nodes / shard_size)) if shard_size else 1
+
+
+def shard_logs(job_sub, job_name, shards):
+    # Spreads the output and error files of a layer over shards directories,
+    # {LOG_DIR}/{job_name}/{Cluster % shards}/. Each node is a cluster of its
+    # own and DAGMan submits them in turn, so the shards fill up evenly.
+    if shards <= 1:
+        return
+    job_sub["LogShard"] = f"$(Cluster) % {shards}"
+    for key, ext in [("output", ".out"), ("error", ".err")]:
+        job_sub[key] = f"{LOG_DIR}/{job_name}/$INT(LogShard)/$(Cluster){ext}"
+
+
+def make_log_dirs(log_dir, shards):
+    # Creates a log directory and its shards subdirectories, 0 for none,
+    # which must exist before the jobs start. The shards are known in
+    # advance, unlike the cluster IDs.
+    os.makedirs(log_dir, exist_ok=True)
+    for shard in range(shards):
+        os.makedirs(os.path.join(log_dir, str(shard)), exist_ok=True)
+
+
+def node_log_files(dag_dir, job_name, cluster, shards=1):
+    # The output and error files of the job of a node, from its cluster ID
+    log_dir = os.path.join(dag_dir, LOG_DIR, job_name)
+    if shards > 1:
+        log_dir = os.path.join(log_dir, str(cluster % shards))
+    return [os.path.join(log_dir, f"{cluster}{ext}") for ext in [".out", ".err"]]
+
+
+def iter_node_logs(dag_dir):
+    # Yields the DirEntry of every file in the log directories of a DAG. The
+    # layout is known, {LOG_DIR}/{job_name}/[{shard}/], so only those levels
+    # are listed.
+    stack = [os.path.join(dag_dir, LOG_DIR)]
+    depth = {stack[0]: 0}
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if depth[path] < 2:
+                            depth[entry.path] = depth[path] + 1
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def layer_from_config(config, dag_dir, parent, store=None, saved=None, throttle=None):
+    # Stages the files of a job and adds its layer below parent (the DAG for
+    # the first layer), as described by a job config of
+    # quick_dag_with_options. Returns the layer and its manifest entry. When
+    # the layer's inputs hash as in its saved entry, its vars are not
+    # computed again and its nodes are copied from the current .dag.
+    saved = {} if saved is None else saved
+    config = dict(config)
+    for key in [
+        "submit_file",
+        "pre_script",
+        "post_script",
+        "queue_file",
+        "done_manifest",
+    ]:
+        if config.get(key):
+            config[key] = os.path.abspath(config[key])
+    if config.get("edge_params"):
+        # Slices are kept as [start, end, step] lists, as in JSON specs, so
+        # that the config can be hashed and saved in the manifest
+        config["edge_params"] = {
+            key: (
+                [value.start, value.stop, value.step]
+                if isinstance(value, slice)
+                else value
+            )
+            for key, value in config["edge_params"].items()
+        }
+    job_file = config["submit_file"]
+    job_name = os.path.splitext(os.path.basename(job_file))[0]
+    job_dir = os.path.dirname(job_file)
+
+    # Copy necessary files, and read the submit file as staged
+    new_job_file = copy_job_files(
+        job_file,
+        dag_dir,
+        config.get("checksum", False),
+        store,
+        config.get("pack", False),
+        config.get("hardlink", False),
+    )
+    job_sub, queue_args = layer_submit(new_job_file, job_name)
+
+    # Resource requests fitted to the past runs of the job
+    if config.get("rightsize"):
+        proposal = rightsize(job_name, os.path.dirname(os.path.abspath(dag_dir)))
+        if config["rightsize"] != "apply":
+            print_rightsize(proposal)
+        elif proposal["requests"]:
+            job_sub.update(proposal["requests"])
+            print(
+                f"Set {', '.join(f'{key} = {value}' for key, value in proposal['requests'].items())} for {job_name}"
+            )
+        else:
+            print(f"Warning: Not enough past jobs of {job_name} to right-size it.")
+    if config.get("memory_retries"):
+        escalate_memory(job_sub, int(config["memory_retries"]))
+
+    # Copy and setup pre/post scripts if provided
+    scripts = {}
+    for key in ["pre_script", "post_script"]:
+        if config.get(key):
+            if os.path.exists(config[key]):
+                stage_file(config[key], dag_dir, store=store)
+                scripts[key] = dags.Script(os.path.basename(config[key]))
+            else:
+                print(f"Warning: Script {config[key]} not found. Skipping it.")
+
+    # Vars from the sweep, the queue file, or the number of jobs
+    queue_path = config.get("queue_file")
+    if not queue_path and config.get("query"):
+        # A query selects rows of the job's sweep store
+        queue_path = sweep_store_path(job_file)
+    if not queue_path and "num_jobs" not in config and queue_args:
+        queue_file = re.search(rf"\b\w+\{QUEUE_EXT}\b", queue_args)
+        if queue_file:
+            queue_path = os.path.join(job_dir, queue_file.group(0))
+    if queue_path and not os.path.exists(queue_path):
+        print(f"Warning: {queue_path} not found. Using empty vars.")
+        queue_path = None
+
+    # The throttle is not part of the nodes, their category is checked apart
+    digest = hashlib.sha256(
+        json.dumps(
+            {key: value for key, value in config.items() if key != "max_jobs"},
+            sort_keys=True,
+        ).encode()
+    )
+    for path in [job_file, None if config.get("sweep") else queue_path]:
+        if path:
+            digest.update(file_digest(path).encode())
+
+    # The combinations already done are only known once the vars are
+    vars = None
+    if config.get("done_manifest") or config.get("done_pattern"):
+        vars = layer_vars(config, job_sub, queue_path, dag_dir, store)
+        total = len(vars)
+        vars, skipped = filter_done(
+            vars,
+            re.findall(r"\$\((.*?)\)", job_sub["arguments"]),
+            dag_dir,
+            config.get("done_manifest"),
+            config.get("done_pattern"),
+        )
+        digest.update(skipped.tobytes())
+        print(f"Skipped {len(skipped)} of {total} job(s) of {job_name} already done")
+
+    # Short combinations are run a bundle at a time, one node per bundle
+    previous = saved.get(job_name)
+    bundle = bundle_size(config, dag_dir, job_name, previous)
+    if bundle > 1:
+        digest.update(str(bundle).encode())
+
+    entry = {"name": job_name, "config": config, "hash": digest.hexdigest()}
+    if vars is not None:
+        entry["skipped"] = len(skipped)
+
+    if (
+        previous
+        and previous["hash"] == entry["hash"]
+        and previous.get("category")
+        == layer_category(config, job_name, job_sub, previous["nodes"], throttle)[0]
+    ):
+        entry["status"] = "unchanged"
+        entry["range"] = previous["range"]
+        combinations = previous.get("combinations", previous["nodes"])
+        if vars is None or bundle > 1:
+            # Only the number of nodes matters, the nodes are copied as they are
+            vars = [{}] * previous["nodes"]
+    else:
+        entry["status"] = "changed" if previous else "new"
+        if vars is None:
+            vars = layer_vars(config, job_sub, queue_path, dag_dir, store)
+        combinations = len(vars)
+        if bundle > 1:
+            vars = write_bundles(vars, job_sub["arguments"], dag_dir, job_name, bundle)
+    if previous:
+        entry["previous_nodes"] = previous["nodes"]
+    if bundle > 1:
+        entry["bundle"] = bundle
+        entry["combinations"] = combinations
+        bundle_submit(job_sub, job_name)
+        check_bundles(job_dir, job_sub)
+        print(
+            f"Bundled {combinations} combination(s) of {job_name} into {len(vars)} job(s) of up to {bundle}"
+        )
+
+    category, max_jobs = layer_category(config, job_name, job_sub, len(vars), throttle)
+
+    # Node logs are spread over directories made now, before any job runs
+    entry["log_shards"] = log_shards(
+        len(vars), config.get("log_shard_size", LOG_SHARD_SIZE)
+    )
+    shard_logs(job_sub, job_name, entry["log_shards"])
+    make_log_dirs(
+        os.path.join(dag_dir, LOG_DIR, job_name),
+        entry["log_shards"] if entry["log_shards"] > 1 else 0,
+    )
+
+    # Create layer
+    kwargs = dict(
+        name=job_name,
+        submit_description=job_sub,
+        pre=scripts.get("pre_script"),
+        post=scripts.get("post_script"),
+        category=category,
+    )
+    if isinstance(parent, dags.NodeLayer):
+        # Edges are given between combinations, bundled or not
+        parent_combinations = getattr(parent, "combinations", len(parent))
+        parent_bundle = getattr(parent, "bundle", 1)
+        edge_type = config.get("edge_type", "many2many")
+        if edge_type == "one2one" and combinations != parent_combinations:
+            print(
+                "Warning: Number of jobs in this layer does not match the previous layer. Setting edge type to ManyToMany."
+            )
+            edge_type = "many2many"
+        kwargs["edge"] = bundle_edge(
+            make_edge(edge_type, config.get("edge_params", {})),
+            parent_combinations,
+            parent_bundle,
+            combinations,
+            bundle,
+        )
+    layer = add_layer(parent, vars, **kwargs)
+    layer.combinations = combinations
+    layer.bundle = bundle
+    entry["nodes"] = len(layer)
+    entry["category"] = category
+    entry["max_jobs"] = max_jobs
+    entry["scripts"] = bool(scripts)
+    return layer, entry
+
+
+def submit_number(job_sub, key, default=0):
+    # A number of a submit description, default when unset or an expression
+    try:
+        return float(job_sub.get(key, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def layer_category(config, job_name, job_sub, nodes, throttle=None):
+    # The DAGMan category of a layer and the jobs of it run at once. Every node
+    # of a category gets a CATEGORY line, so a layer is only put in one when
+    # the config names it or a MAXJOBS limit applies.
+    if "max_jobs" in config:
+        max_jobs = config["max_jobs"] or None
+    else:
+        max_jobs = layer_max_jobs(job_sub, nodes)
+    if config.get("category"):
+        return config["category"], max_jobs
+    if max_jobs and throttle is not False:
+        return job_name, max_jobs
+    return None, max_jobs
+
+
+def layer_max_jobs(job_sub, nodes):
+    # Jobs of a layer allowed to run at once, so that they hold no more than
+    # THROTTLE_GPUS GPUs, or THROTTLE_CPUS CPUs for the jobs without GPUs.
+    # None when the whole layer fits.
+    gpus = submit_number(job_sub, "request_gpus")
+    if gpus > 0:
+        limit = int(THROTTLE_GPUS // gpus)
+    else:
+        limit = int(THROTTLE_CPUS // max(1, submit_number(job_sub, "request_cpus", 1)))
+    limit = max(1, limit)
+    return limit if nodes > limit else None
+
+
+def throttle_dag(dag, entries, throttle=None):
+    """
+    Set the DAGMan throttles of a DAG from its layers.
+
+    The layers with a limit, from layer_max_jobs or the "max_jobs" of their
+    configs (null for no limit), are in a category, their job name unless
+    the layer config sets "category" (see layer_category). The categories
+    get a MAXJOBS limit, the lowest one when layers share a category. throttle sets the DAG-wide limits of
+    the dagman.config, the defaults being computed from the layers:
+    {
+        'max_idle': int,          # DAGMAN_MAX_JOBS_IDLE, THROTTLE_IDLE for large layers
+        'max_jobs': int,          # DAGMAN_MAX_JOBS_SUBMITTED, no limit by default
+        'max_pre_scripts': int,   # DAGMAN_MAX_PRE_SCRIPTS, THROTTLE_SCRIPTS with scripts
+        'max_post_scripts': int   # DAGMAN_MAX_POST_SCRIPTS, THROTTLE_SCRIPTS with scripts
+    }
+    A null value leaves a limit unset, and throttle False sets none at all.
+    Returns the limits set, by category and for the DAG.
+    """
+    dag.max_jobs_per_category = {}
+    dag.dagman_config = {}
+    if throttle is False:
+        return {"categories": {}, "dag": {}}
+
+    for entry in entries:
+        if entry.get("max_jobs") and entry.get("category"):
+            category = entry["category"]
+            dag.max_jobs_per_category[category] = min(
+                entry["max_jobs"],
+                dag.max_jobs_per_category.get(category, entry["max_jobs"]),
+            )
+
+    largest = max([entry["nodes"] for entry in entries], default=0)
+    with_scripts = max(
+        [entry["nodes"] for entry in entries if entry.get("scripts")], default=0
+    )
+    limits = {
+        "max_idle": THROTTLE_IDLE if largest > THROTTLE_IDLE else None,
+        "max_jobs": None,
+        "max_pre_scripts": (
+            THROTTLE_SCRIPTS if with_scripts > THROTTLE_SCRIPTS else None
+        ),
+        "max_post_scripts": (
+            THROTTLE_SCRIPTS if with_scripts > THROTTLE_SCRIPTS else None
+        ),
+    }
+    limits.update(throttle or {})
+    for key, knob in [
+        ("max_idle", "DAGMAN_MAX_JOBS_IDLE"),
+        ("max_jobs", "DAGMAN_MAX_JOBS_SUBMITTED"),
+        ("max_pre_scripts", "DAGMAN_MAX_PRE_SCRIPTS"),
+        ("max_post_scripts", "DAGMAN_MAX_POST_SCRIPTS"),
+    ]:
+        if limits.get(key):
+            dag.dagman_config[knob] = int(limits[key])
+
+    for category, value in dag.max_jobs_per_category.items():
+        print(f"Category {category}: at most {value} job(s) at once")
+    for knob, value in dag.dagman_config.items():
+        print(f"{knob} = {value}")
+    return {
+        "categories": dict(dag.max_jobs_per_category),
+        "dag": dict(dag.dagman_config),
+    }
+
+
+def bundle_size(config, dag_dir, job_name, previous=None):
+    # Combinations run by each node: "bundle" as given, or as many as fit in
+    # "job_duration" seconds, each taking "task_duration" seconds or else
+    # the median runtime logged so far for the layer. A size derived from the
+    # logs is kept until the config changes, so refreshes do not reshuffle it.
+    if config.get("bundle"):
+        return max(1, int(config["bundle"]))
+    if not config.get("job_duration"):
+        return 1
+    if previous and previous["config"] == config and "bundle" in previous:
+        return previous["bundle"]
+
+    task_duration = config.get("task_duration")
+    if not task_duration:
+        runtime = collect_stats(dag_dir)["layers"].get(job_name, {}).get("runtime")
+        if runtime:
+            task_duration = runtime["p50"] / (previous or {}).get("bundle", 1)
+    if not task_duration:
+        print(
+            f"Warning: No runtime logged for {job_name} yet, set task_duration to bundle it."
+        )
+        return 1
+    return max(1, int(config["job_duration"] // task_duration))
+
+
+@profiled("bundle")
+def write_bundles(vars, arguments, dag_dir, job_name, bundle):
+    # Writes the arguments of the combinations, bundle lines per file, into
+    # {job_name}_bundles/{index}.bundle, the file a node runs through its
+    # executable. Returns the vars of the bundled layer, only the index.
+    keys = list(dict.fromkeys(re.findall(r"\$\((.*?)\)", arguments)))
+    if isinstance(vars, Sweep):
+        keys = [key for key in keys if key in vars.keys]
+        rows = vars.rows(keys)
+    else:
+        keys = [key for key in keys if vars and key in vars[0]]
+        rows = (tuple(var[key] for key in keys) for var in vars)
+
+    # "--lr $(lr) $(Process)" becomes "--lr {0} $(Process)"
+    parts = re.split(r"\$\((.*?)\)", arguments)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace("{", "{{").replace("}", "}}")
+    for i in range(1, len(parts), 2):
+        if parts[i] in keys:
+            parts[i] = f"{{{keys.index(parts[i])}}}"
+        else:
+            parts[i] = f"$({parts[i]})".replace("{", "{{").replace("}", "}}")
+    line_format = "".join(parts).strip() + "\n"
+
+    bundle_dir = os.path.join(dag_dir, f"{job_name}_bundles")
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.makedirs(bundle_dir)
+    count = 0
+    rows = iter(rows)
+    while True:
+        lines = [line_format.format(*row) for row in itertools.islice(rows, bundle)]
+        if not lines:
+            break
+        with open(os.path.join(bundle_dir, f"{count}{BUNDLE_SUFFIX}"), "w") as f:
+            f.writelines(lines)
+        count += 1
+    return Sweep([(("bundle",), [range(count)])], coerce=False)
+
+
+def bundle_submit(job_sub, job_name):
+    # A bundled node transfers its bundle and hands it to the executable
+    inputs = job_sub.get("transfer_input_files", "").strip()
+    bundle_file = f"{job_name}_bundles/$(bundle){BUNDLE_SUFFIX}"
+    job_sub["transfer_input_files"] = (
+        f"{inputs}, {bundle_file}" if inputs else bundle_file
+    )
+    job_sub["arguments"] = f"$(bundle){BUNDLE_SUFFIX}"
+
+
+def bundle_edge(edge, parent_size, parent_bundle, child_size, child_bundle):
+    # Maps an edge between combinations onto layers of bundles, sizes being
+    # numbers of combinations. The htcondor edges are kept when they still
+    # apply, other edges are remapped by BundledEdge.
+    if (parent_bundle == 1 and child_bundle == 1) or type(edge) is dags.ManyToMany:
+        return edge
+    if type(edge) is dags.OneToOne and parent_bundle == child_bundle:
+        return edge
+    if (
+        type(edge) is dags.Grouper
+        and parent_bundle == child_bundle
+        and edge.parent_chunk_size % parent_bundle == 0
+        and edge.child_chunk_size % child_bundle == 0
+    ):
+        return dags.Grouper(
+            parent_chunk_size=edge.parent_chunk_size // parent_bundle,
+            child_chunk_size=edge.child_chunk_size // child_bundle,
+        )
+    return BundledEdge(edge, parent_size, parent_bundle, child_size, child_bundle)
+
+
+class BundledEdge:
+    """
+    Edge between layers of bundles, made from an edge between their
+    combinations.
+
+    A bundle of the child layer depends on every bundle of the parent layer
+    holding a parent of one of its combinations. Child bundles with the same
+    parent bundles are yielded as one fully connected group, so the writer
+    can route them through a join node.
+    """
+
+    def __init__(self, edge, parent_size, parent_bundle, child_size, child_bundle):
+        self.edge = edge
+        self.parent_size = parent_size
+        self.parent_bundle = parent_bundle
+        self.child_size = child_size
+        self.child_bundle = child_bundle
+
+    def get_edges(self, parent, child, join_factory):
+        parents_of = {}
+        for parents, children in yield_edge_groups(
+            self.edge, range(self.parent_size), range(self.child_size)
+        ):
+            bundles = {i // self.parent_bundle for i in parents}
+            for j in {j // self.child_bundle for j in children}:
+                parents_of.setdefault(j, set()).update(bundles)
+
+        group, children = None, []
+        for j in sorted(parents_of):
+            if parents_of[j] != group and children:
+                yield tuple(sorted(group)), tuple(children)
+                children = []
+            group = parents_of[j]
+            children.append(j)
+        if children:
+            yield tuple(sorted(group)), tuple(children)
+
+    def __repr__(self):
+        return f"Bundled{self.edge!r}"
+
+
+@profiled("sweep")
+def layer_vars(config, job_sub, queue_path, dag_dir, store=None):
+    # Vars from the sweep, the queue file, or the number of jobs
+    if config.get("sweep"):
+        keys = re.findall(r"\$\((.*?)\)", job_sub["arguments"])
+        return sweep_from_spec(config["sweep"], keys)
+    if queue_path:
+        stage_file(queue_path, dag_dir, store=store)
+        return read_vars(job_sub, queue_path, config.get("query"))
+    return [{} for _ in range(int(config.get("num_jobs", 1)))]
+
+
+def done_value(value):
+    # A value of a combination as compared with a done manifest. Queue files
+    # are written with str(), but the lines of a manifest may come from the
+    # jobs, so numbers are compared by value: 1, 1.0 and 1e0 all match.
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value)
+    if "_" in text:
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+@profiled("filter_done")
+def filter_done(vars, keys, dag_dir, manifest=None, pattern=None):
+    # Leaves out of vars the combinations already done, going by a completion
+    # manifest (the finished combinations, one per line like a queue file) or
+    # by the output files matching a pattern such as "results/$(lr)_$(seed).pt",
+    # relative to the DAG directory. Each output directory is listed once, so
+    # checking a combination costs no stat. Returns the remaining vars, and
+    # the indexes of the combinations left out.
+    skipped = array.array("q")
+    if not keys:
+        print(
+            f"Warning: Without job arguments, the jobs done cannot be told apart. "
+            f"Not leaving out those in {manifest or pattern}."
+        )
+        return vars, skipped
+    keys = list(dict.fromkeys(keys))
+    if not isinstance(vars, Sweep):
+        vars = Sweep(
+            [(keys, [[var[key] for var in vars] for key in keys])], coerce=False
+        )
+
+    if manifest:
+        done = set()
+        for chunk in iter_queue_chunks(manifest, len(keys)):
+            done.update(tuple(map(done_value, row)) for row in chunk)
+
+        def is_done(row):
+            return tuple(map(done_value, row)) in done
+
+    else:
+        # "results/$(lr)_$(seed).pt" becomes "results/{0}_{1}.pt"
+        parts = re.split(r"\$\((.*?)\)", os.path.join(dag_dir, pattern))
+        for i in range(0, len(parts), 2):
+            parts[i] = parts[i].replace("{", "{{").replace("}", "}}")
+        for i in range(1, len(parts), 2):
+            if parts[i] not in keys:
+                raise ValueError(f"{parts[i]} in {pattern} is not a job argument")
+            parts[i] = f"{{{keys.index(parts[i])}}}"
+        path_format = "".join(parts)
+        listings = {}
+
+        def is_done(row):
+            directory, name = os.path.split(path_format.format(*row))
+            names = listings.get(directory)
+            if names is None:
+                try:
+                    names = listings[directory] = set(os.listdir(directory))
+                except OSError:
+                    names = listings[directory] = set()
+            return name in names
+
+    remaining = []
+    with paused_gc():
+        for i, row in enumerate(vars.rows(keys)):
+            if is_done(row):
+                skipped.append(i)
+            else:
+                remaining.append(row)
+        columns = [list(column) for column in zip(*remaining)] or [[] for _ in keys]
+    return Sweep([(keys, columns)], coerce=False), skipped
+
+
+def load_layer_manifest(dag_dir):
+    try:
+        with open(os.path.join(dag_dir, LAYER_MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def saved_layers(dag_dir, dag_name):
+    # The manifest entries of the layers whose nodes can be copied from the
+    # .dag, which must not have changed since the manifest was saved
+    manifest = load_layer_manifest(dag_dir)
+    if not manifest or manifest.get("name") != dag_name:
+        return {}
+    if manifest.get("partition"):
+        # The nodes are spread over the pieces, there is no range to copy
+        return {}
+    try:
+        dag_stat = os.stat(os.path.join(dag_dir, f"{dag_name}.dag"))
+    except OSError:
+        return {}
+    if manifest.get("dag_file_stat") != [dag_stat.st_size, dag_stat.st_mtime_ns]:
+        return {}
+    return {layer["name"]: layer for layer in manifest["layers"]}
+
+
+@profiled("write_dag")
+def write_layers_dag(
+    dag,
+    dag_dir,
+    dag_name,
+    entries,
+    join_threshold=JOIN_THRESHOLD,
+    store=None,
+    partition=None,
+    partition_type="splice",
+    throttle=None,
+):
+    # Writes the .dag from the layers of layer_from_config, saves their
+    # manifest next to it and reports the layers that changed
+    throttle_dag(dag, entries, throttle)
+    if partition:
+        dag_file = write_partitioned_dag(
+            dag, dag_dir, dag_name, partition, partition_type, join_threshold
+        )
+        for entry in entries:
+            entry["range"] = None
+    else:
+        ranges = {}
+        dag_file = write_dag_stream(
+            dag,
+            dag_dir,
+            f"{dag_name}.dag",
+            join_threshold,
+            {entry["name"]: entry["range"] for entry in entries if "range" in entry},
+            ranges,
+        )
+        for entry in entries:
+            entry["range"] = ranges[entry["name"]]
+
+    if any(entry["status"] != "new" for entry in entries):
+        for entry in entries:
+            if entry["status"] == "unchanged":
+                print(f"Layer {entry['name']} unchanged ({entry['nodes']} nodes)")
+            elif entry["status"] == "changed":
+                print(
+                    f"Layer {entry['name']} changed: {entry['previous_nodes']} -> {entry['nodes']} nodes"
+                )
+            else:
+                print(f"Layer {entry['name']} added ({entry['nodes']} nodes)")
+
+    dag_stat = os.stat(dag_file)
+    manifest = {
+        "version": 1,
+        "name": dag_name,
+        "join_threshold": join_threshold,
+        "store": store.path if store is not None else None,
+        "partition": partition,
+        "partition_type": partition_type,
+        "throttle": throttle,
+        "dag_file_stat": [dag_stat.st_size, dag_stat.st_mtime_ns],
+        "layers": entries,
+    }
+    manifest_path = os.path.join(dag_dir, LAYER_MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    profile_count("nodes", sum(entry["nodes"] for entry in entries))
+    if Profile.active is not None:
+        Profile.active.dag_dirs.append(os.path.abspath(dag_dir))
+    return dag_file
+
+
+def parse_partition(value):
+    # "layer", a number of nodes per piece, or nothing for no partitioning
+    if value in [None, "", 0, False]:
+        return None
+    if str(value).lower() == "layer":
+        return "layer"
+    if str(value).isdigit() and int(value) > 0:
+        return int(value)
+    raise ValueError(f"Invalid partition {value}, use layer or a number of nodes")
+
+
+def write_partitioned_dag(
+    dag,
+    dag_dir,
+    dag_name,
+    partition,
+    partition_type="splice",
+    join_threshold=JOIN_THRESHOLD,
+):
+    """
+    Write the DAG as a top-level .dag of SPLICE or SUBDAG EXTERNAL pieces.
+
+    The layers are cut into stages wherever a ManyToMany edge links them, and
+    the top-level .dag makes the pieces holding the last layer of a stage
+    parents of the pieces holding the first layer of the next one, as the
+    ManyToMany edge did. With partition "layer", each stage is one piece.
+    With a number, the stages with more nodes are split into pieces of about
+    that many nodes. Pieces are made of whole connected components, so no
+    OneToOne, Grouper or Slicer edge crosses two pieces and the edges within
+    a stage are kept as they are. The components that a Slicer leaves out of
+    the first or last layer of a stage get pieces of their own, not linked
+    to the previous or next stage.
+
+    The pieces are written in parallel, as {dag_name}.{piece}.dag next to
+    the top-level {dag_name}.dag.
+    """
+    partition_type = partition_type.lower()
+    if partition_type not in ["splice", "subdag"]:
+        raise ValueError(
+            f"Unknown partition type {partition_type}, use splice or subdag"
+        )
+    dag_dir = Path(dag_dir).absolute()
+    dag_dir.mkdir(parents=True, exist_ok=True)
+
+    # Stages of layers, cut at the ManyToMany edges
+    layers = list(dag.walk(order=dags.WalkOrder.BREADTH_FIRST))
+    stages = [[layers[0]]]
+    for parent, child in zip(layers, layers[1:]):
+        if type(dag._edges.get(parent, child)) is dags.ManyToMany:
+            stages.append([])
+        stages[-1].append(child)
+
+    # Pieces of each stage, with whether they hold its first and last layers
+    pieces = []
+    for number, stage in enumerate(stages):
+        max_nodes = None if partition == "layer" else partition
+        if (max_nodes is None or sum(map(len, stage)) <= max_nodes) and all(
+            covers_layers(dag._edges.get(parent, child))
+            for parent, child in zip(stage, stage[1:])
+        ):
+            parts = [([(layer, None, None) for layer in stage], True, True)]
+        else:
+            parts = split_stage(dag, stage, max_nodes)
+        pieces.append([(f"p{number}_{i}", *part) for i, part in enumerate(parts)])
+
+    def write_piece(name, part, share):
+        join_report = {"joins": 0, "direct_edges": 0, "edges": 0}
+        write_dag_stream(
+            build_piece(dag, part, partition_type, share),
+            dag_dir,
+            f"{dag_name}.{name}.dag",
+            join_threshold,
+            join_report=join_report,
+            submit_files=False,
+        )
+        return join_report
+
+    join_report = {"joins": 0, "direct_edges": 0, "edges": 0}
+    with concurrent.futures.ThreadPoolExecutor(STAGE_WORKERS) as pool:
+        futures = [
+            pool.submit(write_piece, name, part, len(stage))
+            for stage in pieces
+            for name, part, _, _ in stage
+        ]
+        for future in futures:
+            for key, value in future.result().items():
+                join_report[key] += value
+
+    # Pieces of an earlier build that are not part of this one
+    names = {f"{dag_name}.{name}.dag" for stage in pieces for name, *_ in stage}
+    piece_pattern = re.compile(rf"{re.escape(dag_name)}\.p\d+_\d+\.dag")
+    for file in os.listdir(dag_dir):
+        if piece_pattern.fullmatch(file) and file not in names:
+            os.unlink(dag_dir / file)
+
+    # The top-level DAG holds the pieces and the edges between stages. The
+    # categories of splices are global, and throttled there.
+    writer = dags.writer.DAGWriter(dag)
+    if partition_type == "splice":
+        keyword = "SPLICE"
+        max_jobs = {
+            f"+{key}": value for key, value in dag.max_jobs_per_category.items()
+        }
+    else:
+        keyword = "SUBDAG EXTERNAL"
+        max_jobs = {}
+    lines = ["# BEGIN META\n"]
+    lines.extend(line + "\n" for line in yield_dag_meta_lines(writer, max_jobs))
+    lines.append("# END META\n")
+    lines.append("# BEGIN NODES AND EDGES\n")
+    for stage in pieces:
+        lines.extend(f"{keyword} {name} {dag_name}.{name}.dag\n" for name, *_ in stage)
+    for parents, children in zip(pieces, pieces[1:]):
+        parents = " ".join(name for name, _, _, last in parents if last)
+        children = " ".join(name for name, _, first, _ in children if first)
+        if not parents or not children:
+            continue
+        if saves_join(parents.count(" ") + 1, children.count(" ") + 1, join_threshold):
+            join = writer.join_node_name(writer.join_factory.get_join_node())
+            lines.append(f"PARENT {parents} CHILD {join}\n")
+            lines.append(f"PARENT {join} CHILD {children}\n")
+        else:
+            lines.append(f"PARENT {parents} CHILD {children}\n")
+    lines.extend(line + "\n" for line in writer.yield_join_node_lines())
+    lines.append("# END NODES AND EDGES\n")
+
+    dag_file_path = dag_dir / f"{dag_name}.dag"
+    with open(dag_file_path.with_name(dag_file_path.name + ".tmp"), "w") as f:
+        f.writelines(lines)
+    os.replace(dag_file_path.with_name(dag_file_path.name + ".tmp"), dag_file_path)
+
+    print_join_report(join_report)
+    writer.write_submit_files_for_layers(dag_dir)
+    if join_report["joins"] or writer.join_factory.joins:
+        writer.write_noop_submit_file(dag_dir)
+    if len(dag.dagman_config) > 0:
+        writer.write_dagman_config_file(dag_dir)
+    print(
+        f"Split {dag_name} into {len(names)} {partition_type} piece(s) over {len(stages)} stage(s)"
+    )
+    return dag_file_path
+
+
+def covers_layers(edge):
+    # Whether every node of both layers has an edge, which a Slicer may not do
+    edge = getattr(edge, "edge", edge)
+    return type(edge) in [dags.OneToOne, dags.Grouper]
+
+
+def split_stage(dag, stage, max_nodes=None):
+    # Splits the layers of a stage into parts of whole connected components,
+    # filled up to max_nodes nodes. Components are kept apart by whether they
+    # hold nodes of the first and of the last layer. Returns for each part
+    # (layers, first, last), layers being a list of (layer, vars, groups):
+    # the vars of the layer's nodes in the part, and the edge groups from the
+    # previous layer, in positions of the part.
+    offsets = list(itertools.accumulate([len(layer) for layer in stage], initial=0))
+    total = offsets[-1]
+    roots = array.array("q", range(total))
+
+    def find(i):
+        while roots[i] != i:
+            roots[i] = roots[roots[i]]
+            i = roots[i]
+        return i
+
+    def edge_groups():
+        for k in range(1, len(stage)):
+            edge = dag._edges.get(stage[k - 1], stage[k])
+            for parents, children in yield_edge_groups(edge, stage[k - 1], stage[k]):
+                if len(parents) and len(children):
+                    yield k, parents, children
+
+    with paused_gc():
+        # Union-find of the nodes linked by an edge
+        for k, parents, children in edge_groups():
+            root = find(offsets[k - 1] + parents[0])
+            nodes = itertools.chain(
+                (offsets[k - 1] + i for i in parents),
+                (offsets[k] + j for j in children),
+            )
+            for node in nodes:
+                node_root = find(node)
+                if node_root != root:
+                    roots[node_root] = root
+
+        sizes = {}
+        for node in range(total):
+            root = roots[node] = find(node)
+            sizes[root] = sizes.get(root, 0) + 1
+
+        firsts = {roots[node] for node in range(offsets[1])}
+        lasts = {roots[node] for node in range(offsets[-2], total)}
+
+        # Components go to parts in the order of their first node
+        part_of = {}
+        part_sizes = []
+        part_kinds = []
+        filling = {}
+        for node in range(total):
+            root = roots[node]
+            if root in part_of:
+                continue
+            kind = (root in firsts, root in lasts)
+            part = filling.get(kind)
+            if part is None or (
+                max_nodes is not None and part_sizes[part] + sizes[root] > max_nodes
+            ):
+                part = filling[kind] = len(part_sizes)
+                part_sizes.append(0)
+                part_kinds.append(kind)
+            part_of[root] = part
+            part_sizes[part] += sizes[root]
+        if max_nodes is not None and max(sizes.values()) > max_nodes:
+            print(
+                f"Warning: {max(sizes.values())} nodes of {stage[0].name} are all connected, "
+                f"a piece holds more than {max_nodes} nodes"
+            )
 
-def clean_directory(directory):
-    dag_related_extensions = [".dag", ".dagman.out", ".rescue", ".lock"]
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if any(ext in file for ext in dag_related_extensions):
-                os.remove(os.path.join(root, file))
-                print(f"Removed: {os.path.join(root, file)}")
+        # The vars of each layer are read once and dealt to the parts
+        parts = [[(layer, [], []) for layer in stage] for _ in part_sizes]
+        positions = array.array("q", bytes(8 * total))
+        for k, layer in enumerate(stage):
+            is_sweep = isinstance(layer.vars, Sweep)
+            rows = layer.vars.rows() if is_sweep else layer.vars
+            for i, row in enumerate(rows):
+                node = offsets[k] + i
+                part_rows = parts[part_of[roots[node]]][k][1]
+                positions[node] = len(part_rows)
+                part_rows.append(row)
+            if is_sweep:
+                keys = layer.vars.keys
+                for part in parts:
+                    columns = [list(column) for column in zip(*part[k][1])]
+                    part[k] = (
+                        layer,
+                        Sweep([(keys, columns or [[] for _ in keys])], coerce=False),
+                        part[k][2],
+                    )
+        for k, parents, children in edge_groups():
+            part = parts[part_of[roots[offsets[k - 1] + parents[0]]]]
+            part[k][2].append(
+                (
+                    tuple(positions[offsets[k - 1] + i] for i in parents),
+                    tuple(positions[offsets[k] + j] for j in children),
+                )
+            )
+    return [(part, *kind) for part, kind in zip(parts, part_kinds)]
+
+
+def build_piece(dag, part, partition_type="splice", share=1):
+    # A DAG of the layers of a part of split_stage, or of a whole stage when
+    # its vars are None, with the same submit descriptions and scripts. A
+    # SUBDAG runs its own DAGMan, it gets the DAGMan config and a share of
+    # the throttles of its layers' categories.
+    if partition_type == "subdag":
+        categories = {layer.category for layer, _, _ in part}
+        piece = dags.DAG(
+            dagman_config=dag.dagman_config,
+            max_jobs_by_category={
+                category: max(1, value // share)
+                for category, value in dag.max_jobs_per_category.items()
+                if category in categories
+            },
+        )
+    else:
+        piece = dags.DAG()
+    previous = None
+    for k, (layer, vars, groups) in enumerate(part):
+        kwargs = {
+            key: getattr(layer, key)
+            for key in [
+                "name",
+                "submit_description",
+                "dir",
+                "retries",
+                "retry_unless_exit",
+                "priority",
+                "category",
+                "abort",
+                "pre",
+                "pre_skip_exit_code",
+                "post",
+            ]
+        }
+        if partition_type == "splice" and layer.category:
+            kwargs["category"] = f"+{layer.category}"
+        if vars is None:
+            vars = layer.vars
+            edge = dag._edges.get(part[k - 1][0], layer) if k else None
+        elif len(vars):
+            edge = GroupsEdge(groups) if groups else None
+        else:
+            # No node of this layer in the part
+            previous = None
+            continue
+        previous = add_layer(piece if edge is None else previous, vars, edge, **kwargs)
+    return piece
 
 
-def create_new_dag():
-    dagname = input("Enter the name of the DAG: ").strip() or "auto_dag"
-    dag_dir = create_dag_directory(dagname)
-    dot_config = dags.DotConfig(dagname + ".dot", update=True)
-    dag = dags.DAG(dot_config=dot_config)
-    layers = []
+class GroupsEdge:
+    """
+    Edge yielding fixed (parents, children) groups of node indexes, each
+    group being fully connected.
+    """
 
-    while True:
-        print(
-            "\n----------------CURRENT DAG STRUCTURE----------------\n",
-            dag.describe(),
-            "\n",
-        )
-        job_sub_path = get_job_sub(excluded_dirs=[os.path.basename(dag_dir)])
-        if not job_sub_path:
-            if layers and input("Go back to previous step? (y/N) ").lower() == "y":
-                layers.pop()
-                continue
-            break
+    def __init__(self, groups):
+        self.groups = groups
+
+    def get_edges(self, parent, child, join_factory):
+        return iter(self.groups)
+
+    def __repr__(self):
+        return f"GroupsEdge({len(self.groups)} groups)"
+
+
+def refresh_dag(dag_dir):
+    # Builds a DAG again from its layer manifest. Files are staged again, but
+    # only the layers whose config, submit file or queue file changed have
+    # their vars computed and their nodes written again.
+    start = time.perf_counter()
+    manifest = load_layer_manifest(dag_dir)
+    if manifest is None:
+        raise ValueError(f"No {LAYER_MANIFEST_FILE} in {dag_dir}, build the DAG again")
+
+    build_dag(
+        [layer["config"] for layer in manifest["layers"]],
+        manifest["name"],
+        manifest.get("join_threshold", JOIN_THRESHOLD),
+        InputStore(manifest["store"]) if manifest.get("store") else None,
+        dag_dir,
+        manifest.get("partition"),
+        manifest.get("partition_type", "splice"),
+        manifest.get("throttle"),
+    )
+    layers = load_layer_manifest(dag_dir)["layers"]
+    return {
+        "dag_file": os.path.join(os.path.abspath(dag_dir), manifest["name"] + ".dag"),
+        "changed": [
+            layer["name"] for layer in layers if layer["status"] != "unchanged"
+        ],
+        "unchanged": [
+            layer["name"] for layer in layers if layer["status"] == "unchanged"
+        ],
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
 
-        new_job_sub_path = copy_job_files(job_sub_path, dag_dir)
-        sub_file = open(new_job_sub_path).read()
-        sub_file = re.sub(r"queue.*", "", sub_file)
-        sub_file = re.sub(r"JobBatchName.*\n", "", sub_file)
 
-        job_sub = htcondor.Submit(sub_file)
+def refresh_menu():
+    dag_dirs = [
+        dag_dir
+        for dag_dir in find_dag_dirs(os.getcwd())
+        if os.path.exists(os.path.join(dag_dir, LAYER_MANIFEST_FILE))
+    ]
+    if not dag_dirs:
+        print("No DAG to refresh.")
+        return
 
-        job_name = os.path.basename(new_job_sub_path).replace(".sub", "")
-        if "output" in job_sub.keys():
-            job_sub["output"] = f"condor_log/{job_name}/$(Cluster).out"
-        if "error" in job_sub.keys():
-            job_sub["error"] = f"condor_log/{job_name}/$(Cluster).err"
-        if "log" in job_sub.keys():
-            job_sub["log"] = f"{job_name}.log"
+    print("\nDAGs:")
+    for i, dag_dir in enumerate(dag_dirs, 1):
+        print(f"{i}. {os.path.relpath(dag_dir)}")
+    choice = input("Which DAG? (Enter number): ").strip()
+    if not (choice.isdigit() and 1 <= int(choice) <= len(dag_dirs)):
+        print("Invalid selection.")
+        return
+    result = refresh_dag(dag_dirs[int(choice) - 1])
+    if not result["changed"]:
+        print("Nothing changed.")
 
-        queue_option = input(
-            f"Choose how to set up the queue:\n1. Manual\n2. Import from job {QUEUE_EXT}\n3. No queue\nEnter choice (1/2/3): "
-        )
 
-        if queue_option == "1":
-            vars = set_vars(job_sub)
-        elif queue_option == "2":
-            queue_file = os.path.splitext(new_job_sub_path)[0] + QUEUE_EXT
-            if os.path.exists(queue_file):
-                vars = read_vars(job_sub, queue_file)
-            else:
-                print(f"Warning: {queue_file} not found. Using empty vars.")
-                vars = [{}]
-        else:
-            num_jobs = int(
-                input("Enter the number of jobs to run (default 1): ") or "1"
+def load_specs(spec_path):
+    # A spec file holds one DAG spec, a list of them, or {"dags": [...]}
+    with open(spec_path) as f:
+        text = f.read()
+    if spec_path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(
+                "PyYAML is required to read YAML specs (pip install pyyaml)"
             )
-            vars = [{} for _ in range(num_jobs)]
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
 
-        layer_name = job_name
+    if isinstance(spec, dict) and "dags" in spec:
+        spec = spec["dags"]
+    return spec if isinstance(spec, list) else [spec]
 
-        # Ask about pre-script
-        pre_script = None
-        if (
-            input("Do you want to add a pre-script for this layer? (y/N) ").lower()
-            == "y"
-        ):
-            pre_script_path = input("Enter the path to the pre-script (.sh file): ")
-            if os.path.exists(pre_script_path):
-                shutil.copy2(pre_script_path, dag_dir)
-                pre_script = dags.Script(os.path.basename(pre_script_path))
-            else:
-                print(
-                    f"Warning: Pre-script file {pre_script_path} not found. Skipping pre-script."
-                )
 
-        # Ask about post-script
-        post_script = None
-        if (
-            input("Do you want to add a post-script for this layer? (y/N) ").lower()
-            == "y"
-        ):
-            post_script_path = input("Enter the path to the post-script (.sh file): ")
-            if os.path.exists(post_script_path):
-                shutil.copy2(post_script_path, dag_dir)
-                post_script = dags.Script(os.path.basename(post_script_path))
-            else:
-                print(
-                    f"Warning: Post-script file {post_script_path} not found. Skipping post-script."
-                )
+def build_from_spec(spec, spec_dir="."):
+    """
+    Build (and optionally submit) a DAG from a spec without any prompt.
 
-        if not layers:
-            layer = dag.layer(
-                name=layer_name,
-                submit_description=job_sub,
-                vars=vars,
-                pre=pre_script,
-                post=post_script,
-            )
-        else:
-            edge_type = get_edge_type()
-            # If OneToOne edge, we need to make sure the previous layer has the same number of jobs
-            if isinstance(edge_type, dags.OneToOne) and len(vars) != len(
-                layers[-1].vars
-            ):
-                print(
-                    "Warning: Number of jobs in this layer does not match the previous layer. Setting edge type to ManyToMany."
-                )
-                edge_type = dags.ManyToMany()
+    spec: Dictionary with structure:
+    {
+        'name': str,            # Optional: DAG name, defaults to the first job + "_dag"
+        'layers': list,         # job_configs of quick_dag_with_options
+        'join_threshold': int,  # Optional: See write_dag_stream, null for no joins
+        'store': bool,          # Optional: Link the inputs to the shared InputStore
+        'partition': str|int,   # Optional: "layer" or nodes per piece, see write_partitioned_dag
+        'partition_type': str,  # Optional: "splice" (default) or "subdag"
+        'throttle': dict,       # Optional: DAG-wide limits, see throttle_dag
+        'submit': bool          # Optional: Submit the DAG once written
+    }
+    Relative paths in the layers are relative to spec_dir.
+    Returns a dictionary describing the DAG that was built.
+    """
+    start = time.perf_counter()
+    job_configs = []
+    for layer in spec.get("layers", []):
+        config = dict(layer)
+        for key in [
+            "submit_file",
+            "pre_script",
+            "post_script",
+            "queue_file",
+            "done_manifest",
+        ]:
+            if isinstance(config.get(key), str):
+                config[key] = os.path.join(spec_dir, config[key])
+        job_configs.append(config)
+
+    dag, dag_file = build_dag(
+        job_configs,
+        spec.get("name"),
+        spec.get("join_threshold", JOIN_THRESHOLD),
+        InputStore() if spec.get("store") else None,
+        partition=parse_partition(spec.get("partition")),
+        partition_type=spec.get("partition_type", "splice"),
+        throttle=spec.get("throttle"),
+    )
+    result = {
+        "dag_file": str(dag_file),
+        "layers": {layer.name: len(layer) for layer in dag.nodes},
+        "nodes": sum(len(layer) for layer in dag.nodes),
+    }
+    layers = load_layer_manifest(os.path.dirname(dag_file))["layers"]
+    for key in ["skipped", "bundle"]:
+        values = {layer["name"]: layer[key] for layer in layers if key in layer}
+        if values:
+            result[key] = values
+    if spec.get("submit"):
+        result["cluster_id"] = submit_dag(dag_file)
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def find_dag_dirs(base_dir="."):
+    # Lists base_dir and its subdirectories that hold a .dag file
+    dag_dirs = []
+    for path in [base_dir] + sorted(
+        entry.path
+        for entry in os.scandir(base_dir)
+        if entry.is_dir() and entry.name not in EXCLUDED_FOLDERS
+    ):
+        try:
+            if any(name.endswith(".dag") for name in os.listdir(path)):
+                dag_dirs.append(os.path.normpath(path))
+        except OSError:
+            continue
+    return dag_dirs
+
+
+def event_day(day):
+    # Days since year 1 of an event log date, either ISO (2024-10-17) or the
+    # older month/day format, which has no year
+    day = day.decode()
+    if "/" in day:
+        month, mday = day.split("/")[:2]
+        year = 2000
+    else:
+        year, month, mday = day.split("-")
+    return datetime.date(int(year), int(month), int(mday)).toordinal()
+
+
+def new_log_stats():
+    return {
+        "offset": 0,
+        "inode": None,
+        # Jobs in the queue by id, as [submit time, start time or None, started]
+        "jobs": {},
+        "submitted": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "aborted": 0,
+        "evicted": 0,
+        "held": 0,
+        "memory_holds": 0,
+        "waits": new_distribution(),
+        "runtimes": new_distribution(),
+        # Cluster IDs of the last jobs that failed
+        "failures": [],
+        # Memory (MB) and disk (KB) used by the jobs that terminated
+        "memory": new_distribution(),
+        "disk": new_distribution(),
+        "good_seconds": 0,
+        "bad_seconds": 0,
+        "first": None,
+        "last": None,
+    }
 
-            try:
-                layer = layers[-1].child_layer(
-                    name=layer_name,
-                    submit_description=job_sub,
-                    vars=vars,
-                    pre=pre_script,
-                    post=post_script,
-                    edge=edge_type,
-                )
-            except Exception as e:
-                print(f"Error: {e}")
-                print()
-                continue
 
-        layers.append(layer)
+def new_distribution():
+    # A summary of values in constant space: their count, sum and max, and
+    # their histogram by the upper bound of each bucket
+    return {"count": 0, "sum": 0, "max": None, "buckets": {}}
+
+
+def histogram_bucket(value):
+    # The upper bound of the histogram bucket of value, as a JSON key
+    if value < HISTOGRAM_EXACT:
+        return str(value)
+    step = math.ceil(math.log2(value) * HISTOGRAM_STEPS)
+    return str(math.ceil(2 ** (step / HISTOGRAM_STEPS)))
+
+
+def add_value(distribution, value):
+    distribution["count"] += 1
+    distribution["sum"] += value
+    if distribution["max"] is None or value > distribution["max"]:
+        distribution["max"] = value
+    buckets = distribution["buckets"]
+    bucket = histogram_bucket(value)
+    buckets[bucket] = buckets.get(bucket, 0) + 1
+
+
+def merge_distributions(distribution, other):
+    # Adds the values of other to distribution
+    distribution["count"] += other["count"]
+    distribution["sum"] += other["sum"]
+    if other["max"] is not None:
+        distribution["max"] = max(distribution["max"] or other["max"], other["max"])
+    buckets = distribution["buckets"]
+    for bucket, count in other["buckets"].items():
+        buckets[bucket] = buckets.get(bucket, 0) + count
+    return distribution
+
+
+def update_log_stats(log_file, stats=None):
+    # Adds the events written to an event log since stats was last updated.
+    # Only complete events are read, so the offset always lands between two.
+    log_stat = os.stat(log_file)
+    if (
+        stats is None
+        or stats.keys() != new_log_stats().keys()
+        or stats["inode"] != log_stat.st_ino
+        or stats["offset"] > log_stat.st_size
+    ):
+        stats = new_log_stats()
+        stats["inode"] = log_stat.st_ino
 
-        if input("Would you like to add another layer? (y/N) ").lower() != "y":
+    with open(log_file, "rb") as f, paused_gc():
+        offset = stats["offset"]
+        f.seek(offset)
+        rest = b""
+        while True:
+            data = f.read(STATS_BLOCK_SIZE)
+            if not data:
+                break
+            block = rest + data
+            end = block.rfind(b"...\n") + 4
+            if end < 4:
+                rest = block
+                continue
+            parse_events(block, end, stats)
+            offset += end
+            rest = block[end:]
+        stats["offset"] = offset
+    return stats
+
+
+def parse_events(block, end, stats):
+    # Events are separated by "...", and start with a header such as
+    # "005 (123.000.000) 2024-10-17 12:00:00 Job terminated."
+    jobs = stats["jobs"]
+    waits = stats["waits"]
+    runtimes = stats["runtimes"]
+    days = {}
+    for event in block[:end].split(b"...\n"):
+        code = event[:3]
+        if code not in LOG_EVENT_CODES:
+            continue
+        _, key, day, clock = event.split(b" ", 4)[:4]
+        if day not in days:
+            days[day] = event_day(day) * 86400
+        t = days[day] + int(clock[:2]) * 3600 + int(clock[3:5]) * 60 + int(clock[6:8])
+        key = key.decode()
+
+        if code == b"000":
+            jobs[key] = [t, None, False]
+            stats["submitted"] += 1
+            if stats["first"] is None:
+                stats["first"] = t
+            continue
+
+        job = jobs.get(key)
+        if job is None:
+            # The log was started after this job was submitted
+            job = jobs[key] = [t, None, False]
+        if code == b"001":
+            if not job[2]:
+                add_value(waits, t - job[0])
+                job[2] = True
+            job[1] = t
+        elif code == b"004" or code == b"012":
+            stats["evicted" if code == b"004" else "held"] += 1
+            hold = HOLD_CODE_PATTERN.search(event) if code == b"012" else None
+            if hold and int(hold.group(1)) == MEMORY_HOLD_CODE:
+                stats["memory_holds"] += 1
+            if job[1] is not None:
+                stats["bad_seconds"] += t - job[1]
+                job[1] = None
+        elif code == b"005":
+            del jobs[key]
+            runtime = t - job[1] if job[1] is not None else 0
+            add_value(runtimes, runtime)
+            usage = resource_usage(event)
+            for resource, label in [("memory", b"Memory (MB)"), ("disk", b"Disk (KB)")]:
+                if usage.get(label) is not None:
+                    add_value(stats[resource], usage[label])
+            status = EXIT_STATUS_PATTERN.search(event)
+            if status and int(status.group(1)) == 0:
+                stats["succeeded"] += 1
+                stats["good_seconds"] += runtime
+            else:
+                stats["failed"] += 1
+                stats["bad_seconds"] += runtime
+                failures = stats["failures"]
+                failures.append(int(key[1:].split(".", 1)[0]))
+                del failures[:-LOG_FAILURES_KEPT]
+            stats["last"] = t
+        elif code == b"009":
+            del jobs[key]
+            stats["aborted"] += 1
+            if job[1] is not None:
+                stats["bad_seconds"] += t - job[1]
+            stats["last"] = t
+
+
+def resource_usage(event):
+    # The usage column of the table of partitionable resources of a
+    # terminated event, by resource label, None where it is blank:
+    #   Partitionable Resources :    Usage  Request Allocated
+    #      Memory (MB)          :      512     2048      2048
+    # The values are right-aligned under their header, so the usage is what
+    # lies between the colon and the end of "Usage".
+    header = RESOURCES_PATTERN.search(event)
+    if not header:
+        return {}
+    end = header.end(1) - header.start()
+    usage = {}
+    for line in event[header.end() :].split(b"\n"):
+        label = RESOURCE_LINE_PATTERN.match(line)
+        if not label:
             break
+        value = line[label.end() : end].strip()
+        try:
+            usage[label.group(1)] = int(float(value)) if value else None
+        except ValueError:
+            usage[label.group(1)] = None
+    return usage
 
-    dag_file = dags.write_dag(dag, dag_dir, f"{dagname}.dag")
-    for file in os.listdir(dag_dir):
-        if file.endswith(".sub"):
-            correct_submit(os.path.join(dag_dir, file))
 
-    print(f"DAG file created: {dag_file}")
+def percentiles(distribution, qs=(50, 90, 99)):
+    # The percentiles of a distribution, each the upper bound of its bucket
+    # (the value itself below HISTOGRAM_EXACT), along with the max and mean
+    count = distribution["count"]
+    if not count:
+        return None
+    buckets = sorted((int(bucket), n) for bucket, n in distribution["buckets"].items())
+    summary = {}
+    for q in qs:
+        rank = min(count - 1, count * q // 100)
+        for bound, n in buckets:
+            rank -= n
+            if rank < 0:
+                break
+        summary[f"p{q}"] = min(bound, distribution["max"])
+    summary["max"] = distribution["max"]
+    summary["mean"] = round(distribution["sum"] / count)
+    return summary
+
+
+def summarize_log_stats(stats):
+    completed = stats["succeeded"] + stats["failed"]
+    running = sum(1 for job in stats["jobs"].values() if job[1] is not None)
+    elapsed = (stats["last"] or 0) - (stats["first"] or 0)
+    run_seconds = stats["good_seconds"] + stats["bad_seconds"]
+    return {
+        "submitted": stats["submitted"],
+        "idle": len(stats["jobs"]) - running,
+        "running": running,
+        "succeeded": stats["succeeded"],
+        "failed": stats["failed"],
+        "aborted": stats["aborted"],
+        "evicted": stats["evicted"],
+        "held": stats["held"],
+        "memory_holds": stats["memory_holds"],
+        "throughput_per_hour": (
+            round(completed * 3600 / elapsed, 2) if elapsed > 0 else None
+        ),
+        "queue_wait": percentiles(stats["waits"]),
+        "runtime": percentiles(stats["runtimes"]),
+        "memory_mb": percentiles(stats["memory"]),
+        "disk_kb": percentiles(stats["disk"]),
+        "goodput": (
+            round(stats["good_seconds"] / run_seconds, 3) if run_seconds else None
+        ),
+        "good_hours": round(stats["good_seconds"] / 3600, 2),
+        "bad_hours": round(stats["bad_seconds"] / 3600, 2),
+    }
 
-    if input("Would you like to submit the DAG? (y/N) ").lower() == "y":
-        cwd = os.getcwd()
-        os.chdir(dag_dir)
-        dag_submit = htcondor.Submit.from_dag(str(dag_file), {"force": 1})
-        schedd = htcondor.Schedd()
-        cluster_id = schedd.submit(dag_submit).cluster()
-        print(f"Submitted DAG {dagname}.dag with cluster ID {cluster_id}")
-        os.chdir(cwd)
 
+def new_dagman_stats():
+    return {
+        "offset": 0,
+        "inode": None,
+        "nodes": None,
+        "status": {},
+        "retries": 0,
+        "failed": {},
+        "exit_status": None,
+    }
 
-def quick_dag_with_options(job_configs):
-    """
-    Create a DAG with advanced configuration options for each layer.
 
-    job_configs: List of dictionaries with structure:
-    {
-        'submit_file': str,  # Path to .sub file
-        'pre_script': str,   # Optional path to pre script
-        'post_script': str,  # Optional path to post script
-        'edge_type': str,    # Optional: 'many2many' (default), 'one2one', 'group', 'slice'
-        'edge_params': dict  # Optional: Parameters for edge type
+def update_dagman_stats(dagman_out, stats=None):
+    # Adds the lines written to a .dagman.out since stats was last updated
+    out_stat = os.stat(dagman_out)
+    if (
+        stats is None
+        or stats["inode"] != out_stat.st_ino
+        or stats["offset"] > out_stat.st_size
+    ):
+        stats = new_dagman_stats()
+        stats["inode"] = out_stat.st_ino
+
+    with open(dagman_out, "rb") as f:
+        f.seek(stats["offset"])
+        text = f.read()
+    end = text.rfind(b"\n") + 1
+    for match in DAGMAN_PATTERN.finditer(text, 0, end):
+        nodes, header, counts, retried, failed, exit_status, started = match.groups()
+        if nodes:
+            stats["nodes"] = int(nodes)
+        elif header:
+            stats["status"] = dict(
+                zip(header.decode().split(), map(int, counts.split()))
+            )
+        elif retried:
+            stats["retries"] += 1
+        elif failed:
+            layer = failed.decode().rsplit(":", 1)[0]
+            stats["failed"][layer] = stats["failed"].get(layer, 0) + 1
+        elif exit_status:
+            stats["exit_status"] = int(exit_status)
+        elif started:
+            stats["exit_status"] = None
+    stats["offset"] += end
+    return stats
+
+
+def update_stats_files(dag_dir):
+    # Updates the statistics saved in dag_dir with what was logged since, and
+    # returns them per file, {layer}.log or .dagman.out
+    stats_path = os.path.join(dag_dir, STATS_FILE)
+    try:
+        with open(stats_path) as f:
+            data = json.load(f)
+        saved = data["files"] if data["version"] == STATS_FILE_VERSION else {}
+    except (OSError, ValueError, KeyError, TypeError):
+        saved = {}
+    # The stats are updated in place, so what they were read at is kept aside
+    read_at = {name: (stats["inode"], stats["offset"]) for name, stats in saved.items()}
+
+    files = {}
+    names = sorted(os.listdir(dag_dir))
+    for name in names:
+        path = os.path.join(dag_dir, name)
+        if name.endswith(".dagman.out"):
+            files[name] = update_dagman_stats(path, saved.get(name))
+        elif name.endswith(".log") and name[:-4] + ".sub" in names:
+            files[name] = update_log_stats(path, saved.get(name))
+
+    # Only saved when something new was read, or a file came or went
+    if read_at != {
+        name: (stats["inode"], stats["offset"]) for name, stats in files.items()
+    }:
+        tmp_path = stats_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": STATS_FILE_VERSION, "files": files}, f)
+        os.replace(tmp_path, stats_path)
+    return files
+
+
+def collect_stats(dag_dir):
+    # Returns the statistics of dag_dir per layer and per DAGMan run, with
+    # the error files of the last jobs that failed
+    result = {"dag_dir": os.path.abspath(dag_dir), "layers": {}, "dags": {}}
+    manifest = load_layer_manifest(dag_dir) or {}
+    shards = {
+        layer["name"]: layer.get("log_shards", 1)
+        for layer in manifest.get("layers", [])
     }
+    for name, stats in update_stats_files(dag_dir).items():
+        if name.endswith(".dagman.out"):
+            result["dags"][name[: -len(".dagman.out")]] = {
+                key: value
+                for key, value in stats.items()
+                if key not in ["offset", "inode"]
+            }
+        else:
+            job_name = name[:-4]
+            summary = result["layers"][job_name] = summarize_log_stats(stats)
+            summary["failed_logs"] = [
+                node_log_files(dag_dir, job_name, cluster, shards.get(job_name, 1))[1]
+                for cluster in stats["failures"]
+            ]
+    return result
+
+
+def parse_size(value, unit="K"):
+    # A size of a submit file ("40GB", "512 M", "1024") in unit, None for an
+    # expression. Plain numbers are already in unit, as HTCondor reads
+    # request_memory in MB and request_disk in KB.
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)B?\s*", str(value), re.I)
+    if not match:
+        return None
+    size_unit = match.group(2).upper() or unit
+    return float(match.group(1)) * SIZE_UNITS[size_unit] / SIZE_UNITS[unit]
+
+
+def job_usage(job_name, base_dir="."):
+    # Pools the stats of the {job_name}.log of every DAG directory in base_dir
+    usage = {
+        "jobs": 0,
+        "memory_holds": 0,
+        "memory": new_distribution(),
+        "disk": new_distribution(),
+        "runtimes": new_distribution(),
+    }
+    for dag_dir in find_dag_dirs(base_dir):
+        if not os.path.exists(os.path.join(dag_dir, f"{job_name}.log")):
+            continue
+        try:
+            stats = update_stats_files(dag_dir).get(f"{job_name}.log")
+        except OSError as e:
+            print(f"Warning: Could not read the logs of {dag_dir}: {e}")
+            continue
+        if stats:
+            usage["jobs"] += stats["succeeded"] + stats["failed"]
+            usage["memory_holds"] += stats["memory_holds"]
+            for key in ["memory", "disk", "runtimes"]:
+                merge_distributions(usage[key], stats[key])
+    return usage
+
+
+def rightsize(job_name, base_dir="."):
     """
-    if not job_configs:
-        raise ValueError("No jobs provided")
+    Propose resource requests for a job from the logs of its past runs.
 
-    # Create DAG name from first job
-    dag_name = (
-        os.path.splitext(os.path.basename(job_configs[0]["submit_file"]))[0] + "_dag"
+    The {job_name}.log event logs of the DAG directories in base_dir are
+    pooled. Once RIGHTSIZE_MIN_JOBS jobs have terminated, request_memory and
+    request_disk are proposed to cover the RIGHTSIZE_PERCENTILE percentile of
+    the usage logged, plus RIGHTSIZE_HEADROOM, rounded up to 128 MB for the
+    memory and to 1 MB for the disk.
+
+    Returns the percentiles of the memory (MB), disk (KB) and runtime
+    (seconds) used, the jobs held for exceeding their memory, and the
+    proposed "requests", empty without enough history.
+    """
+    usage = job_usage(job_name, base_dir)
+    qs = (50, 90, RIGHTSIZE_PERCENTILE)
+    proposal = {
+        "job": job_name,
+        "jobs": usage["jobs"],
+        "memory_holds": usage["memory_holds"],
+        "memory_mb": percentiles(usage["memory"], qs),
+        "disk_kb": percentiles(usage["disk"], qs),
+        "runtime": percentiles(usage["runtimes"], qs),
+        "requests": {},
+    }
+    q = f"p{RIGHTSIZE_PERCENTILE}"
+    if usage["memory"]["count"] >= RIGHTSIZE_MIN_JOBS:
+        memory = proposal["memory_mb"][q] * RIGHTSIZE_HEADROOM
+        proposal["requests"][
+            "request_memory"
+        ] = f"{max(1, math.ceil(memory / 128)) * 128}MB"
+    if usage["disk"]["count"] >= RIGHTSIZE_MIN_JOBS:
+        disk = proposal["disk_kb"][q] * RIGHTSIZE_HEADROOM
+        proposal["requests"]["request_disk"] = f"{max(1, math.ceil(disk / 1024))}MB"
+    return proposal
+
+
+def print_rightsize(proposal):
+    q = f"p{RIGHTSIZE_PERCENTILE}"
+    if not proposal["jobs"]:
+        print(f"No past job of {proposal['job']} logged.")
+        return
+    details = []
+    for key, label, unit in [("memory_mb", "memory", "M"), ("disk_kb", "disk", "K")]:
+        if proposal[key]:
+            details.append(
+                f"{label} {q} {format_size(proposal[key][q] * SIZE_UNITS[unit] * 1024)}"
+            )
+    if proposal["runtime"]:
+        details.append(f"runtime {q} {format_duration(proposal['runtime'][q])}")
+    print(
+        f"Usage of {proposal['jobs']} past job(s) of {proposal['job']}: "
+        + (", ".join(details) or "no resource usage logged")
+    )
+    if proposal["memory_holds"]:
+        print(
+            f"  {proposal['memory_holds']} job(s) were held for exceeding their memory, consider memory_retries"
+        )
+    for key, value in proposal["requests"].items():
+        print(f"  Proposed {key} = {value}")
+    if not proposal["requests"]:
+        print(f"  Not enough jobs to propose requests, {RIGHTSIZE_MIN_JOBS} are needed")
+
+
+def escalate_memory(job_sub, retries):
+    # Releases the jobs held for exceeding their memory request, up to
+    # retries times, each time asking MEMORY_RETRY_GROWTH times the memory
+    # they used. Written as plain expressions, so any HTCondor version runs it.
+    memory = parse_size(job_sub.get("request_memory", "128"), "M")
+    if memory is None:
+        print("Warning: request_memory is already an expression. Not escalating it.")
+        return
+    memory = math.ceil(memory)
+    job_sub["request_memory"] = (
+        f"ifThenElse(MemoryUsage =!= undefined, "
+        f"max({{{memory}, MemoryUsage * {MEMORY_RETRY_GROWTH}}}), {memory})"
     )
+    release = f"(HoldReasonCode =?= {MEMORY_HOLD_CODE}) && (NumJobStarts <= {retries})"
+    current = job_sub.get("periodic_release", "")
+    job_sub["periodic_release"] = f"({current}) || {release}" if current else release
 
-    # Create DAG directory
-    dag_dir = os.path.join(os.getcwd(), dag_name)
-    os.makedirs(dag_dir, exist_ok=True)
 
-    # Initialize DAG
-    dot_config = dags.DotConfig(dag_name + ".dot", update=True)
-    dag = dags.DAG(dot_config=dot_config)
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
 
-    prev_layer = None
-    for config in job_configs:
-        job_file = config["submit_file"]
-        job_name = os.path.splitext(os.path.basename(job_file))[0]
-        job_dir = os.path.dirname(os.path.abspath(job_file))
-
-        # Read submit file
-        with open(job_file) as f:
-            sub_content = f.read()
-        job_sub = htcondor.Submit(sub_content)
-
-        # Copy necessary files
-        files_to_copy = [os.path.basename(job_file)]
-        if "executable" in job_sub:
-            files_to_copy.append(job_sub["executable"])
-        if "transfer_input_files" in job_sub:
-            files_to_copy.extend(job_sub["transfer_input_files"].split(","))
-
-        # Copy and setup pre/post scripts if provided
-        pre_script = None
-        if config.get("pre_script"):
-            pre_path = config["pre_script"]
-            if os.path.exists(pre_path):
-                shutil.copy2(pre_path, dag_dir)
-                pre_script = dags.Script(os.path.basename(pre_path))
-
-        post_script = None
-        if config.get("post_script"):
-            post_path = config["post_script"]
-            if os.path.exists(post_path):
-                shutil.copy2(post_path, dag_dir)
-                post_script = dags.Script(os.path.basename(post_path))
-
-        # Copy all necessary files
-        for file in files_to_copy:
-            src = os.path.join(job_dir, file.strip())
-            dst = os.path.join(dag_dir, os.path.basename(file.strip()))
-            if os.path.exists(src):
-                shutil.copy2(src, dst)
-
-        # Handle queue file if exists
-        vars = [{}]
-        queue_args = job_sub.getQArgs()
-        if queue_args:
-            queue_file = re.search(r"\b\w+\.txt\b", queue_args)
-            if queue_file:
-                queue_path = os.path.join(job_dir, queue_file.group(0))
-                if os.path.exists(queue_path):
-                    shutil.copy2(queue_path, dag_dir)
-                    # Read vars from queue file
-                    pattern = r"\$\((.*?)\)"
-                    keys = re.findall(pattern, job_sub["arguments"])
-                    vars = []
-                    with open(queue_path) as f:
-                        for line in f:
-                            combination = line.strip().split()
-                            var = {}
-                            for i, key in enumerate(keys):
-                                var[key] = combination[i]
-                            vars.append(var)
-
-        # Update log paths
-        job_sub["output"] = f"condor_log/{job_name}/$(Cluster).out"
-        job_sub["error"] = f"condor_log/{job_name}/$(Cluster).err"
-        job_sub["log"] = f"{job_name}.log"
-
-        # Handle edge type
-        edge = dags.ManyToMany()  # default
-        if prev_layer and "edge_type" in config:
-            edge_type = config["edge_type"].lower()
-            edge_params = config.get("edge_params", {})
-
-            if edge_type == "one2one":
-                edge = dags.OneToOne()
-            elif edge_type == "group":
-                parent_chunk = edge_params.get("parent_chunk", 1)
-                child_chunk = edge_params.get("child_chunk", 1)
-                edge = dags.Grouper(
-                    parent_chunk_size=parent_chunk, child_chunk_size=child_chunk
-                )
-            elif edge_type == "slice":
-                parent_slice = edge_params.get("parent_slice", slice(None))
-                child_slice = edge_params.get("child_slice", slice(None))
-                edge = dags.Slicer(parent_slice=parent_slice, child_slice=child_slice)
-
-        # Create layer
-        if prev_layer is None:
-            layer = dag.layer(
-                name=job_name,
-                submit_description=job_sub,
-                vars=vars,
-                pre=pre_script,
-                post=post_script,
+
+def print_stats(result):
+    print(f"\nDAG directory: {result['dag_dir']}")
+    for name, dag in result["dags"].items():
+        status = ", ".join(
+            f"{count} {key}" for key, count in dag["status"].items() if count
+        )
+        print(f"  {name}: {status or 'no status yet'}, {dag['retries']} retries")
+        if dag["exit_status"] is not None:
+            print(f"    DAGMan exited with status {dag['exit_status']}")
+    for layer, stats in result["layers"].items():
+        print(
+            f"  {layer}: {stats['submitted']} submitted, {stats['idle']} idle, "
+            f"{stats['running']} running, {stats['succeeded']} succeeded, "
+            f"{stats['failed']} failed, {stats['aborted']} aborted, "
+            f"{stats['evicted']} evictions, {stats['held']} holds"
+            + (
+                f" ({stats['memory_holds']} for memory)"
+                if stats["memory_holds"]
+                else ""
             )
-        else:
-            layer = prev_layer.child_layer(
-                name=job_name,
-                submit_description=job_sub,
-                vars=vars,
-                edge=edge,
-                pre=pre_script,
-                post=post_script,
+        )
+        details = []
+        if stats["throughput_per_hour"] is not None:
+            details.append(f"{stats['throughput_per_hour']} jobs/h")
+        for key, label in [("queue_wait", "queue wait"), ("runtime", "runtime")]:
+            if stats[key]:
+                details.append(
+                    f"{label} "
+                    + " ".join(
+                        f"{q} {format_duration(value)}"
+                        for q, value in stats[key].items()
+                    )
+                )
+        for key, label, unit in [
+            ("memory_mb", "memory", "M"),
+            ("disk_kb", "disk", "K"),
+        ]:
+            if stats[key]:
+                details.append(
+                    f"{label} "
+                    + " ".join(
+                        f"{q} {format_size(value * SIZE_UNITS[unit] * 1024)}"
+                        for q, value in stats[key].items()
+                    )
+                )
+        if stats["goodput"] is not None:
+            details.append(
+                f"goodput {stats['goodput']:.1%} "
+                f"({stats['good_hours']} of {stats['good_hours'] + stats['bad_hours']:.2f} h)"
             )
-        prev_layer = layer
+        if details:
+            print(f"    {', '.join(details)}")
+        for path in stats["failed_logs"]:
+            print(f"    failed: {os.path.relpath(path)}")
+    if not result["dags"] and not result["layers"]:
+        print("  No logs yet.")
+
+
+def stats_menu():
+    dag_dirs = find_dag_dirs(os.getcwd())
+    if not dag_dirs:
+        print("No DAG found.")
+        return
 
-    # Write DAG file
-    dag_file = dags.write_dag(dag, dag_dir, f"{dag_name}.dag")
-    print(f"Created DAG: {dag_file}")
-    return dag_file
+    print("\nDetected DAGs:")
+    for i, dag_dir in enumerate(dag_dirs, 1):
+        print(f"{i}. {os.path.relpath(dag_dir)}")
+    choice = input("Which DAG? (Enter number, or nothing for all): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(dag_dirs):
+        dag_dirs = [dag_dirs[int(choice) - 1]]
+
+    for dag_dir in dag_dirs:
+        print_stats(collect_stats(dag_dir))
 
 
 def change_working_directory():
@@ -651,7 +4559,7 @@ def edit_job_submit():
     if not job_sub_path:
         return
 
-    job_sub = htcondor.Submit(open(job_sub_path).read())
+    job_sub = SubmitFile.load(job_sub_path)
 
     while True:
         print("\nCurrent job submit file contents:")
@@ -662,16 +4570,14 @@ def edit_job_submit():
         if key_to_edit.lower() == "q":
             break
 
-        if key_to_edit in job_sub.keys():
+        if key_to_edit in job_sub:
             print(f"Current value for {key_to_edit}: {job_sub[key_to_edit]}")
             new_value = input(f"Enter new value for {key_to_edit}: ")
             job_sub[key_to_edit] = new_value
         else:
             print(f"Key '{key_to_edit}' not found in job submit file.")
 
-    with open(job_sub_path, "w") as f:
-        f.write(str(job_sub))
-    correct_submit(job_sub_path)
+    job_sub.save(job_sub_path, sectioned=True)
     print(f"Updated job submit file: {job_sub_path}")
 
 
@@ -706,31 +4612,75 @@ def generate_menu():
             print("Invalid choice. Please try again.")
 
 
+def write_queue_file(job_sub_path, vars, keys):
+    # Writes the queue file of a job, and the log shards of its processes,
+    # {LOG_DIR}/{Process // LOG_SHARD_SIZE}/, as the number of rows is known
+    queue_file_path = os.path.splitext(job_sub_path)[0] + QUEUE_EXT
+    separator = " " if QUEUE_EXT == ".txt" else ","
+    rows = 0
+    with open(queue_file_path, "w") as f:
+        # Stream the rows, without a trailing newline after the last one
+        for i, row in enumerate(vars.rows(keys)):
+            line = separator.join(map(str, row))
+            f.write("\n" + line if i else line)
+            rows += 1
+    make_log_dirs(
+        os.path.join(os.path.dirname(job_sub_path), LOG_DIR),
+        log_shards(rows, LOG_SHARD_SIZE),
+    )
+    return queue_file_path
+
+
 def generate_queue():
     job_sub_path = get_job_sub()
     if not job_sub_path:
         return
 
-    job_sub = htcondor.Submit(open(job_sub_path).read())
+    job_sub = SubmitFile.load(job_sub_path)
     pattern = r"\$\((.*?)\)"
     keys = re.findall(pattern, job_sub["arguments"])
 
     vars = set_vars(job_sub)
 
-    queue_file_path = os.path.splitext(job_sub_path)[0] + QUEUE_EXT
-    with open(queue_file_path, "w") as f:
-        for i, var in enumerate(vars):
-            line = (
-                " ".join([str(var[key]) for key in keys])
-                if QUEUE_EXT == ".txt"
-                else ",".join([str(var[key]) for key in keys])
-            )
-            if i < len(vars) - 1:
-                f.write(line + "\n")
-            else:
-                f.write(line)
+    queue_file_path = write_queue_file(job_sub_path, vars, keys)
     print(f"Generated queue file: {queue_file_path}")
 
+    store_path = sweep_store_path(job_sub_path)
+    if (
+        input(
+            f"Also write the indexed sweep store {store_path}, to query the combinations? (y/N) "
+        ).lower()
+        == "y"
+    ):
+        rows = write_sweep_store(store_path, vars, keys)
+        print(f"Generated sweep store: {store_path} ({rows} rows)")
+
+
+def make_edge(edge_type="many2many", edge_params={}):
+    # Builds the edge named by edge_type, one of EDGE_TYPES
+    edge_type = edge_type.lower()
+    if edge_type == "one2one":
+        return dags.OneToOne()
+    elif edge_type == "group":
+        return dags.Grouper(
+            parent_chunk_size=int(edge_params.get("parent_chunk", 1)),
+            child_chunk_size=int(edge_params.get("child_chunk", 1)),
+        )
+    elif edge_type == "slice":
+        # Slices may also be given as [start, end, step] lists, as in JSON specs
+        parent_slice = edge_params.get("parent_slice", slice(None))
+        child_slice = edge_params.get("child_slice", slice(None))
+        if not isinstance(parent_slice, slice):
+            parent_slice = slice(*parent_slice)
+        if not isinstance(child_slice, slice):
+            child_slice = slice(*child_slice)
+        return dags.Slicer(parent_slice=parent_slice, child_slice=child_slice)
+    elif edge_type == "many2many":
+        return dags.ManyToMany()
+    raise ValueError(
+        f"Unknown edge type {edge_type}. Choose from {', '.join(EDGE_TYPES)}."
+    )
+
 
 def get_edge_type():
     # TODO: Add number of parents and children as info
@@ -743,13 +4693,14 @@ def get_edge_type():
     choice = input("Enter your choice (1/2/3/4): ")
 
     if choice == "2":
-        return dags.OneToOne()
+        return "one2one", {}
     elif choice == "3":
         parent_chunk_size = int(input("Enter the parent chunk size: "))
         child_chunk_size = int(input("Enter the child chunk size: "))
-        return dags.Grouper(
-            parent_chunk_size=parent_chunk_size, child_chunk_size=child_chunk_size
-        )
+        return "group", {
+            "parent_chunk": parent_chunk_size,
+            "child_chunk": child_chunk_size,
+        }
     elif choice == "4":
         # TODO Error handling
         # Create the slices
@@ -763,44 +4714,49 @@ def get_edge_type():
             .replace(" ", "")
             .split(",")
         )
-        parent_slice = slice(int(parent_start), int(parent_end), int(parent_step))
-        child_slice = slice(int(child_start), int(child_end), int(child_step))
-        return dags.Slicer(parent_slice=parent_slice, child_slice=child_slice)
+        parent_slice = [int(parent_start), int(parent_end), int(parent_step)]
+        child_slice = [int(child_start), int(child_end), int(child_step)]
+        return "slice", {"parent_slice": parent_slice, "child_slice": child_slice}
     else:
-        return dags.ManyToMany()
+        return "many2many", {}
+
+
+def valid_job_name(job_name):
+    return job_name != "" and not any(
+        char in job_name
+        for char in [" ", ".", "/", "\\", ":", "*", "?", '"', "<", ">", "|"]
+    )
 
 
 def generate_job_directory():
     job_name = input("Enter the job name: ")
 
-    while job_name == "" or any(
-        char in job_name
-        for char in [" ", ".", "/", "\\", ":", "*", "?", '"', "<", ">", "|"]
-    ):
+    while not valid_job_name(job_name):
         print("Invalid job name. Please avoid spaces and special characters.")
         job_name = input("Enter the job name: ")
 
     docker_image = input("Enter the Docker image (leave empty for default): ")
 
     # Has to be of the form user/image:tag
-    while docker_image != "" and not re.match(
-        r"^[a-zA-Z0-9]+/[a-zA-Z0-9-]+:[a-zA-Z0-9]+$", docker_image
-    ):
+    while docker_image != "" and not re.match(DOCKER_IMAGE_PATTERN, docker_image):
         print("Invalid Docker image format. Please enter in the form user/image:tag")
         docker_image = input("Enter the Docker image: ")
 
-    docker_image = (
-        docker_image
-        if docker_image != ""
-        else "pytorch/pytorch:2.4.1-cuda12.1-cudnn9-devel"
-    )
-
-    job_dir = os.path.join(os.getcwd(), job_name)
-    os.makedirs(job_dir, exist_ok=True)
+    docker_image = docker_image if docker_image != "" else DEFAULT_DOCKER_IMAGE
 
     # Get job arguments
     arguments = input("Enter job arguments (space-separated): ").split()
 
+    write_job_directory(job_name, docker_image, arguments)
+
+
+def write_job_directory(job_name, docker_image=DEFAULT_DOCKER_IMAGE, arguments=[]):
+    job_dir = os.path.join(os.getcwd(), job_name)
+    # condor_submit does not create the directory of the output and error
+    # files. Their cluster is not known yet, so they are sharded by process,
+    # and the shards are made again when the queue file is generated.
+    make_log_dirs(os.path.join(job_dir, LOG_DIR), 1)
+
     str_arguments = [f"$({arg})" for arg in arguments]
     # Create .sub file
     sub_template = f"""JobBatchName = "{job_name.capitalize()}"
@@ -820,9 +4776,10 @@ when_to_transfer_output = ON_EXIT
 # Checkpoint
 +is_resumable           = true
 
-# Logging
-output                  = condor_log/Cluster$(Cluster)/output.$(Process).out
-error                   = condor_log/Cluster$(Cluster)/error.$(Process).err
+# Logging, in a directory per {LOG_SHARD_SIZE} processes
+LogShard                = $(Process) / {LOG_SHARD_SIZE}
+output                  = {LOG_DIR}/$INT(LogShard)/$(Cluster).$(Process).out
+error                   = {LOG_DIR}/$INT(LogShard)/$(Cluster).$(Process).err
 log                     = {job_name}.log
 
 # Compute resources
@@ -851,12 +4808,23 @@ queue {', '.join(arguments)} from {job_name}{QUEUE_EXT}
     sh_template = (
         f"""#!/bin/bash
 
+# Run the arguments of each line of a bundle made by autochtc, if given one
+if [ $# -eq 1 ] && [[ "$1" == *{BUNDLE_SUFFIX} ]]; then
+    status=0
+    while read -r line; do
+        [ -n "$line" ] && {{ bash "$0" $line < /dev/null || status=1; }}
+    done < "$1"
+    exit $status
+fi
+
 # Hugging Face
 export HF_HOME=/staging/{os.getenv('USER')}/.cache/huggingface
 export HF_TOKEN=YOUR_TOKEN
 export STAGING_DIR=/staging/{os.getenv('USER')}
 # Export the arguments\n"""
         + "\n".join(export_args)
+        + f"""\n\n# Unpack the inputs packed by autochtc, if any
+for archive in *{PACK_SUFFIX}; do [ -f "$archive" ] && tar -xzf "$archive"; done"""
         + f"""\n\npython3 {job_name}.py {' '.join(py_args)}"""
     )
 
@@ -885,9 +4853,11 @@ def main_menu():
         print(f"Current Directory: {os.getcwd()}")
         print("1. Create a new DAG (dag)")
         print("2. Generate/Edit a job directory or file (gen)")
-        print("3. Get statistics on DAGs and jobs (In construction...) (stats)")
+        print("3. Get statistics on DAGs and jobs (stats)")
         print("4. Clean current directory by removing DAG-related files (clean)")
         print("5. Change working directory (cwd)")
+        print("6. Monitor the submitted DAGs (monitor)")
+        print("7. Refresh a DAG after changing its jobs (refresh)")
         print("q. Quit")
 
         choice = input("Enter your choice: ").lower()
@@ -899,15 +4869,28 @@ def main_menu():
             generate_menu()
 
         elif choice == "3" or choice == "stats":
-            print("Statistics feature is under construction.")
+            stats_menu()
 
         elif choice == "4" or choice == "clean":
-            clean_directory(os.getcwd())
-            print("Directory cleaned of DAG-related files.")
+            # Show what would go before removing anything
+            logs = input(f"Also clean the job logs in {LOG_DIR}? (y/N) ").lower() == "y"
+            if clean_directory(os.getcwd(), dry_run=True, logs=logs)["files"]:
+                answer = input(
+                    "Remove them (r), archive them per DAG (a), or cancel (Enter)? "
+                ).lower()
+                if answer in ["r", "a"]:
+                    clean_directory(os.getcwd(), archive=answer == "a", logs=logs)
+                    print("Directory cleaned of DAG-related files.")
 
         elif choice == "5" or choice == "cwd":
             change_working_directory()
 
+        elif choice == "6" or choice == "monitor":
+            monitor_menu()
+
+        elif choice == "7" or choice == "refresh":
+            refresh_menu()
+
         elif choice == "q":
             print("Quitting AutoCHTC. Goodbye!")
             break
@@ -916,6 +4899,293 @@ def main_menu():
             print("Invalid choice. Please try again.")
 
 
+def run_command(args):
+    # Runs a subcommand without any prompt. Progress goes to stderr and the
+    # results are printed to stdout as JSON. Returns the exit code.
+    results = []
+    if args.command == "build":
+        to_submit = []
+        for spec_path in args.specs:
+            spec_dir = os.path.dirname(os.path.abspath(spec_path))
+            try:
+                specs = load_specs(spec_path)
+            except (OSError, ValueError) as e:
+                results.append({"spec": spec_path, "error": str(e)})
+                continue
+            for spec in specs:
+                # DAGs to submit are submitted together once all are built
+                submit = spec.pop("submit", False) or args.submit
+                if args.no_join:
+                    spec["join_threshold"] = None
+                if args.store:
+                    spec["store"] = True
+                if args.pack:
+                    for layer in spec.get("layers", []):
+                        layer.setdefault("pack", True)
+                if args.hardlink:
+                    for layer in spec.get("layers", []):
+                        layer.setdefault("hardlink", True)
+                if args.partition:
+                    spec["partition"] = args.partition
+                if args.subdag:
+                    spec["partition_type"] = "subdag"
+                try:
+                    with contextlib.redirect_stdout(sys.stderr):
+                        result = build_from_spec(spec, spec_dir)
+                except Exception as e:
+                    result = {"error": str(e)}
+                results.append({"spec": spec_path, **result})
+                if submit and "error" not in result:
+                    to_submit.append(results[-1])
+
+        if to_submit:
+            with contextlib.redirect_stdout(sys.stderr):
+                manifest = submit_dags([result["dag_file"] for result in to_submit])
+            for result, entry in zip(to_submit, manifest):
+                result.update(
+                    {key: entry[key] for key in ["cluster_id", "error"] if key in entry}
+                )
+
+    elif args.command == "submit":
+        with contextlib.redirect_stdout(sys.stderr):
+            results = submit_dags(args.dag_files, workers=args.workers)
+        if args.manifest:
+            with open(args.manifest, "w") as f:
+                json.dump(results, f, indent=2)
+
+    elif args.command == "refresh":
+        for dag_dir in args.dag_dirs:
+            try:
+                with contextlib.redirect_stdout(sys.stderr):
+                    results.append(refresh_dag(dag_dir))
+            except Exception as e:
+                results.append({"dag_dir": dag_dir, "error": str(e)})
+
+    elif args.command == "stats":
+        for dag_dir in args.dag_dirs or find_dag_dirs(os.getcwd()):
+            try:
+                results.append(collect_stats(dag_dir))
+            except OSError as e:
+                results.append({"dag_dir": dag_dir, "error": str(e)})
+
+    elif args.command == "rightsize":
+        job_subs = index_job_subs(os.getcwd())
+        for job_name in args.job_names:
+            with contextlib.redirect_stdout(sys.stderr):
+                proposal = rightsize(job_name, os.getcwd())
+            if args.apply and proposal["requests"]:
+                # The submit files of the job, outside of the DAG directories
+                proposal["applied"] = [
+                    path
+                    for path in job_subs
+                    if os.path.basename(path) == f"{job_name}.sub"
+                ]
+                for path in proposal["applied"]:
+                    for key, value in proposal["requests"].items():
+                        set_submit_value(path, key, value)
+            results.append(proposal)
+
+    elif args.command == "monitor":
+        cluster_ids = args.cluster_ids or list(load_submissions())
+        if cluster_ids:
+            with contextlib.redirect_stdout(sys.stderr):
+                statuses = monitor_dags(cluster_ids, once=args.once)
+            results.extend({"cluster_id": key, **dag} for key, dag in statuses.items())
+
+    elif args.command == "clean":
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            summary = clean_directory(
+                args.directory, args.dry_run, args.archive, args.logs, args.workers
+            )
+        summary["elapsed"] = round(time.perf_counter() - start, 3)
+        results.append(summary)
+
+    elif args.command == "query":
+        path = args.store
+        if not path.endswith(SWEEP_STORE_SUFFIX):
+            path = sweep_store_path(path)
+        try:
+            results.extend(query_sweep_store(path, args.query, args.limit))
+        except (OSError, ValueError, sqlite3.Error) as e:
+            results.append({"store": path, "error": str(e)})
+
+    elif args.command == "gen":
+        if not valid_job_name(args.job_name):
+            results.append({"job_name": args.job_name, "error": "Invalid job name"})
+        elif args.image and not re.match(DOCKER_IMAGE_PATTERN, args.image):
+            results.append({"job_name": args.job_name, "error": "Invalid Docker image"})
+        else:
+            with contextlib.redirect_stdout(sys.stderr):
+                write_job_directory(
+                    args.job_name, args.image or DEFAULT_DOCKER_IMAGE, args.arguments
+                )
+            results.append({"job_dir": os.path.join(os.getcwd(), args.job_name)})
+
+    print(json.dumps(results, indent=2))
+    return 1 if any("error" in result for result in results) else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="AutoCHTC DAG management tool. Without a command, starts the interactive menu."
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help=f"Rebuild the job index kept in {SUB_INDEX_DIR} from scratch",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"Time each phase of the run and save the report to {PROFILE_FILE} and {PROFILE_TRACE_FILE} (or set {PROFILE_ENV}=1)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help=f"Like --profile, also running cProfile and saving its stats to {PROFILE_STATS_FILE}",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    build = commands.add_parser("build", help="Build DAGs from JSON/YAML spec files")
+    build.add_argument("specs", nargs="+", help="Spec files")
+    build.add_argument(
+        "--submit", action="store_true", help="Submit every DAG once written"
+    )
+    build.add_argument(
+        "--no-join",
+        action="store_true",
+        help="Never insert NOOP join nodes between fully connected groups",
+    )
+    build.add_argument(
+        "--store",
+        action="store_true",
+        help=f"Link the job inputs to the content-addressed store {INPUT_STORE_DIR}",
+    )
+    build.add_argument(
+        "--pack",
+        action="store_true",
+        help="Transfer the small input files of each job as one archive",
+    )
+    build.add_argument(
+        "--hardlink",
+        action="store_true",
+        help="Hard link the job inputs into the DAG directories, sharing their edits",
+    )
+    build.add_argument(
+        "--partition",
+        help="Split each DAG into SPLICE pieces: 'layer', or a number of nodes per piece",
+    )
+    build.add_argument(
+        "--subdag",
+        action="store_true",
+        help="With --partition, write SUBDAG EXTERNAL pieces instead of splices",
+    )
+
+    submit = commands.add_parser("submit", help="Submit existing .dag files")
+    submit.add_argument("dag_files", nargs="+", help="DAG files")
+    submit.add_argument(
+        "--workers",
+        type=int,
+        default=SUBMIT_WORKERS,
+        help="DAGs submitted at the same time",
+    )
+    submit.add_argument("--manifest", help="Also write the results to this file")
+
+    refresh = commands.add_parser(
+        "refresh", help="Rebuild DAGs, regenerating only the layers that changed"
+    )
+    refresh.add_argument("dag_dirs", nargs="+", help="DAG directories")
+
+    stats = commands.add_parser(
+        "stats", help="Report job statistics from the logs of DAG directories"
+    )
+    stats.add_argument(
+        "dag_dirs",
+        nargs="*",
+        help="DAG directories, by default those in the current directory",
+    )
+
+    rightsize = commands.add_parser(
+        "rightsize", help="Propose resource requests from the logs of past jobs"
+    )
+    rightsize.add_argument("job_names", nargs="+", help="Job names")
+    rightsize.add_argument(
+        "--apply",
+        action="store_true",
+        help="Write the proposed requests to the submit files of the jobs",
+    )
+
+    monitor = commands.add_parser(
+        "monitor", help="Follow submitted DAGs until they leave the queue"
+    )
+    monitor.add_argument(
+        "cluster_ids",
+        nargs="*",
+        type=int,
+        help=f"DAGMan cluster IDs, by default those in {SUBMITTED_FILE}",
+    )
+    monitor.add_argument(
+        "--once", action="store_true", help="Query the schedd once and exit"
+    )
+
+    clean = commands.add_parser("clean", help="Remove DAG-related files")
+    clean.add_argument("directory", nargs="?", default=".", help="Directory to clean")
+    clean.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report the files that would be removed and their size",
+    )
+    clean.add_argument(
+        "--archive",
+        action="store_true",
+        help="Compress the files of each DAG into an archive instead of deleting them",
+    )
+    clean.add_argument(
+        "--logs",
+        action="store_true",
+        help=f"Also clean the job output and error files in {LOG_DIR}",
+    )
+    clean.add_argument(
+        "--workers",
+        type=int,
+        default=CLEAN_WORKERS,
+        help="Directories listed in parallel",
+    )
+
+    query = commands.add_parser(
+        "query", help="Print the combinations of a sweep store matching a query"
+    )
+    query.add_argument(
+        "store", help=f"Sweep store ({SWEEP_STORE_SUFFIX}) or submit file of the job"
+    )
+    query.add_argument(
+        "query",
+        nargs="?",
+        help='Conditions joined by "and", e.g. "lr < 1e-3 and seed in 0..4"',
+    )
+    query.add_argument("--limit", type=int, help="Print at most this many rows")
+
+    gen = commands.add_parser("gen", help="Generate a new job directory")
+    gen.add_argument("job_name", help="Job name")
+    gen.add_argument("--image", help="Docker image, of the form user/image:tag")
+    gen.add_argument("--arguments", nargs="*", default=[], help="Job arguments")
+
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    print_centered_ascii_art()
-    main_menu()
+    args = parse_args()
+    profile = (
+        "cprofile"
+        if args.cprofile
+        else "1" if args.profile else os.environ.get(PROFILE_ENV)
+    )
+    with profiling(profile):
+        if args.rescan:
+            index_job_subs(os.getcwd(), rescan=True)
+        if args.command:
+            sys.exit(run_command(args))
+
+        print_centered_ascii_art()
+        main_menu()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of autochtc at scale, runnable without an HTCondor pool.
+
+Each benchmark times one step on synthetic job directories and sweeps of
+1k to 10M points: sweep generation (set_vars), queue parsing (read_vars), a
+whole build (quick_dag_with_options), DAG writing with htcondor.dags
+(write_dag) and with autochtc (write_dag_stream), and file staging
+(copy_job_files). Every (benchmark, size) runs in a fresh process, so that
+its peak RSS is its own. Without the htcondor bindings, the small
+stand-in module of benchmarks/stub is imported instead, so that every step
+is timed offline.
+
+    python benchmarks/bench.py --output before.json
+    python benchmarks/bench.py --output after.json --compare before.json
+"""
+
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+STUB_DIR = os.path.join(BENCH_DIR, "stub")
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+MAX_SIZE = 1_000_000  # Largest size run by default, 10M takes minutes per step
+MAX_FILES = 10_000  # Input files staged by the copy_job_files benchmark
+KEY_SIZE = 1_000  # Values of the first key of the 2-key sweeps
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    # Registers a benchmark. It sets up its inputs for a size in the current
+    # directory, and returns the function to time.
+    BENCHMARKS[func.__name__[len("bench_") :]] = func
+    return func
+
+
+def sweep_shape(size):
+    # Values of the 2 keys of a sweep of size points, at least 2 each
+    first = max(2, min(size // 2, KEY_SIZE))
+    return first, size // first
+
+
+@contextlib.contextmanager
+def answers(values):
+    # Answers the prompts of the interactive functions, in order
+    values = iter(values)
+    prompt = builtins.input
+    builtins.input = lambda text="": next(values)
+    try:
+        yield
+    finally:
+        builtins.input = prompt
+
+
+@benchmark
+def bench_set_vars(autochtc, size):
+    first, second = sweep_shape(size)
+    job_sub = {"arguments": "$(a) $(b)"}
+    intervals = ["2", "0", str(first - 1), "1", "2", "0", str(second - 1), "1"]
+
+    def run():
+        with answers(intervals + ["1"]):
+            vars = autochtc.set_vars(job_sub)
+        for _ in vars.rows():
+            pass
+
+    return run
+
+
+@benchmark
+def bench_read_vars(autochtc, size):
+    with open("queue.txt", "w") as f:
+        f.writelines(f"{i} {i % 97}\n" for i in range(size))
+    job_sub = {"arguments": "$(a) $(b)"}
+    return lambda: autochtc.read_vars(job_sub, "queue.txt")
+
+
+@benchmark
+def bench_quick_dag_with_options(autochtc, size):
+    first, second = sweep_shape(size)
+    autochtc.write_job_directory("bench", arguments=["a", "b"])
+    autochtc.write_job_directory("reduce")
+    configs = [
+        {
+            "submit_file": "bench/bench.sub",
+            "sweep": {
+                "keys": {
+                    "a": {"lower": 0, "upper": first - 1, "step": 1},
+                    "b": {"lower": 0, "upper": second - 1, "step": 1},
+                }
+            },
+        },
+        {"submit_file": "reduce/reduce.sub", "num_jobs": 1},
+    ]
+    return lambda: autochtc.quick_dag_with_options(configs, "bench_dag")
+
+
+def bench_dag(autochtc, size, sweep):
+    # A layer of size nodes and a single node depending on all of them
+    first, second = sweep_shape(size)
+    if sweep:
+        vars = autochtc.Sweep.product({"a": range(first), "b": range(second)})
+    else:
+        vars = [{"a": i // second, "b": i % second} for i in range(first * second)]
+    dag = autochtc.dags.DAG()
+    submit = autochtc.htcondor.Submit(
+        {"executable": "bench.sh", "arguments": "$(a) $(b)"}
+    )
+    layer = autochtc.add_layer(dag, vars, name="bench", submit_description=submit)
+    autochtc.add_layer(
+        layer,
+        [{}],
+        edge=autochtc.dags.ManyToMany(),
+        name="reduce",
+        submit_description=submit,
+    )
+    return dag
+
+
+@benchmark
+def bench_write_dag(autochtc, size):
+    dag = bench_dag(autochtc, size, sweep=False)
+    return lambda: autochtc.dags.write_dag(dag, "dag", "bench.dag")
+
+
+@benchmark
+def bench_write_dag_stream(autochtc, size):
+    dag = bench_dag(autochtc, size, sweep=True)
+    return lambda: autochtc.write_dag_stream(dag, "dag", "bench.dag")
+
+
+@benchmark
+def bench_copy_job_files(autochtc, size):
+    files = min(size, MAX_FILES)
+    autochtc.write_job_directory("bench", arguments=["a", "b"])
+    os.makedirs("bench/inputs")
+    inputs = [f"inputs/{i}.dat" for i in range(files)]
+    for input in inputs:
+        with open(os.path.join("bench", input), "wb") as f:
+            f.write(b"\0" * 1024)
+    autochtc.set_submit_value(
+        "bench/bench.sub", "transfer_input_files", ", ".join(["bench.py"] + inputs)
+    )
+    os.makedirs("dag")
+    return lambda: autochtc.copy_job_files("bench/bench.sub", "dag")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_child(name, size):
+    # Runs one benchmark in this process, and prints its result as JSON
+    try:
+        import htcondor
+    except ImportError:
+        sys.path.insert(0, STUB_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import autochtc
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            run = BENCHMARKS[name](autochtc, size)
+            baseline = peak_rss_mb()
+            start = time.perf_counter()
+            run()
+            wall = time.perf_counter() - start
+        os.chdir(REPO_DIR)
+    print(
+        json.dumps(
+            {
+                "wall_seconds": round(wall, 4),
+                "peak_rss_mb": peak_rss_mb(),
+                "setup_rss_mb": baseline,
+            }
+        )
+    )
+
+
+def htcondor_version():
+    # Version of the htcondor bindings, "stub" when they are missing
+    try:
+        import htcondor
+    except ImportError:
+        return "stub"
+    return htcondor.version()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names, sizes, timeout=None):
+    results = []
+    for name in names:
+        for size in sizes:
+            command = [
+                sys.executable,
+                "-W",
+                "ignore",
+                __file__,
+                "--child",
+                name,
+                str(size),
+            ]
+            result = {"benchmark": name, "size": size}
+            try:
+                process = subprocess.run(
+                    command, capture_output=True, text=True, timeout=timeout
+                )
+                if process.returncode:
+                    result["error"] = process.stderr.strip().splitlines()[-1]
+                else:
+                    result.update(json.loads(process.stdout.splitlines()[-1]))
+            except subprocess.TimeoutExpired:
+                result["error"] = f"Timed out after {timeout} s"
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def print_result(result, base=None):
+    line = f"{result['benchmark']:<24} {result['size']:>10}"
+    if "error" in result:
+        print(f"{line}  error: {result['error']}", file=sys.stderr)
+        return
+    line += f"  {result['wall_seconds']:>9.3f} s  {result['peak_rss_mb']:>8.1f} MB"
+    if base and "error" not in base:
+        line += (
+            f"  x{result['wall_seconds'] / max(base['wall_seconds'], 1e-9):.2f} time"
+            f"  x{result['peak_rss_mb'] / max(base['peak_rss_mb'], 1e-9):.2f} RSS"
+        )
+    print(line, file=sys.stderr)
+
+
+def compare(report, base_report):
+    # Prints each result next to the same benchmark and size of base_report
+    base = {
+        (result["benchmark"], result["size"]): result
+        for result in base_report["results"]
+    }
+    print(
+        f"\nCompared with {base_report.get('commit')} ({base_report.get('htcondor')}):",
+        file=sys.stderr,
+    )
+    for result in report["results"]:
+        print_result(result, base.get((result["benchmark"], result["size"])))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark autochtc on synthetic sweeps, without a pool"
+    )
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        help="Benchmarks to run, all by default",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=SIZES,
+        help="Sweep sizes, in points",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=MAX_SIZE,
+        help="Skip the sizes above this one",
+    )
+    parser.add_argument("--timeout", type=float, help="Seconds allowed per run")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        run_child(args.child[0], int(args.child[1]))
+        sys.exit(0)
+
+    report = {
+        "commit": git_commit(),
+        "htcondor": htcondor_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": run_benchmarks(
+            args.benchmarks,
+            [size for size in args.sizes if size <= args.max_size],
+            args.timeout,
+        ),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
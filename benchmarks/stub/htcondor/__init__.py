@@ -0,0 +1,23 @@
+"""
+Stand-in for the htcondor Python bindings, used by the benchmarks when the
+bindings are missing. It covers only what the benchmarks reach: plain
+Submit descriptions and the part of htcondor.dags that builds and writes
+layers joined by ManyToMany or OneToOne edges.
+"""
+
+
+class Submit(dict):
+    # A submit description as a dict of commands, from a dict or the text of
+    # a submit file without its queue statement
+    def __init__(self, description=None):
+        if isinstance(description, str):
+            lines = (line.strip() for line in description.splitlines())
+            description = [
+                [part.strip() for part in line.split("=", 1)]
+                for line in lines
+                if "=" in line and not line.startswith("#")
+            ]
+        super().__init__(description or {})
+
+    def __str__(self):
+        return "".join(f"{key} = {value}\n" for key, value in self.items())
@@ -0,0 +1,229 @@
+"""
+Stand-in for htcondor.dags, used by the benchmarks when the bindings are
+missing. It writes the .dag files of the benchmark DAGs as htcondor.dags
+does: layers of jobs with VARS, joined by ManyToMany or OneToOne edges.
+"""
+
+import enum
+import itertools
+import sys
+from pathlib import Path
+
+import htcondor
+
+DEFAULT_DAG_FILE_NAME = "dagfile.dag"
+CONFIG_FILE_NAME = "dagman.config"
+NOOP_SUBMIT_FILE_NAME = "__JOIN__.sub"
+
+# The writer lives in this module too, reached as dags.writer.DAGWriter
+writer = sys.modules[__name__]
+
+
+class WalkOrder(enum.Enum):
+    BREADTH_FIRST = "BREADTH"
+
+
+class DotConfig:
+    def __init__(self, path, update=False):
+        self.path = Path(path)
+        self.update = update
+
+
+class JoinNode:
+    def __init__(self, id):
+        self.id = id
+
+
+class JoinFactory:
+    def __init__(self):
+        self.joins = []
+
+    def get_join_node(self):
+        self.joins.append(JoinNode(len(self.joins)))
+        return self.joins[-1]
+
+
+class ManyToMany:
+    def get_edges(self, parent, child, join_factory):
+        parents, children = tuple(range(len(parent))), tuple(range(len(child)))
+        if len(parents) == 1 or len(children) == 1:
+            yield parents, children
+        else:
+            join = join_factory.get_join_node()
+            yield parents, join
+            yield join, children
+
+
+class OneToOne:
+    def get_edges(self, parent, child, join_factory):
+        yield from (((i,), (i,)) for i in range(len(parent)))
+
+
+class NodeLayer:
+    def __init__(
+        self,
+        dag,
+        *,
+        name,
+        submit_description,
+        vars=None,
+        pre=None,
+        post=None,
+        category=None,
+    ):
+        if pre or post:
+            raise NotImplementedError("The htcondor stub writes no scripts")
+        self._dag = dag
+        self.name = name
+        self.submit_description = submit_description
+        self.vars = list(vars) if vars is not None else [{}]
+        self.noop = {}
+        self.done = {}
+        self.category = category
+
+    def __len__(self):
+        return len(self.vars)
+
+    def child_layer(self, edge=None, **kwargs):
+        node = self._dag.layer(**kwargs)
+        self._dag._edges[self, node] = edge or ManyToMany()
+        return node
+
+    @property
+    def children(self):
+        return [child for parent, child in self._dag._edges if parent is self]
+
+
+class SubDAG:
+    # Only checked against, the benchmarks write no SUBDAG
+    pass
+
+
+class EdgeStore(dict):
+    def get(self, parent, child):
+        return super().get((parent, child))
+
+
+class DAG:
+    def __init__(self, dot_config=None):
+        self._nodes = []
+        self._edges = EdgeStore()
+        self._final_node = None
+        self.dot_config = dot_config
+        self.dagman_config = {}
+        self.max_jobs_per_category = {}
+
+    def layer(self, **kwargs):
+        self._nodes.append(NodeLayer(self, **kwargs))
+        return self._nodes[-1]
+
+    @property
+    def nodes(self):
+        return list(self._nodes)
+
+    def walk(self, order=WalkOrder.BREADTH_FIRST):
+        seen = set()
+        children = {child for _, child in self._edges}
+        queue = [node for node in self._nodes if node not in children]
+        for node in queue:
+            if node not in seen:
+                seen.add(node)
+                queue.extend(node.children)
+                yield node
+
+
+class DAGWriter:
+    def __init__(self, dag):
+        self.dag = dag
+        self.join_factory = JoinFactory()
+
+    def write(self, dag_dir, dag_file_name=DEFAULT_DAG_FILE_NAME):
+        dag_dir = Path(dag_dir).absolute()
+        dag_dir.mkdir(parents=True, exist_ok=True)
+        dag_file_path = dag_dir / (dag_file_name or DEFAULT_DAG_FILE_NAME)
+        with dag_file_path.open(mode="w") as f:
+            f.write("# BEGIN META\n")
+            f.writelines(line + "\n" for line in self.yield_dag_meta_lines())
+            f.write("# END META\n# BEGIN NODES AND EDGES\n")
+            for node in self.dag.walk():
+                f.writelines(line + "\n" for line in self.yield_node_lines(node))
+                f.writelines(line + "\n" for line in self.yield_edge_lines(node))
+            f.writelines(line + "\n" for line in self.yield_join_node_lines())
+            f.write("# END NODES AND EDGES\n")
+        self.write_submit_files_for_layers(dag_dir)
+        if self.join_factory.joins:
+            self.write_noop_submit_file(dag_dir)
+        if self.dag.dagman_config:
+            self.write_dagman_config_file(dag_dir)
+        return dag_file_path
+
+    def write_submit_files_for_layers(self, path):
+        for layer in self.dag.nodes:
+            text = str(layer.submit_description) + "\nqueue"
+            (path / f"{layer.name}.sub").write_text(text)
+
+    def write_noop_submit_file(self, dag_dir):
+        (dag_dir / NOOP_SUBMIT_FILE_NAME).touch(exist_ok=True)
+
+    def write_dagman_config_file(self, dag_dir):
+        config = self.dag.dagman_config
+        text = "\n".join(f"{key} = {value}" for key, value in config.items())
+        (dag_dir / CONFIG_FILE_NAME).write_text(text)
+
+    def yield_dag_meta_lines(self):
+        if self.dag.dagman_config:
+            yield f"CONFIG {CONFIG_FILE_NAME}"
+        config = self.dag.dot_config
+        if config is not None:
+            update = "UPDATE" if config.update else "DONT-UPDATE"
+            yield f"DOT {config.path.as_posix()} {update} OVERWRITE"
+
+    def yield_node_lines(self, layer):
+        for idx, vars in enumerate(layer.vars):
+            name = self.get_node_name(layer, idx)
+            yield f"JOB {name} {layer.name}.sub"
+            if vars:
+                values = (
+                    str(value).replace("\\", "\\\\").replace('"', r"\"")
+                    for value in vars.values()
+                )
+                yield " ".join(
+                    [f"VARS {name}"]
+                    + [f'{key}="{value}"' for key, value in zip(vars, values)]
+                )
+            yield from self.yield_node_meta_lines(layer, name)
+
+    def yield_join_node_lines(self):
+        for join in self.join_factory.joins:
+            yield f"JOB {self.join_node_name(join)} {NOOP_SUBMIT_FILE_NAME} NOOP"
+
+    def get_node_meta_parts(self, node, idx):
+        return []
+
+    def yield_node_meta_lines(self, node, name):
+        if node.category is not None:
+            yield f"CATEGORY {name} {node.category}"
+
+    def get_node_name(self, node, idx):
+        return f"{node.name}:{idx}"
+
+    def join_node_name(self, join):
+        return f"__JOIN__:{join.id}"
+
+    def yield_edge_lines(self, parent):
+        for child in parent.children:
+            edge = self.dag._edges.get(parent, child)
+            for parents, children in edge.get_edges(parent, child, self.join_factory):
+                names = [
+                    (
+                        [self.join_node_name(indexes)]
+                        if isinstance(indexes, JoinNode)
+                        else [self.get_node_name(node, i) for i in indexes]
+                    )
+                    for node, indexes in [(parent, parents), (child, children)]
+                ]
+                yield f"PARENT {' '.join(names[0])} CHILD {' '.join(names[1])}"
+
+
+def write_dag(dag, dag_dir, dag_file_name=DEFAULT_DAG_FILE_NAME):
+    return DAGWriter(dag).write(dag_dir, dag_file_name)
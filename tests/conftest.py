@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import autochtc
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Runs the test in an empty working directory, with the job index kept
+    # next to it as it is kept in the user's cache
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+    monkeypatch.setattr(autochtc, "SUB_INDEX_DIR", str(tmp_path / "cache"))
+    autochtc.SubmitFile.cache.clear()
+    return work
+
+
+@pytest.fixture
+def htcondor():
+    return pytest.importorskip("htcondor")
+
+
+def make_job(name, arguments=(), rows=()):
+    # A job directory as generated by gen, with a queue file of rows
+    autochtc.write_job_directory(name, arguments=list(arguments))
+    with open(os.path.join(name, f"{name}{autochtc.QUEUE_EXT}"), "w") as f:
+        f.write("\n".join(" ".join(map(str, row)) for row in rows))
+    return os.path.join(name, f"{name}.sub")
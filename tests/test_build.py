@@ -0,0 +1,65 @@
+import json
+import os
+
+import autochtc
+from conftest import make_job
+
+
+def test_quick_dag_with_slice_edge(workdir, htcondor):
+    parent = make_job("parent", ["x"], [[i] for i in range(6)])
+    child = make_job("child", ["y"], [[i] for i in range(6)])
+    dag_file = autochtc.quick_dag_with_options(
+        [
+            {"submit_file": parent},
+            {
+                "submit_file": child,
+                "edge_type": "slice",
+                "edge_params": {
+                    "parent_slice": slice(None, None, 2),
+                    "child_slice": slice(1, None, 2),
+                },
+            },
+        ],
+        "sliced",
+    )
+
+    with open(dag_file) as f:
+        edges = [line.split() for line in f if line.startswith("PARENT")]
+    assert edges == [
+        ["PARENT", f"parent:{i}", "CHILD", f"child:{i + 1}"] for i in (0, 2, 4)
+    ]
+
+    with open(os.path.join(workdir, "sliced", autochtc.LAYER_MANIFEST_FILE)) as f:
+        layers = json.load(f)["layers"]
+    assert layers[1]["config"]["edge_params"] == {
+        "parent_slice": [None, None, 2],
+        "child_slice": [1, None, 2],
+    }
+
+    # The slices saved as lists hash the same way on refresh
+    refresh = autochtc.refresh_dag(os.path.join(workdir, "sliced"))
+    assert refresh["unchanged"] == ["parent", "child"]
+
+
+def test_category_only_for_throttled_layers(workdir, htcondor):
+    job = make_job("train", ["x"], [[i] for i in range(6)])
+
+    def build(**config):
+        dag_file = autochtc.quick_dag_with_options(
+            [{"submit_file": job, **config}], "train_dag"
+        )
+        with open(dag_file) as f:
+            lines = [line.split()[0] for line in f]
+        with open(os.path.join("train_dag", autochtc.LAYER_MANIFEST_FILE)) as f:
+            status = json.load(f)["layers"][0]["status"]
+        return lines.count("CATEGORY"), lines.count("MAXJOBS"), status
+
+    # 6 jobs of 1 CPU are far from any limit
+    assert build() == (0, 0, "new")
+    assert build() == (0, 0, "unchanged")
+    # A limit puts every node in the category, lifting it takes them out
+    assert build(max_jobs=2) == (6, 1, "changed")
+    assert build(max_jobs=2) == (6, 1, "unchanged")
+    assert build(max_jobs=None) == (0, 0, "changed")
+    # A category asked for is kept without a limit
+    assert build(max_jobs=None, category="gpu") == (6, 0, "changed")
@@ -0,0 +1,109 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import autochtc
+
+
+def expand(edge, parent_size, child_size):
+    # Every (parent, child) pair of an edge between combinations, from the
+    # definition of each edge type
+    from htcondor import dags
+
+    if type(edge) is dags.ManyToMany:
+        return {(i, j) for i in range(parent_size) for j in range(child_size)}
+    if type(edge) is dags.OneToOne:
+        return {(i, i) for i in range(parent_size)}
+    if type(edge) is dags.Grouper:
+        p, c = edge.parent_chunk_size, edge.child_chunk_size
+        return {
+            (i, j)
+            for k in range(parent_size // p)
+            for i in range(k * p, (k + 1) * p)
+            for j in range(k * c, (k + 1) * c)
+        }
+    return set(
+        zip(range(parent_size)[edge.parent_slice], range(child_size)[edge.child_slice])
+    )
+
+
+def edge_cases():
+    from htcondor import dags
+
+    return [
+        ("many2many", dags.ManyToMany(), 7, 5),
+        ("one2one", dags.OneToOne(), 12, 12),
+        ("group 2:3", dags.Grouper(2, 3), 8, 12),
+        ("group 4:4", dags.Grouper(4, 4), 12, 12),
+        ("slice", dags.Slicer(slice(None, None, 2), slice(1, None, 2)), 12, 12),
+        ("slice offset", dags.Slicer(slice(3, None), slice(None, 7)), 10, 9),
+    ]
+
+
+@pytest.mark.parametrize("parent_bundle", [1, 2, 3, 4])
+@pytest.mark.parametrize("child_bundle", [1, 2, 3, 5])
+def test_bundled_edges_match_expansion(htcondor, parent_bundle, child_bundle):
+    from htcondor import dags
+
+    for name, edge, parent_size, child_size in edge_cases():
+        dag = dags.DAG()
+        parent = dag.layer(name="A", vars=[{}] * -(-parent_size // parent_bundle))
+        child = parent.child_layer(
+            name="B",
+            vars=[{}] * -(-child_size // child_bundle),
+            edge=autochtc.bundle_edge(
+                edge, parent_size, parent_bundle, child_size, child_bundle
+            ),
+        )
+
+        expected = {
+            (i // parent_bundle, j // child_bundle)
+            for i, j in expand(edge, parent_size, child_size)
+        }
+        groups = list(
+            autochtc.yield_edge_groups(dag._edges.get(parent, child), parent, child)
+        )
+        edges = [
+            (i, j) for parents, children in groups for i in parents for j in children
+        ]
+        # Every bundle edge once, and no other
+        assert sorted(edges) == sorted(expected), name
+
+
+def test_bundle_loop_runs_each_line(workdir):
+    autochtc.write_job_directory("train", arguments=["lr", "seed"])
+    vars = [{"lr": lr, "seed": seed} for lr in ["0.1", "0.01"] for seed in [1, 2, 3]]
+    bundles = autochtc.write_bundles(vars, "$(lr) $(seed)", "dag", "train", 4)
+    assert list(bundles.rows()) == [(0,), (1,)]
+
+    # A python3 that records its arguments, and fails for seed 2
+    bin_dir = workdir / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "python3").write_text(
+        '#!/bin/sh\necho "$@" >> calls.txt\n[ "$5" != 2 ]\n'
+    )
+    (bin_dir / "python3").chmod(0o755)
+    env = {**os.environ, "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}"}
+
+    # The node runs in a scratch directory holding its executable and bundle
+    scratch = workdir / "scratch"
+    scratch.mkdir()
+    shutil.copy("train/train.sh", scratch)
+    shutil.copy(os.path.join("dag", "train_bundles", "0.bundle"), scratch)
+    run = subprocess.run(["bash", "train.sh", "0.bundle"], cwd=scratch, env=env)
+    # One combination failed, the others still ran
+    assert run.returncode == 1
+    assert (scratch / "calls.txt").read_text().splitlines() == [
+        "train.py --lr 0.1 --seed 1",
+        "train.py --lr 0.1 --seed 2",
+        "train.py --lr 0.1 --seed 3",
+        "train.py --lr 0.01 --seed 1",
+    ]
+
+    shutil.copy(os.path.join("dag", "train_bundles", "1.bundle"), scratch)
+    (scratch / "calls.txt").unlink()
+    run = subprocess.run(["bash", "train.sh", "1.bundle"], cwd=scratch, env=env)
+    assert run.returncode == 1
+    assert len((scratch / "calls.txt").read_text().splitlines()) == 2
@@ -0,0 +1,28 @@
+import autochtc
+
+
+def test_manifest_matches_numbers_by_value(workdir):
+    vars = autochtc.Sweep.product({"lr": [0.1, 1.0, 0.001], "seed": [1, 2]})
+    # Written by the jobs, with their own number formats
+    (workdir / "done.txt").write_text("0.10 1\n1 2\n1e-3 1\n1.0 01\n")
+    remaining, skipped = autochtc.filter_done(
+        vars, ["lr", "seed"], ".", manifest="done.txt"
+    )
+    assert list(skipped) == [0, 2, 3, 4]
+    assert list(remaining.rows()) == [(0.1, 2), (0.001, 2)]
+
+
+def test_manifest_keeps_text_values(workdir):
+    vars = [{"name": name} for name in ["a", "1_0", "10", "b"]]
+    (workdir / "done.txt").write_text("a\n10\n")
+    remaining, skipped = autochtc.filter_done(vars, ["name"], ".", manifest="done.txt")
+    assert list(skipped) == [0, 2]
+    assert list(remaining.rows()) == [("1_0",), ("b",)]
+
+
+def test_filtering_without_arguments_warns(workdir, capsys):
+    vars = [{} for _ in range(3)]
+    (workdir / "done.txt").write_text("\n")
+    remaining, skipped = autochtc.filter_done(vars, [], ".", manifest="done.txt")
+    assert remaining is vars and not skipped
+    assert "Warning" in capsys.readouterr().out
@@ -0,0 +1,54 @@
+import collections
+import os
+
+import autochtc
+
+
+def expanded_logs(htcondor, submit_file, processes):
+    # The output and error files of the given processes, as condor names them
+    submit = htcondor.Submit(submit_file.text(queue=False))
+    return [
+        [ad[key] for key in ["Out", "Err"]]
+        for process in processes
+        for ad in submit.jobs(count=1, clusterid=7, procid=process)
+    ]
+
+
+def test_generated_log_directories_exist(workdir, htcondor):
+    autochtc.write_job_directory("train", arguments=["lr"])
+    submit_file = autochtc.SubmitFile.load(os.path.join("train", "train.sub"))
+    # condor_submit fails when the directory of the output or error is missing
+    for path in expanded_logs(htcondor, submit_file, [0])[0]:
+        assert os.path.isdir(os.path.join("train", os.path.dirname(path)))
+
+
+def test_queue_logs_are_sharded_by_process(workdir, htcondor):
+    import classad
+
+    autochtc.write_job_directory("train", arguments=["lr"])
+    rows = 100_000
+    autochtc.write_queue_file(
+        os.path.join("train", "train.sub"),
+        autochtc.Sweep.product({"lr": range(rows)}),
+        ["lr"],
+    )
+    submit_file = autochtc.SubmitFile.load(os.path.join("train", "train.sub"))
+    size = autochtc.LOG_SHARD_SIZE
+    assert expanded_logs(htcondor, submit_file, [0, size - 1, size, rows - 1]) == [
+        [
+            f"{autochtc.LOG_DIR}/{process // size}/7.{process}{ext}"
+            for ext in [".out", ".err"]
+        ]
+        for process in [0, size - 1, size, rows - 1]
+    ]
+
+    # The shard of every process, as condor evaluates it
+    shard = classad.ExprTree(submit_file["LogShard"].replace("$(Process)", "Process"))
+    ad = classad.ClassAd()
+    jobs = collections.Counter()
+    for process in range(rows):
+        ad["Process"] = process
+        jobs[shard.eval(ad)] += 1
+    log_dir = os.path.join("train", autochtc.LOG_DIR)
+    assert sorted(os.listdir(log_dir)) == sorted(map(str, jobs))
+    assert len(jobs) <= size and max(jobs.values()) <= size
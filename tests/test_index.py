@@ -0,0 +1,29 @@
+import os
+
+import autochtc
+from conftest import make_job
+
+
+def test_index_settles_after_a_scan(workdir, monkeypatch):
+    make_job("train")
+    make_job("evaluate")
+    assert autochtc.index_job_subs(".") == ["evaluate/evaluate.sub", "train/train.sub"]
+    # The index is kept out of the tree it indexes
+    assert not any(name.endswith(".json") for name in os.listdir("."))
+    assert os.path.exists(autochtc.sub_index_path("."))
+
+    scanned = []
+    scan_job_dir = autochtc.scan_job_dir
+    monkeypatch.setattr(
+        autochtc,
+        "scan_job_dir",
+        lambda path: scanned.append(path) or scan_job_dir(path),
+    )
+    # Saving the index left the mtimes as they were, so nothing is listed
+    assert autochtc.index_job_subs(".") == ["evaluate/evaluate.sub", "train/train.sub"]
+    assert scanned == []
+
+    # A new job only has its parent listed again, along with its directory
+    make_job("plot")
+    assert len(autochtc.index_job_subs(".")) == 3
+    assert scanned == [".", "plot"]
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from conftest import REPO_DIR
+
+# Runs in a fresh interpreter where importing htcondor fails
+WITHOUT_HTCONDOR = """
+import sys
+sys.modules["htcondor"] = None
+sys.modules["htcondor.dags"] = None
+sys.path.insert(0, {repo!r})
+import autochtc
+
+autochtc.parse_args(["clean", "--dry-run"])
+autochtc.write_job_directory("job", arguments=["a"])
+assert autochtc.index_job_subs(".") == ["job/job.sub"]
+autochtc.set_submit_value("job/job.sub", "request_cpus", "2")
+autochtc.clean_directory(".", dry_run=True)
+assert "htcondor" not in {{name for name, module in sys.modules.items() if module}}
+
+try:
+    autochtc.quick_dag_with_options([{{"submit_file": "job/job.sub"}}], "job_dag")
+except ImportError as e:
+    print(e)
+else:
+    raise AssertionError("Built a DAG without htcondor")
+"""
+
+
+def test_runs_without_htcondor(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-c", WITHOUT_HTCONDOR.format(repo=REPO_DIR)],
+        cwd=tmp_path,
+        env={**os.environ, "XDG_CACHE_HOME": str(tmp_path / ".cache")},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    hint = result.stdout.strip().splitlines()[-1]
+    assert hint.startswith("The htcondor Python bindings are required")
+    assert "pip install htcondor" in hint
@@ -0,0 +1,46 @@
+import os
+import shutil
+
+import pytest
+
+import autochtc
+from conftest import make_job
+from test_stats import FIXTURE_LOG
+
+
+def answer(answers):
+    # Answers the prompts starting with one of the keys of answers, and the
+    # others with their default
+    def input(prompt=""):
+        for start, value in answers.items():
+            if prompt.startswith(start):
+                return value
+        return ""
+
+    return input
+
+
+@pytest.mark.parametrize("propose", [False, True])
+def test_menu_reads_past_logs_only_when_asked(workdir, htcondor, monkeypatch, propose):
+    make_job("train", ["x"], [[i] for i in range(3)])
+    # A DAG built before, whose logs right-sizing would read
+    os.mkdir("old_dag")
+    shutil.copy(FIXTURE_LOG, os.path.join("old_dag", "train.log"))
+    open(os.path.join("old_dag", "train.sub"), "w").close()
+    open(os.path.join("old_dag", "old_dag.dag"), "w").close()
+
+    monkeypatch.setattr(
+        "builtins.input",
+        answer(
+            {
+                "Enter the name of the DAG": "new_dag",
+                "Which job?": "train/train.sub",
+                "Propose requests": "y" if propose else "n",
+                "Would you like to add another layer?": "n",
+            }
+        ),
+    )
+    autochtc.create_new_dag()
+    assert os.path.exists(os.path.join("new_dag", "new_dag.dag"))
+    stats_file = os.path.join("old_dag", autochtc.STATS_FILE)
+    assert os.path.exists(stats_file) == propose
@@ -0,0 +1,112 @@
+import os
+import re
+
+import pytest
+
+import autochtc
+
+
+def load_dag(dag_file, graph, ids, prefix=""):
+    # Adds the nodes of a .dag to graph, with a node before and one after
+    # each splice or subdag so that an edge to or from it reaches all of its
+    # nodes. Returns the names of the nodes added, by the id in their VARS.
+    dag_dir = os.path.dirname(dag_file)
+    pieces, nodes, edges = set(), [], []
+    with open(dag_file) as f:
+        for line in f:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == "JOB":
+                nodes.append(prefix + words[1])
+            elif words[0] == "VARS":
+                ids[prefix + words[1]] = re.search(r'id="(.*?)"', line).group(1)
+            elif words[0] in ["SPLICE", "SUBDAG"]:
+                name, piece_file = words[-2:]
+                pieces.add(name)
+                inner = load_dag(
+                    os.path.join(dag_dir, piece_file), graph, ids, f"{prefix}{name}+"
+                )
+                for node in inner:
+                    graph.setdefault(("in", prefix + name), set()).add(node)
+                    graph.setdefault(node, set()).add(("out", prefix + name))
+                nodes.extend(inner)
+            elif words[0] == "PARENT":
+                split = words.index("CHILD")
+                edges.append((words[1:split], words[split + 1 :]))
+    for parents, children in edges:
+        for parent in parents:
+            source = ("out", prefix + parent) if parent in pieces else prefix + parent
+            for child in children:
+                target = ("in", prefix + child) if child in pieces else prefix + child
+                graph.setdefault(source, set()).add(target)
+    return nodes
+
+
+def reachable_ids(dag_file):
+    # The (ancestor, descendant) pairs of nodes of a DAG, by the ids of
+    # their VARS, joins and pieces being only passed through
+    graph, ids = {}, {}
+    load_dag(str(dag_file), graph, ids)
+    pairs = set()
+    for start in ids:
+        seen, stack = set(), [start]
+        while stack:
+            for node in graph.get(stack.pop(), ()):
+                if node not in seen:
+                    seen.add(node)
+                    stack.append(node)
+        pairs.update((ids[start], ids[node]) for node in seen if node in ids)
+    return pairs
+
+
+def layered_dag(htcondor, edge, sizes):
+    # Layers A, B, C, D, with edge between A and B, a ManyToMany edge after
+    # B and a OneToOne edge after C
+    from htcondor import dags
+
+    dag = dags.DAG()
+    submit = htcondor.Submit({"executable": "job.sh", "arguments": "$(id)"})
+    edges = [None, edge, dags.ManyToMany(), dags.OneToOne()]
+    layer = dag
+    for name, size, layer_edge in zip("ABCD", sizes, edges):
+        layer = autochtc.add_layer(
+            layer,
+            [{"id": f"{name}{i}"} for i in range(size)],
+            edge=layer_edge,
+            name=name,
+            submit_description=submit,
+        )
+    return dag
+
+
+def edge_cases():
+    from htcondor import dags
+
+    return [
+        ("many2many", dags.ManyToMany(), [5, 4, 3, 3]),
+        ("one2one", dags.OneToOne(), [6, 6, 4, 4]),
+        ("group", dags.Grouper(2, 3), [8, 12, 5, 5]),
+        ("slice", dags.Slicer(slice(None, None, 2), slice(1, None, 2)), [7, 6, 3, 3]),
+        ("slice offset", dags.Slicer(slice(3, None), slice(None, 4)), [9, 8, 2, 2]),
+    ]
+
+
+@pytest.mark.parametrize("partition_type", ["splice", "subdag"])
+@pytest.mark.parametrize("partition", ["layer", 1, 3, 7, 1000])
+def test_partition_keeps_reachability(tmp_path, htcondor, partition, partition_type):
+    for name, edge, sizes in edge_cases():
+        whole_dir = tmp_path / name / "whole"
+        whole = autochtc.write_dag_stream(
+            layered_dag(htcondor, edge, sizes), whole_dir, "t.dag", join_threshold=None
+        )
+        # Joins at the top level too, with a threshold of 0
+        parts = autochtc.write_partitioned_dag(
+            layered_dag(htcondor, edge, sizes),
+            tmp_path / name / "parts",
+            "t",
+            partition,
+            partition_type,
+            join_threshold=0,
+        )
+        assert reachable_ids(parts) == reachable_ids(whole), name
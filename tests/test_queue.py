@@ -0,0 +1,25 @@
+import pytest
+
+import autochtc
+
+
+@pytest.mark.parametrize("block_size", [autochtc.QUEUE_BLOCK_SIZE, 8])
+def test_mixed_columns_are_typed_per_value(workdir, monkeypatch, block_size):
+    # Each value made of digits is an int, whatever the first line holds
+    lines = ["a 1", "7 b", "1_0 2", "x y", "-3 04"]
+    (workdir / "queue.txt").write_text("\n".join(lines) + "\n")
+    monkeypatch.setattr(autochtc, "QUEUE_BLOCK_SIZE", block_size)
+    vars = autochtc.read_vars({"arguments": "$(p) $(q)"}, "queue.txt")
+    assert [(row["p"], row["q"]) for row in vars] == [
+        ("a", 1),
+        (7, "b"),
+        ("1_0", 2),
+        ("x", "y"),
+        ("-3", 4),
+    ]
+
+
+def test_comma_separated_columns(workdir):
+    (workdir / "queue.txt").write_text("1, 0.5\n2 ,a\n 3,4\n")
+    vars = autochtc.read_vars({"arguments": "$(p) $(q)"}, "queue.txt")
+    assert [(row["p"], row["q"]) for row in vars] == [(1, "0.5"), (2, "a"), (3, 4)]
@@ -0,0 +1,108 @@
+from fractions import Fraction
+
+import pytest
+
+import autochtc
+
+# The first points of the unscrambled sequences, as given by scipy.stats.qmc
+# (Sobol in Gray code order, with the direction numbers of Joe and Kuo)
+SOBOL_POINTS = [
+    ["0", "0", "0", "0", "0"],
+    ["1/2", "1/2", "1/2", "1/2", "1/2"],
+    ["3/4", "1/4", "1/4", "1/4", "3/4"],
+    ["1/4", "3/4", "3/4", "3/4", "1/4"],
+    ["3/8", "3/8", "5/8", "7/8", "3/8"],
+    ["7/8", "7/8", "1/8", "3/8", "7/8"],
+    ["5/8", "1/8", "7/8", "5/8", "5/8"],
+    ["1/8", "5/8", "3/8", "1/8", "1/8"],
+]
+HALTON_POINTS = [
+    ["0", "0", "0"],
+    ["1/2", "1/3", "1/5"],
+    ["1/4", "2/3", "2/5"],
+    ["3/4", "1/9", "3/5"],
+    ["1/8", "4/9", "4/5"],
+    ["5/8", "7/9", "1/25"],
+    ["3/8", "2/9", "6/25"],
+    ["7/8", "5/9", "11/25"],
+    ["1/16", "8/9", "16/25"],
+]
+
+
+class Unshifted:
+    # A random source whose draws are all 0, leaving the sequences as they are
+    def getrandbits(self, bits):
+        return 0
+
+    def random(self):
+        return 0.0
+
+
+@pytest.fixture(params=["numpy", "python"])
+def numpy_or_not(request, monkeypatch):
+    # Runs a test with numpy, when it is installed, and without it
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(autochtc, "optional_numpy", lambda: None)
+    return request.param
+
+
+def test_sobol_reference(numpy_or_not):
+    columns = autochtc.sobol_columns(5, 8, Unshifted())
+    for i, row in enumerate(SOBOL_POINTS):
+        # Point i in Gray code order is point i ^ (i >> 1) in natural order
+        assert [column[i ^ (i >> 1)] for column in columns] == [
+            float(Fraction(value)) for value in row
+        ]
+
+
+def test_halton_reference(numpy_or_not):
+    columns = autochtc.halton_columns(3, 9, Unshifted())
+    for i, row in enumerate(HALTON_POINTS):
+        assert [column[i] for column in columns] == pytest.approx(
+            [float(Fraction(value)) for value in row], abs=1e-12
+        )
+
+
+@pytest.mark.parametrize("jobs", [1, 7, 64, 1000])
+def test_lhs_strata(numpy_or_not, jobs):
+    values, *continuous = autochtc.sample_design([jobs, None, None], jobs, "lhs", 5)
+    # One point per stratum in every dimension
+    assert sorted(values) == list(range(jobs))
+    for column in continuous:
+        assert sorted(int(u * jobs) for u in column) == list(range(jobs))
+    # Strata made of whole values give each value the same number of points
+    (per_value,) = autochtc.sample_design([4], jobs * 4, "lhs", 5)
+    assert [per_value.count(value) for value in range(4)] == [jobs] * 4
+
+
+@pytest.mark.parametrize("method", autochtc.SAMPLE_METHODS)
+def test_designs_depend_on_the_seed_only(numpy_or_not, method):
+    sizes = [3, None, 7, 2**40, 2**40]
+    design = autochtc.sample_design(sizes, 500, method, 11)
+    assert autochtc.sample_design(sizes, 500, method, 11) == design
+    assert autochtc.sample_design(sizes, 500, method, 12) != design
+    for size, column in zip(sizes, design):
+        assert len(column) == 500
+        if size is None:
+            assert all(type(u) is float and 0 <= u < 1 for u in column)
+        else:
+            assert all(type(i) is int and 0 <= i < size for i in column)
+
+
+@pytest.mark.parametrize("method", ["sobol", "halton"])
+def test_sequences_do_not_depend_on_numpy(method, monkeypatch):
+    pytest.importorskip("numpy")
+    sizes = [3, None, 7, 2**40, 2**40]
+    with_numpy = autochtc.sample_design(sizes, 500, method, 11)
+    monkeypatch.setattr(autochtc, "optional_numpy", lambda: None)
+    assert autochtc.sample_design(sizes, 500, method, 11) == with_numpy
+
+
+@pytest.mark.parametrize("sizes", [[10**7] * 3, [10**7] * 2, [2**40] * 2])
+def test_random_draws_from_huge_products(numpy_or_not, sizes):
+    # More combinations than random.sample can take, or than an int64 holds
+    columns = autochtc.sample_design(sizes, 100, "random", 2)
+    rows = list(zip(*columns))
+    assert len(set(rows)) == 100 and rows == sorted(rows)
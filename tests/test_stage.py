@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+import autochtc
+
+
+@pytest.fixture
+def no_reflink(monkeypatch):
+    # As on filesystems without copy-on-write
+    monkeypatch.setattr(autochtc, "reflink", lambda src, dst: False)
+
+
+def test_stage_file_copies_by_default(workdir, no_reflink):
+    (workdir / "input.txt").write_text("a")
+    assert autochtc.stage_file("input.txt", "dag/input.txt")[0] == "copied"
+    assert not os.path.samefile("input.txt", "dag/input.txt")
+
+    # Editing the source leaves the staged file alone until it is staged again
+    (workdir / "input.txt").write_text("b")
+    assert (workdir / "dag" / "input.txt").read_text() == "a"
+    assert autochtc.stage_file("input.txt", "dag/input.txt")[0] == "copied"
+    assert (workdir / "dag" / "input.txt").read_text() == "b"
+
+
+def test_stage_file_hardlinks_when_asked(workdir, no_reflink):
+    (workdir / "input.txt").write_text("a")
+    (workdir / "job.sub").write_text("executable = job.sh\n")
+    assert (
+        autochtc.stage_file("input.txt", "dag/input.txt", hardlink=True)[0] == "linked"
+    )
+    assert os.path.samefile("input.txt", "dag/input.txt")
+    assert (
+        autochtc.stage_file("input.txt", "dag/input.txt", hardlink=True)[0]
+        == "unchanged"
+    )
+
+    # Submit files are rewritten once staged, so they are never linked
+    assert autochtc.stage_file("job.sub", "dag/job.sub", hardlink=True)[0] == "copied"
+    assert not os.path.samefile("job.sub", "dag/job.sub")
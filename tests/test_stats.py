@@ -0,0 +1,162 @@
+import json
+import os
+import shutil
+
+import autochtc
+
+FIXTURE_LOG = os.path.join(os.path.dirname(__file__), "fixtures", "train.log")
+
+
+def read_fixture():
+    with open(FIXTURE_LOG, "rb") as f:
+        return f.read()
+
+
+def summed(distribution):
+    return [distribution[key] for key in ["count", "sum", "max"]]
+
+
+def without_bookkeeping(stats):
+    return {key: value for key, value in stats.items() if key != "inode"}
+
+
+def test_parse_fixture_log():
+    stats = autochtc.update_log_stats(FIXTURE_LOG)
+    assert stats["offset"] == os.path.getsize(FIXTURE_LOG)
+    assert stats["jobs"] == {}
+    counts = ["submitted", "succeeded", "failed", "aborted", "evicted", "held"]
+    assert [stats[key] for key in counts] == [6, 3, 2, 1, 1, 2]
+    # Only the hold for going over the memory limit, not the transfer failure
+    assert stats["memory_holds"] == 1
+    # The nonzero return value and the job killed by a signal
+    assert stats["failures"] == [101, 105]
+    assert summed(stats["waits"]) == [6, 1560, 600]
+    assert summed(stats["runtimes"]) == [5, 2460, 600]
+    assert stats["good_seconds"] == 1800
+    assert stats["bad_seconds"] == 960
+
+
+def test_blank_usage_is_not_the_request():
+    # Job 102 reported no memory usage: its 2048 MB request must not be
+    # taken as what it used
+    stats = autochtc.update_log_stats(FIXTURE_LOG)
+    assert summed(stats["memory"]) == [4, 3012, 1500]
+    assert summed(stats["disk"]) == [5, 15410, 8192]
+
+
+def test_resource_usage_columns():
+    event = (
+        b"005 (1.000.000) 2024-10-17 12:00:00 Job terminated.\n"
+        b"\tPartitionable Resources :    Usage  Request Allocated\n"
+        b"\t   Cpus                 :                 1         1\n"
+        b"\t   Memory (MB)          :     2049     2048      2048\n"
+        b"\tJob terminated of its own accord at 2024-10-17T12:00:00Z.\n"
+    )
+    assert autochtc.resource_usage(event) == {b"Cpus": None, b"Memory (MB)": 2049}
+    assert autochtc.resource_usage(b"005 (1.000.000) Job terminated.\n") == {}
+
+
+def test_incremental_read_matches_full_read(tmp_path):
+    data = read_fixture()
+    log_file = tmp_path / "train.log"
+    # Cut in the middle of an event: only the complete ones are read
+    cut = data.index(b"Job terminated.", len(data) // 2)
+    log_file.write_bytes(data[:cut])
+    partial = autochtc.update_log_stats(str(log_file))
+    assert partial["offset"] == data.rfind(b"...\n", 0, cut) + 4
+    assert partial["jobs"]
+
+    # Stats saved as JSON, as in the stats file, pick up where they stopped
+    partial = json.loads(json.dumps(partial))
+    with open(log_file, "ab") as f:
+        f.write(data[cut:])
+    stats = autochtc.update_log_stats(str(log_file), partial)
+    full = autochtc.update_log_stats(FIXTURE_LOG)
+    assert without_bookkeeping(stats) == without_bookkeeping(full)
+
+
+def test_small_blocks_match_full_read(monkeypatch):
+    full = autochtc.update_log_stats(FIXTURE_LOG)
+    monkeypatch.setattr(autochtc, "STATS_BLOCK_SIZE", 100)
+    assert autochtc.update_log_stats(FIXTURE_LOG) == full
+
+
+def test_truncated_or_rotated_log_starts_over(tmp_path):
+    data = read_fixture()
+    log_file = tmp_path / "train.log"
+    log_file.write_bytes(data)
+    stats = autochtc.update_log_stats(str(log_file))
+
+    # Truncated in place: the saved offset is past the end
+    first_event = data.index(b"...\n") + 4
+    log_file.write_bytes(data[:first_event])
+    truncated = autochtc.update_log_stats(str(log_file), json.loads(json.dumps(stats)))
+    assert truncated["submitted"] == 1
+    assert truncated["offset"] == first_event
+
+    # Rotated: a new file of the same name, longer than the offset
+    os.rename(log_file, tmp_path / "train.log.old")
+    log_file.write_bytes(data + data[:first_event])
+    rotated = autochtc.update_log_stats(str(log_file), truncated)
+    assert rotated["inode"] == os.stat(log_file).st_ino
+    assert rotated["submitted"] == 7
+
+
+def test_collect_stats_saves_offsets(workdir):
+    os.mkdir("train_dag")
+    shutil.copy(FIXTURE_LOG, os.path.join("train_dag", "train.log"))
+    open(os.path.join("train_dag", "train.sub"), "w").close()
+
+    stats = autochtc.collect_stats("train_dag")
+    layer = stats["layers"]["train"]
+    assert [len(layer["failed_logs"]), stats["dags"]] == [2, {}]
+    with open(os.path.join("train_dag", autochtc.STATS_FILE)) as f:
+        saved = json.load(f)["files"]["train.log"]
+    assert saved["offset"] == os.path.getsize(FIXTURE_LOG)
+
+    # Nothing new was logged, so collecting again gives the same result,
+    # without saving the stats file again
+    stats_path = os.path.join("train_dag", autochtc.STATS_FILE)
+    os.utime(stats_path, (0, 0))
+    assert autochtc.collect_stats("train_dag") == stats
+    assert os.stat(stats_path).st_mtime == 0
+
+    # New events are saved
+    with open(os.path.join("train_dag", "train.log"), "ab") as f:
+        f.write(read_fixture()[: read_fixture().index(b"...\n") + 4])
+    assert autochtc.collect_stats("train_dag")["layers"]["train"]["submitted"] == 7
+    assert os.stat(stats_path).st_mtime != 0
+
+
+def test_percentiles_stay_within_a_bucket():
+    values = list(range(100_000, 0, -7)) + [0, 3, 3, 31]
+    distribution = autochtc.new_distribution()
+    for value in values:
+        autochtc.add_value(distribution, value)
+    # The histogram is bounded whatever the number of values
+    assert len(distribution["buckets"]) < 32 + 12 * autochtc.HISTOGRAM_STEPS
+    values.sort()
+    summary = autochtc.percentiles(distribution, (1, 50, 90, 99))
+    for q in [1, 50, 90, 99]:
+        exact = values[len(values) * q // 100]
+        assert exact <= summary[f"p{q}"] <= exact * 2 ** (1 / 16) + 1
+    assert summary["max"] == 100_000
+    assert summary["mean"] == round(sum(values) / len(values))
+
+    # Small values are exact, and merging is adding the values
+    small = autochtc.new_distribution()
+    for value in [0, 3, 3, 31]:
+        autochtc.add_value(small, value)
+    assert autochtc.percentiles(small, (25, 50, 75)) == {
+        "p25": 3,
+        "p50": 3,
+        "p75": 31,
+        "max": 31,
+        "mean": 9,
+    }
+    merged = autochtc.merge_distributions(autochtc.new_distribution(), small)
+    assert autochtc.merge_distributions(merged, small)["buckets"] == {
+        "0": 2,
+        "3": 4,
+        "31": 2,
+    }
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import autochtc
+from test_stats import FIXTURE_LOG
+
+
+class FakeSchedd:
+    # Stands in for htcondor.Schedd: submissions fail a set number of times
+    # per DAG, and queries return the given job ads
+    def __init__(self, ads=(), failures=None):
+        self.ads = list(ads)
+        self.failures = dict(failures or {})
+        self.submitted = []
+        self.queries = []
+
+    def submit(self, description):
+        name = os.path.basename(description["initialdir"])
+        if self.failures.get(name):
+            self.failures[name] -= 1
+            raise RuntimeError(f"Failed to submit {name}")
+        self.submitted.append(description)
+        cluster_id = 100 + len(self.submitted)
+
+        class Result:
+            def cluster(self):
+                return cluster_id
+
+        return Result()
+
+    def query(self, constraint, projection):
+        self.queries.append((constraint, projection))
+        return self.ads
+
+
+@pytest.fixture
+def dagman(htcondor, tmp_path, monkeypatch):
+    # Submit.from_dag only needs a condor_dagman executable to be found
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "condor_dagman").write_text("#!/bin/sh\nexit 0\n")
+    (bin_dir / "condor_dagman").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(autochtc, "SUBMIT_BACKOFF", 0)
+
+
+def make_dag(name):
+    os.mkdir(name)
+    dag_file = os.path.join(name, f"{name}.dag")
+    with open(dag_file, "w") as f:
+        f.write("JOB a a.sub\n")
+    return dag_file
+
+
+def test_get_schedd_is_reused(htcondor, monkeypatch):
+    created = []
+    monkeypatch.setattr(htcondor, "Schedd", lambda: created.append(1) or object())
+    autochtc.get_schedd.cache_clear()
+    try:
+        assert autochtc.get_schedd() is autochtc.get_schedd()
+        assert len(created) == 1
+    finally:
+        autochtc.get_schedd.cache_clear()
+
+
+def test_submit_dags_retries(workdir, dagman):
+    dag_files = [make_dag("first"), make_dag("second"), "missing/missing.dag"]
+    schedd = FakeSchedd(failures={"first": 2})
+    manifest = autochtc.submit_dags(dag_files, schedd, workers=2)
+
+    assert [entry["dag_file"] for entry in manifest] == [
+        os.path.abspath(dag_file) for dag_file in dag_files
+    ]
+    assert [entry["attempts"] for entry in manifest] == [3, 1, 1]
+    assert [entry.get("cluster_id") for entry in manifest[:2]] in (
+        [101, 102],
+        [102, 101],
+    )
+    assert "error" not in manifest[0] and "error" in manifest[2]
+    # DAGMan runs in the DAG directory whatever the cwd
+    assert sorted(
+        str(description["initialdir"]) for description in schedd.submitted
+    ) == [
+        os.path.abspath("first"),
+        os.path.abspath("second"),
+    ]
+
+    with open(autochtc.SUBMITTED_FILE) as f:
+        submitted = json.load(f)
+    assert submitted == {
+        str(entry["cluster_id"]): entry["dag_file"] for entry in manifest[:2]
+    }
+
+
+def test_query_and_monitor_dags(workdir):
+    os.mkdir("train_dag")
+    shutil.copy(FIXTURE_LOG, os.path.join("train_dag", "train.log"))
+    open(os.path.join("train_dag", "train.sub"), "w").close()
+    ads = [
+        {
+            "ClusterId": 7,
+            "Iwd": os.path.abspath("train_dag"),
+            "DAG_NodesTotal": 10,
+            "DAG_NodesDone": 3,
+            "DAG_NodesFailed": 2,
+        },
+        {"ClusterId": 8, "DAGManJobId": 7, "DAGNodeName": "train:6", "JobStatus": 1},
+        {"ClusterId": 9, "DAGManJobId": 7, "DAGNodeName": "train:7", "JobStatus": 2},
+        {"ClusterId": 10, "DAGManJobId": 7, "DAGNodeName": "s+eval:0", "JobStatus": 5},
+        # A job of a DAG that was not asked for
+        {"ClusterId": 11, "DAGManJobId": 99, "DAGNodeName": "x:0", "JobStatus": 1},
+    ]
+    schedd = FakeSchedd(ads)
+    statuses = autochtc.query_dags([7, "12"], schedd)
+
+    constraint, projection = schedd.queries[0]
+    assert constraint == "member(ClusterId, {7, 12}) || member(DAGManJobId, {7, 12})"
+    assert projection == autochtc.MONITOR_PROJECTION
+    assert statuses[12] == {"queued": False, "dag_dir": None, "nodes": {}, "layers": {}}
+    assert statuses[7]["nodes"] == {"total": 10, "done": 3, "failed": 2}
+    assert statuses[7]["layers"] == {
+        # Done jobs have left the queue and are counted from the log
+        "train": {"idle": 1, "running": 1, "held": 0, "done": 3},
+        "eval": {"idle": 0, "running": 0, "held": 1, "done": 0},
+    }
+
+    assert autochtc.monitor_dags([7, 12], schedd, once=True) == statuses
@@ -0,0 +1,101 @@
+import pytest
+
+import autochtc
+
+SUBMIT_TEXT = """\
+# Train job, edited by hand
+universe   = vanilla
+executable = train.sh
+arguments  = --lr $(lr) \\
+             --seed $(seed)
+Tag = $(Cluster)_$(Process)
+output     = logs/$(Tag).out
+error      = logs/$(Tag).err
+  # An indented comment = not a command
++ProjectName = "chtc"
+request_memory = 4GB
+
+queue lr, seed from (
+  0.1, 1
+  0.01, 2
+)
+arguments = --eval
+queue 2
+"""
+
+
+@pytest.mark.parametrize("text", [SUBMIT_TEXT, SUBMIT_TEXT.rstrip("\n"), ""])
+def test_round_trip(text):
+    assert autochtc.SubmitFile(text).text() == text
+
+
+def test_values_as_condor_reads_them(htcondor):
+    submit_file = autochtc.SubmitFile(SUBMIT_TEXT)
+    assert submit_file.keys() == [
+        "universe",
+        "executable",
+        "arguments",
+        "Tag",
+        "output",
+        "error",
+        "+ProjectName",
+        "request_memory",
+    ]
+    # The last line of a command wins
+    assert submit_file["ARGUMENTS"] == "--eval"
+    assert "tag" in submit_file and "queue" not in submit_file
+    assert submit_file.getQArgs() == "lr, seed from (\n  0.1, 1\n  0.01, 2\n)"
+
+    # Read as htcondor.Submit reads the commands of a single queue statement
+    first = SUBMIT_TEXT[: SUBMIT_TEXT.index("arguments = --eval")]
+    submit = htcondor.Submit(first)
+    for key, value in autochtc.SubmitFile(first).items():
+        assert value == submit[key.replace("+", "MY.")], key
+    assert submit["arguments"] == "--lr $(lr) --seed $(seed)"
+
+
+def test_edits_keep_other_lines():
+    submit_file = autochtc.SubmitFile(SUBMIT_TEXT)
+    submit_file["arguments"] = "$(x)"
+    submit_file["request_cpus"] = 2
+    del submit_file["tag"]
+    lines = submit_file.text().splitlines()
+    # Both arguments lines are set, the continued one as a whole
+    assert lines.count("arguments  = $(x)") == 1
+    assert lines.count("arguments = $(x)") == 1
+    assert "--seed" not in submit_file.text()
+    # New commands go before the first queue statement
+    assert lines[lines.index("queue lr, seed from (") - 1] == "request_cpus = 2"
+    assert [line for line in lines if "Tag" in line] == [
+        "output     = logs/$(Tag).out",
+        "error      = logs/$(Tag).err",
+    ]
+    unchanged = [line for line in SUBMIT_TEXT.splitlines() if "arguments" not in line]
+    unchanged = [line for line in unchanged if "seed $(seed)" not in line]
+    assert [line for line in lines if line in unchanged] == [
+        line for line in unchanged if not line.startswith("Tag")
+    ]
+
+
+def test_format_is_idempotent():
+    formatted = autochtc.SubmitFile(SUBMIT_TEXT).format()
+    assert autochtc.SubmitFile(formatted).format() == formatted
+    # Only section headers and blank lines were added
+    headers = [f"# {section}" for section in autochtc.SUBMIT_SECTIONS.values()]
+    assert [
+        line for line in formatted.splitlines() if line and line not in headers
+    ] == [line for line in SUBMIT_TEXT.splitlines() if line]
+
+
+def test_correct_submit_is_idempotent(workdir):
+    (workdir / "job.sub").write_text(SUBMIT_TEXT)
+    autochtc.correct_submit("job.sub")
+    once = (workdir / "job.sub").read_text()
+    autochtc.SubmitFile.cache.clear()
+    autochtc.correct_submit("job.sub")
+    assert (workdir / "job.sub").read_text() == once
+
+    # Loads hand out copies of the cached parse
+    loaded = autochtc.SubmitFile.load("job.sub")
+    loaded["universe"] = "docker"
+    assert autochtc.SubmitFile.load("job.sub")["universe"] == "vanilla"
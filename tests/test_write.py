@@ -0,0 +1,174 @@
+import pytest
+
+import autochtc
+
+
+def two_layer_dag(htcondor, edge, parents, children):
+    from htcondor import dags
+
+    dag = dags.DAG()
+    submit = htcondor.Submit({"executable": "job.sh", "arguments": "$(i)"})
+    top = autochtc.add_layer(
+        dag, [{"i": i} for i in range(parents)], name="A", submit_description=submit
+    )
+    autochtc.add_layer(
+        top,
+        [{"i": i} for i in range(children)],
+        edge=edge,
+        name="B",
+        submit_description=submit,
+    )
+    return dag
+
+
+def edge_lines(dag_file):
+    with open(dag_file) as f:
+        return [line.split() for line in f if line.startswith("PARENT")]
+
+
+@pytest.mark.parametrize(
+    "parents, children, threshold, joined",
+    [
+        (2, 2, autochtc.JOIN_THRESHOLD, False),
+        (1, 40, autochtc.JOIN_THRESHOLD, False),
+        (5, 5, autochtc.JOIN_THRESHOLD, False),
+        (2, 18, autochtc.JOIN_THRESHOLD, True),
+        (6, 6, autochtc.JOIN_THRESHOLD, True),
+        (2, 2, 0, True),
+        (6, 6, None, False),
+    ],
+)
+def test_join_only_when_it_saves_edges(
+    tmp_path, htcondor, parents, children, threshold, joined
+):
+    from htcondor import dags
+
+    dag = two_layer_dag(htcondor, dags.ManyToMany(), parents, children)
+    report = {"joins": 0, "direct_edges": 0, "edges": 0}
+    dag_file = autochtc.write_dag_stream(
+        dag, tmp_path, "t.dag", join_threshold=threshold, join_report=report
+    )
+    edges = edge_lines(dag_file)
+    if joined:
+        assert [len(edge) for edge in edges] == [parents + 3, children + 3]
+        assert report["edges"] == parents + children
+        assert report["direct_edges"] == parents * children
+    else:
+        assert len(edges) == 1 and len(edges[0]) == parents + children + 2
+        assert report["joins"] == 0
+
+
+def equivalence_dag(htcondor, edge, parent_size, child_size, extra):
+    # Two layers with quoted and escaped vars, and with extra, scripts,
+    # retries, NOOP nodes, a category, a subdag, a DONE layer and a FINAL
+    from htcondor import dags
+
+    dag = dags.DAG(
+        dot_config=dags.DotConfig("t.dot", update=True),
+        dagman_config={"DAGMAN_MAX_JOBS_IDLE": 5} if extra else {},
+    )
+    submit = htcondor.Submit({"executable": "job.sh", "arguments": "$(x) $(y)"})
+    top = autochtc.add_layer(
+        dag,
+        autochtc.Sweep.product({"x": range(parent_size), "y": ['a"b\\c']}),
+        name="L",
+        submit_description=submit,
+        pre=dags.Script("pre.sh", arguments=["$JOB", "1"]) if extra else None,
+        post=dags.Script("post.sh", retry=True, retry_status=2) if extra else None,
+        retries=3 if extra else None,
+        noop={1: True} if extra else False,
+        priority=2 if extra else 0,
+    )
+    child = autochtc.add_layer(
+        top,
+        [{"z": i} for i in range(child_size)],
+        edge=edge,
+        name="M",
+        submit_description=submit,
+        category="cat" if extra else None,
+    )
+    if extra:
+        child.child_subdag(name="S", dag_file="inner.dag", edge=dags.ManyToMany())
+        autochtc.add_layer(
+            child,
+            [{}],
+            edge=dags.ManyToMany(),
+            name="N",
+            submit_description=submit,
+            done=True,
+        )
+        dag.final(name="F", submit_description=submit)
+    return dag
+
+
+@pytest.mark.parametrize("extra", [False, True])
+@pytest.mark.parametrize(
+    "edge, edge_args, parent_size, child_size",
+    [
+        ("ManyToMany", (), 3, 4),
+        ("ManyToMany", (), 1, 4),
+        ("OneToOne", (), 4, 4),
+        ("Grouper", (2, 2), 4, 4),
+        ("Grouper", (3, 2), 6, 4),
+        ("Slicer", (slice(0, 4, 2), slice(1, None)), 6, 5),
+    ],
+)
+def test_stream_matches_htcondor_writer(
+    tmp_path, htcondor, edge, edge_args, parent_size, child_size, extra
+):
+    from htcondor import dags
+
+    written = {}
+    # A join threshold of 0 joins the same groups as htcondor.dags
+    for writer, kwargs in [
+        (dags.write_dag, {}),
+        (autochtc.write_dag_stream, {"join_threshold": 0}),
+    ]:
+        dag = equivalence_dag(
+            htcondor,
+            getattr(dags, edge)(*edge_args),
+            parent_size,
+            child_size,
+            extra,
+        )
+        dag_dir = tmp_path / writer.__name__
+        dag_file = writer(dag, dag_dir, "t.dag", **kwargs)
+        assert dag_file == dag_dir / "t.dag"
+        written[writer] = {
+            path.name: path.read_bytes() for path in sorted(dag_dir.iterdir())
+        }
+    # The same files, byte for byte
+    assert written[autochtc.write_dag_stream] == written[dags.write_dag]
+
+
+def test_default_output_differs_from_htcondor_writer(tmp_path, htcondor):
+    from htcondor import dags
+
+    dag = two_layer_dag(htcondor, dags.ManyToMany(), 3, 2)
+    dag.max_jobs_per_category["cat"] = 2
+    for node in dag.select(lambda node: node.name == "B"):
+        node.category = "cat"
+    dag_file = autochtc.write_dag_stream(dag, tmp_path, "t.dag")
+    # No join for 3 x 2 edges, where dags.write_dag adds one, and the throttle
+    # as a MAXJOBS line rather than the CATEGORY line of dags.write_dag
+    assert dag_file.read_text() == (
+        "# BEGIN META\n"
+        "MAXJOBS cat 2\n"
+        "# END META\n"
+        "# BEGIN NODES AND EDGES\n"
+        "JOB A:0 A.sub\n"
+        'VARS A:0 i="0"\n'
+        "JOB A:1 A.sub\n"
+        'VARS A:1 i="1"\n'
+        "JOB A:2 A.sub\n"
+        'VARS A:2 i="2"\n'
+        "PARENT A:0 A:1 A:2 CHILD B:0 B:1\n"
+        "JOB B:0 B.sub\n"
+        'VARS B:0 i="0"\n'
+        "CATEGORY B:0 cat\n"
+        "JOB B:1 B.sub\n"
+        'VARS B:1 i="1"\n'
+        "CATEGORY B:1 cat\n"
+        "# END NODES AND EDGES\n"
+    )
+    assert not (tmp_path / "__JOIN__.sub").exists()